@@ -0,0 +1,241 @@
+"""
+End-to-end orchestration overhead of the invest assistant, fully offline.
+
+Runs ``create_invest_assistant`` against ``fakes.FakeChatModel`` (scripted
+handoffs and tool calls, configurable latency) and ``FakeAsyncTavilyClient``,
+so what is measured is LangGraph, the agents, tools, history policy,
+checkpointing and memory queue rather than the providers. Reports:
+
+- per-turn latency percentiles at concurrency 1, with a per-node breakdown
+  from ``instrumentation.TraceRecorder``;
+- throughput and latency at 1, 8 and 64 concurrent conversations;
+- process memory over a long run (10k turns by default).
+
+Results are written as JSON so runs can be compared.
+
+Usage:
+    python -m benchmarks.bench_assistant --llm-latency 0.0
+    python -m benchmarks.bench_assistant --memory-turns 1000 --concurrency 1 8
+    python -m benchmarks.bench_assistant --routing rules --llm-latency 0.5 --memory-turns 0
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from langchain_core.messages import HumanMessage
+
+from multi_agent_system import llm_client, metrics, registry, searcher_tool
+from multi_agent_system.config import (
+    PERSISTENCE_CONFIG, RESPONSE_CACHE_CONFIG, ROUTER_CONFIG, SEARCH_CACHE_CONFIG, SEMANTIC_CACHE_CONFIG,
+)
+from multi_agent_system.fakes import FakeAsyncTavilyClient, FakeChatModel, FakeTavilyClient
+from multi_agent_system.instrumentation import TraceRecorder
+from multi_agent_system.memory_queue import flush_memory_updates
+
+QUESTIONS = [
+    "对于一位30岁、风险承受能力中等的年轻人来说，有哪些好的投资选择？",
+    "沪深300指数基金适合长期定投吗？",
+    "现在买入国债和大额存单哪个更合适？",
+    "黄金在资产配置中应该占多大比例？",
+    "新能源板块未来一年的风险有哪些？",
+]
+
+
+def _node_report(turns):
+    """Per-node wall time from the ``graph_node_seconds`` histogram, slowest first."""
+    totals = {}
+    for labels, entry in metrics.snapshot().get("graph_node_seconds", {}).get("samples", []):
+        count, total = totals.get(labels["node"], (0, 0.0))
+        totals[labels["node"]] = (count + entry["count"], total + entry["sum"])
+    return {
+        node: {"calls": count, "total_ms": round(total * 1000, 2), "ms_per_turn": round(total * 1000 / turns, 3)}
+        for node, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])
+    }
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+def _rss_mb():
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+async def _run_turns(graph, conversations, turns_per_conversation, concurrency, prefix, callbacks=None):
+    """Run conversations (turns in order within each) with at most ``concurrency`` turns in flight."""
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def conversation(index):
+        config = {"configurable": {"thread_id": f"{prefix}-{index}", "user_id": f"user-{index % 50}"}}
+        if callbacks:
+            config["callbacks"] = callbacks
+        for turn in range(turns_per_conversation):
+            question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+            async with slots:
+                started = time.perf_counter()
+                await graph.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(index) for index in range(conversations)))
+    return latencies, time.perf_counter() - started
+
+
+async def _latency(graph, turns, prefix="latency"):
+    metrics.reset()
+    recorder = TraceRecorder(trace_log=False)
+    latencies, wall = await _run_turns(graph, turns, 1, 1, prefix, callbacks=[recorder])
+    return {"turns": turns, "wall_seconds": round(wall, 3), **_percentiles(latencies), "nodes": _node_report(turns)}
+
+
+async def _throughput(graph, levels, turns_per_level):
+    results = {}
+    for concurrency in levels:
+        conversations = max(concurrency, turns_per_level // 2)
+        latencies, wall = await _run_turns(graph, conversations, 2, concurrency, f"throughput-{concurrency}")
+        results[str(concurrency)] = {
+            "turns": len(latencies),
+            "wall_seconds": round(wall, 3),
+            "turns_per_second": round(len(latencies) / wall, 2),
+            **_percentiles(latencies),
+        }
+        print(f"concurrency={concurrency:<3} {results[str(concurrency)]['turns_per_second']:8.2f} turns/s  "
+              f"p50={results[str(concurrency)]['p50_ms']} ms  p95={results[str(concurrency)]['p95_ms']} ms")
+    return results
+
+
+async def _memory(graph, turns, threads, sample_every):
+    """Cycle ``turns`` through ``threads`` conversations and sample RSS every ``sample_every`` turns."""
+    gc.collect()
+    baseline = _rss_mb()
+    samples = [{"turns": 0, "rss_mb": round(baseline, 1)}]
+    done = 0
+    started = time.perf_counter()
+    while done < turns:
+        batch = min(sample_every, turns - done)
+        await _run_turns(graph, threads, max(1, batch // threads), 16, f"memory-{done // sample_every}")
+        done += max(1, batch // threads) * threads
+        gc.collect()
+        samples.append({"turns": done, "rss_mb": round(_rss_mb(), 1)})
+        print(f"memory: {done} turns, rss={samples[-1]['rss_mb']} MB")
+    # Ignore the first interval, which includes warm-up allocations.
+    steady = samples[1:] if len(samples) > 2 else samples
+    per_1k = (steady[-1]["rss_mb"] - steady[0]["rss_mb"]) / max(1, steady[-1]["turns"] - steady[0]["turns"]) * 1000
+    return {
+        "turns": done,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "rss_start_mb": samples[0]["rss_mb"],
+        "rss_end_mb": samples[-1]["rss_mb"],
+        "rss_growth_mb_per_1k_turns": round(per_1k, 2),
+        "samples": samples,
+    }
+
+
+def _setup(args, workdir, llm_latency=None):
+    """
+    Point every external dependency at an offline fake and build the graph.
+
+    ``llm_latency(model)`` gives the fake seconds per call of each model;
+    by default every model takes ``args.llm_latency``.
+    """
+    from multi_agent_system.invest_assistant import create_invest_assistant
+
+    PERSISTENCE_CONFIG["backend"] = args.persistence
+    PERSISTENCE_CONFIG["path"] = os.path.join(workdir, "bench.sqlite3")
+    PERSISTENCE_CONFIG["maintenance_interval_seconds"] = None
+    SEARCH_CACHE_CONFIG["path"] = os.path.join(workdir, "search_cache.sqlite3")
+    # Caches would turn repeated questions into hits and hide the orchestration cost.
+    SEARCH_CACHE_CONFIG["enabled"] = False
+    RESPONSE_CACHE_CONFIG["enabled"] = False
+    SEMANTIC_CACHE_CONFIG["enabled"] = False
+    ROUTER_CONFIG["mode"] = args.routing
+
+    llm_latency = llm_latency or (lambda model: args.llm_latency)
+    llm_client.set_llm_factory(lambda **settings: FakeChatModel(
+        model=settings["model"], latency=llm_latency(settings["model"]), answer_chars=args.answer_chars,
+        cache=settings.get("cache"),
+    ))
+    searcher_tool.set_tavily_client(
+        FakeTavilyClient(latency=args.tavily_latency), FakeAsyncTavilyClient(latency=args.tavily_latency)
+    )
+    registry.reset()
+    return create_invest_assistant()
+
+
+async def _run(args, graph):
+    results = {}
+    if args.latency_turns:
+        results["latency"] = await _latency(graph, args.latency_turns)
+        print(f"latency: p50={results['latency']['p50_ms']} ms  p95={results['latency']['p95_ms']} ms")
+    if args.concurrency:
+        results["throughput"] = await _throughput(graph, args.concurrency, args.throughput_turns)
+    if args.memory_turns:
+        results["memory"] = await _memory(graph, args.memory_turns, args.memory_threads, args.sample_every)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM seconds per call.")
+    parser.add_argument("--tavily-latency", type=float, default=0.0, help="Fake Tavily seconds per call.")
+    parser.add_argument("--answer-chars", type=int, default=400, help="Length of fake answers.")
+    parser.add_argument("--routing", choices=["llm", "rules", "shadow"], default="llm",
+                        help="Supervisor routing mode (see multi_agent_system/router.py).")
+    parser.add_argument("--persistence", choices=["sqlite", "memory"], default="sqlite",
+                        help="Backend for checkpoints and store (sqlite uses a temporary file).")
+    parser.add_argument("--latency-turns", type=int, default=200, help="Sequential turns for percentiles.")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 8, 64], help="Concurrency levels.")
+    parser.add_argument("--throughput-turns", type=int, default=256, help="Turns per concurrency level.")
+    parser.add_argument("--memory-turns", type=int, default=10000, help="Turns for the memory run (0 skips it).")
+    parser.add_argument("--memory-threads", type=int, default=100, help="Conversations the memory run cycles through.")
+    parser.add_argument("--sample-every", type=int, default=1000, help="Turns between memory samples.")
+    parser.add_argument("--output", default=".cache/benchmarks/bench_assistant.json", help="JSON results file (default under the gitignored .cache/).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        graph = _setup(args, workdir)
+        try:
+            results = asyncio.run(_run(args, graph))
+        finally:
+            flush_memory_updates()
+
+    report = {
+        "benchmark": "bench_assistant",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
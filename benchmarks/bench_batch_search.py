@@ -0,0 +1,55 @@
+"""
+Sequential tool calls vs one batched, concurrent search call.
+
+Models a multi-entity question ("compare these three companies") that needs
+several searches and page retrievals. Sequentially, each item is one
+searcher step: a tool call plus an LLM round trip. The batched tool fetches
+everything in one step. Uses the fake Tavily client and a fixed simulated
+LLM round-trip time; the search cache is bypassed so every item hits the fake
+upstream.
+
+Usage:
+    python -m benchmarks.bench_batch_search --latency 0.3 --llm-latency 1.0
+"""
+
+import argparse
+import time
+
+from multi_agent_system import searcher_tool
+from multi_agent_system.fakes import FakeTavilyClient
+
+QUERIES = ["贵州茅台 2024 年报 营收", "五粮液 2024 年报 营收", "泸州老窖 2024 年报 营收"]
+URLS = ["https://example.com/moutai-2024", "https://example.com/wuliangye-2024"]
+BYPASS = {"configurable": {"search_cache_bypass": True}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake Tavily latency per call (s).")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Simulated LLM round trip per step (s).")
+    args = parser.parse_args()
+
+    searcher_tool.set_tavily_client(FakeTavilyClient(latency=args.latency))
+
+    start = time.perf_counter()
+    for query in QUERIES:
+        searcher_tool.tavily_search.invoke({"query": query}, BYPASS)
+    for url in URLS:
+        searcher_tool.tavily_get_page_content.invoke({"url": url}, BYPASS)
+    sequential_tools = time.perf_counter() - start
+    sequential_steps = len(QUERIES) + len(URLS)
+
+    start = time.perf_counter()
+    result = searcher_tool.tavily_batch_search.invoke({"queries": QUERIES, "urls": URLS}, BYPASS)
+    batched_tools = time.perf_counter() - start
+
+    print(f"items: {len(QUERIES)} queries + {len(URLS)} urls")
+    print(f"sequential: {sequential_steps} searcher steps, tool time {sequential_tools:.2f} s, "
+          f"est. turn time {sequential_tools + sequential_steps * args.llm_latency:.2f} s")
+    print(f"batched   : 1 searcher step, tool time {batched_tools:.2f} s, "
+          f"est. turn time {batched_tools + args.llm_latency:.2f} s")
+    print(f"batched payload: {len(result)} chars")
+
+
+if __name__ == "__main__":
+    main()
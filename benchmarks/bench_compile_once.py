@@ -0,0 +1,81 @@
+"""
+Per-turn graph construction overhead: rebuild-per-turn vs compile-once registry.
+
+Before the registry, the "supervisor" node built a new LLM client, both
+sub-agents and the langgraph_supervisor workflow on every user turn. This
+benchmark times that construction against the registry lookup that replaces
+it. No network calls are made; only graph construction is measured.
+
+Usage:
+    python -m benchmarks.bench_compile_once --turns 50
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from multi_agent_system import llm_client, registry
+from multi_agent_system.config import LLM_CONFIG
+from multi_agent_system.supervisor import build_supervisor, create_supervisor
+
+
+def _rebuild_per_turn():
+    # The original per-turn build also created a new chat model and HTTP pools;
+    # drop the shared ones so ``get_llm`` cannot hand back cached instances.
+    llm_client.close_clients()
+    return build_supervisor()
+
+
+def _measure(fn, turns):
+    """Run ``fn`` ``turns`` times and return per-call timings (ms) and allocated KiB."""
+    timings = []
+    tracemalloc.start()
+    start_mem, _ = tracemalloc.get_traced_memory()
+    for _ in range(turns):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    _, peak_mem = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, (peak_mem - start_mem) / 1024
+
+
+def _report(label, timings, peak_kib):
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{label:<22} mean={statistics.mean(timings):9.3f} ms  "
+        f"p50={statistics.median(timings):9.3f} ms  p95={p95:9.3f} ms  "
+        f"peak_alloc={peak_kib:10.1f} KiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=50, help="Simulated user turns per mode.")
+    args = parser.parse_args()
+
+    # Client construction needs a non-empty key; nothing is sent upstream.
+    LLM_CONFIG["api_key"] = LLM_CONFIG["api_key"] or "offline-benchmark"
+
+    # Before: what every turn used to pay.
+    before, before_mem = _measure(_rebuild_per_turn, args.turns)
+
+    # After: one build at process start, then a lookup per turn.
+    llm_client.close_clients()
+    registry.reset()
+    start = time.perf_counter()
+    registry.warm_up()
+    warm_up_ms = (time.perf_counter() - start) * 1000
+    after, after_mem = _measure(lambda: create_supervisor(), args.turns)
+
+    print(f"turns per mode: {args.turns}")
+    _report("rebuild per turn", before, before_mem)
+    _report("compile-once registry", after, after_mem)
+    print(f"one-off warm-up: {warm_up_ms:.3f} ms")
+    print(f"speed-up per turn: {statistics.mean(before) / max(statistics.mean(after), 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
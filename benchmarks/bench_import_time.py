@@ -0,0 +1,83 @@
+"""
+Import cost of the package and its entry points, as a regression guard.
+
+Each module is imported in a fresh interpreter several times and the median
+wall time is reported along with which heavy third-party packages it loaded.
+The run fails (exit status 1) when a module loads a package it must not load
+at import time, or exceeds its time budget. Heavy dependencies are expected
+to be imported on first use instead (see ``multi_agent_system/__init__.py``).
+
+Usage:
+    python -m benchmarks.bench_import_time --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY = ["langchain_core", "langchain_openai", "langgraph", "langgraph_supervisor", "langchain_experimental",
+         "tavily", "sklearn", "dotenv", "starlette", "uvicorn", "pandas"]
+
+# Module -> (packages it must not import, time budget in ms or None).
+GUARDS = {
+    "multi_agent_system": (HEAVY, 100),
+    "multi_agent_system.config": (HEAVY, 100),
+    "multi_agent_system.metrics": (HEAVY, 100),
+    "multi_agent_system.batch": (["langchain_openai", "langgraph", "tavily", "sklearn", "starlette"], None),
+    "multi_agent_system.llm_client": (["langchain_openai", "langgraph", "tavily", "sklearn"], None),
+    "multi_agent_system.invest_assistant": (["langchain_openai", "tavily", "sklearn", "langchain_experimental"], None),
+    "multi_agent_system.main": (["langchain_openai", "tavily", "sklearn", "langchain_experimental"], None),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": sorted(name for name in {heavy!r} if name in sys.modules)}}))
+"""
+
+
+def _probe(module):
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for module, (forbidden, budget_ms) in GUARDS.items():
+        runs = [_probe(module) for _ in range(args.repeat)]
+        median_ms = statistics.median(run["ms"] for run in runs)
+        loaded = runs[-1]["loaded"]
+        violations = sorted(set(loaded) & set(forbidden))
+        over_budget = budget_ms is not None and median_ms > budget_ms
+        results[module] = {"median_ms": round(median_ms, 1), "loaded": loaded, "forbidden_loaded": violations}
+        status = "ok"
+        if violations:
+            status = f"FAIL imports {', '.join(violations)}"
+            failures.append(module)
+        elif over_budget:
+            status = f"FAIL over {budget_ms} ms budget"
+            failures.append(module)
+        print(f"{module:<38} median={median_ms:8.1f} ms  loads=[{', '.join(loaded)}]  {status}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
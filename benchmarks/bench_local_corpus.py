@@ -0,0 +1,106 @@
+"""
+Indexing and lookup latency of the local page corpus (``local_corpus.py``).
+
+``--documents`` synthetic Chinese/English report pages are indexed into a
+corpus in a temporary directory, a share of them again under mirror URLs to
+exercise deduplication, and ``search_local_corpus`` is then called with
+queries built from words of random pages. The lookup is what a follow-up
+question pays instead of a Tavily round trip.
+
+Usage:
+    python -m benchmarks.bench_local_corpus --documents 2000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from multi_agent_system import local_corpus
+from multi_agent_system.local_corpus import LocalCorpus
+
+_COMPANIES = ["贵州茅台", "宁德时代", "比亚迪", "招商银行", "中国平安", "隆基绿能", "迈瑞医疗", "海天味业"]
+_TOPICS = ["营业收入", "净利润", "毛利率", "现金流", "研发投入", "分红", "资本开支", "海外市场", "产能", "负债率"]
+
+
+def _page(rng, index):
+    company = rng.choice(_COMPANIES)
+    sentences = [
+        f"{company}{2015 + index % 10}年报告第{index}号。{rng.choice(_TOPICS)}为{rng.randint(10, 9999)}亿元，"
+        f"同比{rng.choice(['增长', '下降'])}{rng.randint(1, 60)}%。segment{index} revenue {rng.randint(1, 999)} million."
+        for _ in range(rng.randint(20, 80))
+    ]
+    return company, " ".join(sentences)
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    return {
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=2000, help="Synthetic pages to index.")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Share of pages fetched again from a mirror.")
+    parser.add_argument("--queries", type=int, default=500, help="search_local_corpus calls.")
+    parser.add_argument("--output", default=".cache/benchmarks/bench_local_corpus.json", help="JSON results file (default under the gitignored .cache/).")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [_page(rng, i) for i in range(args.documents)]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = LocalCorpus(os.path.join(workdir, "corpus.sqlite3"))
+        local_corpus.set_local_corpus(corpus)
+
+        started = time.perf_counter()
+        outcomes = {}
+        for i, (company, text) in enumerate(pages):
+            outcome = corpus.add_page(f"https://example.com/report/{i}", text, company)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        for i in rng.sample(range(args.documents), int(args.documents * args.duplicates)):
+            outcome = corpus.add_page(f"https://mirror.example.com/{i}", pages[i][1], pages[i][0])
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        seconds = time.perf_counter() - started
+        results["index"] = {"pages": sum(outcomes.values()), "outcomes": outcomes, "seconds": round(seconds, 3),
+                            "pages_per_second": round(sum(outcomes.values()) / seconds, 1), **corpus.stats(),
+                            "db_mb": round(os.path.getsize(os.path.join(workdir, "corpus.sqlite3")) / 2 ** 20, 1)}
+        print(f"index: {results['index']}")
+
+        latencies = []
+        hits = 0
+        for _ in range(args.queries):
+            company, text = rng.choice(pages)
+            query = f"{company} {rng.choice(_TOPICS)} {rng.choice(text.split()).split('。')[0][-12:]}"
+            started = time.perf_counter()
+            answer = local_corpus.search_local_corpus.invoke({"query": query})
+            latencies.append(time.perf_counter() - started)
+            hits += answer.startswith("Local corpus results")
+        results["search_local_corpus"] = {"queries": args.queries, "hit_rate": round(hits / args.queries, 3),
+                                          **_percentiles(latencies)}
+        print(f"search_local_corpus: {results['search_local_corpus']}")
+
+    report = {
+        "benchmark": "bench_local_corpus",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Ingest and query latency of the local market-data store (``market_data.py``).
+
+Synthetic daily prices (``--tickers`` x ``--days`` rows) are written as a CSV,
+ingested into a store in a temporary directory and then queried through the
+``query_market_data`` tool with random tickers and date ranges, once with the
+table freshly mapped and again warm. ``load_frame`` is timed as well, since
+that is what ``python_repl_tool`` code calls.
+
+Usage:
+    python -m benchmarks.bench_market_data --tickers 500 --days 2500
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from multi_agent_system import market_data
+from multi_agent_system.market_data import MarketDataStore, read_table_file
+
+
+def _write_csv(path, tickers, days):
+    rng = np.random.default_rng(0)
+    dates = np.arange(np.datetime64("2015-01-01"), np.datetime64("2015-01-01") + days)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("ts_code,trade_date,open,close,volume\n")
+        for ticker in tickers:
+            close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+            volume = rng.integers(1_000, 1_000_000, days)
+            f.writelines(f"{ticker},{str(d).replace('-', '')},{c * 0.99:.4f},{c:.4f},{v}\n"
+                         for d, c, v in zip(dates, close, volume))
+    return dates
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    return {
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _time_queries(call, requests):
+    latencies = []
+    for request in requests:
+        started = time.perf_counter()
+        call(request)
+        latencies.append(time.perf_counter() - started)
+    return {"queries": len(requests), **_percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tickers", type=int, default=500, help="Synthetic tickers.")
+    parser.add_argument("--days", type=int, default=2500, help="Daily rows per ticker.")
+    parser.add_argument("--queries", type=int, default=1000, help="Random range queries per pass.")
+    parser.add_argument("--output", default=".cache/benchmarks/bench_market_data.json", help="JSON results file (default under the gitignored .cache/).")
+    args = parser.parse_args()
+
+    random.seed(0)
+    tickers = [f"{600000 + i}.SH" for i in range(args.tickers)]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "prices.csv")
+        dates = _write_csv(csv_path, tickers, args.days)
+        results["csv_mb"] = round(os.path.getsize(csv_path) / 2 ** 20, 1)
+
+        store = MarketDataStore(os.path.join(workdir, "store"))
+        started = time.perf_counter()
+        rows = store.ingest("prices", read_table_file(csv_path))
+        results["ingest"] = {"rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+        print(f"ingest: {rows} rows in {results['ingest']['seconds']} s")
+
+        requests = []
+        for _ in range(args.queries):
+            first = random.randrange(args.days - 30)
+            last = random.randrange(first + 1, min(args.days, first + 250))
+            requests.append({"ticker": random.choice(tickers), "start": str(dates[first]), "end": str(dates[last]),
+                             "columns": ["close"]})
+
+        # A fresh store maps the files again; the second pass reuses the mappings.
+        market_data.set_market_data_store(MarketDataStore(store.path))
+        for name in ("cold", "warm"):
+            results[f"tool_{name}"] = _time_queries(market_data.query_market_data.invoke, requests)
+            print(f"query_market_data ({name}): p50={results[f'tool_{name}']['p50_ms']} ms  "
+                  f"p95={results[f'tool_{name}']['p95_ms']} ms")
+        results["load_frame"] = _time_queries(
+            lambda request: market_data.load_frame(request["ticker"], request["start"], request["end"], ["close"]),
+            requests,
+        )
+        print(f"load_frame: p50={results['load_frame']['p50_ms']} ms  p95={results['load_frame']['p95_ms']} ms")
+
+    report = {
+        "benchmark": "bench_market_data",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Latency and cost per turn across the model tiering profiles of ``LLM_NODE_CONFIG``.
+
+Each profile runs the same sequential turns through ``create_invest_assistant``
+with ``fakes.FakeChatModel`` standing in for every model (see
+``bench_assistant.py``). The fake answers instantly, so each model is given a
+per-call latency (``LATENCY``, scaled by ``--latency-scale``) and tokens are
+priced with ``PRICES``. Token counts come from ``instrumentation.TraceRecorder``
+(``llm_tokens_total``), so the per-node and per-model split is the one the
+production metrics report. The memory profile update runs inside the turn
+here (``MEMORY_CONFIG["deferred"] = False``) so its model is priced as well;
+its latency is therefore part of the turn.
+
+Usage:
+    python -m benchmarks.bench_model_tiers --turns 50
+    python -m benchmarks.bench_model_tiers --profiles flagship tiered --latency-scale 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.bench_assistant import _latency, _setup
+from multi_agent_system import metrics
+from multi_agent_system.config import LLM_NODE_CONFIG, MEMORY_CONFIG
+from multi_agent_system.memory_queue import flush_memory_updates
+
+# Model -> (yuan per million input tokens, yuan per million output tokens), DashScope list prices.
+PRICES = {
+    "qwen-max-latest": (2.4, 9.6),
+    "qwen-plus-latest": (0.8, 2.0),
+    "qwen-turbo-latest": (0.3, 0.6),
+}
+
+# Model -> typical seconds per call of a short completion, before --latency-scale.
+LATENCY = {
+    "qwen-max-latest": 2.5,
+    "qwen-plus-latest": 1.2,
+    "qwen-turbo-latest": 0.5,
+}
+
+
+def _token_usage():
+    """``{model: {"prompt": n, "completion": n, "cached_prompt": n}}`` and ``{node: model}`` from the metrics."""
+    usage = {}
+    nodes = {}
+    for labels, value in metrics.snapshot().get("llm_tokens_total", {}).get("samples", []):
+        entry = usage.setdefault(labels["model"], {"prompt": 0, "completion": 0, "cached_prompt": 0})
+        entry[labels["kind"]] += value
+        nodes[labels["node"]] = labels["model"]
+    return usage, nodes
+
+
+def _cost(usage):
+    total = 0.0
+    for model, tokens in usage.items():
+        input_price, output_price = PRICES.get(model, (0.0, 0.0))
+        total += (tokens["prompt"] * input_price + tokens["completion"] * output_price) / 1e6
+    return total
+
+
+def _run_profile(args, profile, workdir):
+    LLM_NODE_CONFIG["profile"] = profile
+    graph = _setup(args, workdir, llm_latency=lambda model: LATENCY.get(model, 1.0) * args.latency_scale)
+    # Fresh threads per profile: the persistence backend outlives the graph.
+    latency = asyncio.run(_latency(graph, args.turns, prefix=f"latency-{profile}"))
+    usage, models = _token_usage()
+    cost = _cost(usage)
+    return {
+        "turns": args.turns,
+        "p50_ms": latency["p50_ms"],
+        "p95_ms": latency["p95_ms"],
+        "cost_per_turn_yuan": round(cost / args.turns, 6),
+        "tokens_per_turn": {
+            model: {kind: round(count / args.turns, 1) for kind, count in tokens.items()}
+            for model, tokens in usage.items()
+        },
+        "models": models,
+        "nodes": latency["nodes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", nargs="*", default=list(LLM_NODE_CONFIG["profiles"]),
+                        help="Profiles of LLM_NODE_CONFIG to compare.")
+    parser.add_argument("--turns", type=int, default=50, help="Sequential turns per profile.")
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="Multiplier on LATENCY (1.0 for realistic, slow runs).")
+    parser.add_argument("--answer-chars", type=int, default=400, help="Length of fake answers.")
+    parser.add_argument("--output", default=".cache/benchmarks/bench_model_tiers.json", help="JSON results file (default under the gitignored .cache/).")
+    args = parser.parse_args()
+    # Settings _setup expects from bench_assistant's command line.
+    args.persistence = "memory"
+    args.routing = "llm"
+    args.tavily_latency = 0.0
+    args.llm_latency = 0.0
+    # Update the profile inside the turn so the memory model is traced and priced too.
+    MEMORY_CONFIG["deferred"] = False
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for profile in args.profiles:
+                results[profile] = _run_profile(args, profile, workdir)
+                print(f"{profile:<10} p50={results[profile]['p50_ms']:9.1f} ms  "
+                      f"p95={results[profile]['p95_ms']:9.1f} ms  "
+                      f"cost/turn={results[profile]['cost_per_turn_yuan']:.5f} yuan  models={results[profile]['models']}")
+        finally:
+            flush_memory_updates()
+
+    report = {
+        "benchmark": "bench_model_tiers",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": {**vars(args), "prices": PRICES, "latency": LATENCY},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
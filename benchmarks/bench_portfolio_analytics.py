@@ -0,0 +1,109 @@
+"""
+Vectorized portfolio analytics against the per-portfolio loops they replace.
+
+Synthetic daily returns for ``--assets`` assets are evaluated for
+``--portfolios`` random weight vectors, and a long-only frontier plus risk
+parity are solved, two ways:
+
+- ``loop``: one portfolio at a time in plain Python/NumPy, the way
+  ``python_repl_tool`` snippets computed them;
+- ``vectorized``: ``portfolio_analytics`` on the whole weight matrix.
+
+The end-to-end ``optimize_portfolio`` tool call is timed as well.
+
+Usage:
+    python -m benchmarks.bench_portfolio_analytics --assets 20 --portfolios 1000
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from multi_agent_system import portfolio_analytics as pa
+
+
+def _loop_statistics(weights, returns, periods_per_year=252, risk_free=0.02):
+    results = []
+    for w in weights:
+        series = [float(np.dot(row, w)) for row in returns]
+        mean = sum(series) / len(series)
+        std = (sum((r - mean) ** 2 for r in series) / (len(series) - 1)) ** 0.5
+        wealth = peak = 1.0
+        drawdown = 0.0
+        for r in series:
+            wealth *= 1 + r
+            peak = max(peak, wealth)
+            drawdown = min(drawdown, wealth / peak - 1)
+        results.append((mean * periods_per_year, std * periods_per_year ** 0.5,
+                        (mean * periods_per_year - risk_free) / (std * periods_per_year ** 0.5), drawdown))
+    return results
+
+
+def _timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, default=20, help="Assets per portfolio.")
+    parser.add_argument("--periods", type=int, default=750, help="Daily return observations.")
+    parser.add_argument("--portfolios", type=int, default=1000, help="Random weight vectors to evaluate.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported).")
+    parser.add_argument("--output", default=".cache/benchmarks/bench_portfolio_analytics.json", help="JSON results file (default under the gitignored .cache/).")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    factors = rng.normal(size=(args.assets, args.assets)) / args.assets
+    cov_daily = (factors @ factors.T + np.eye(args.assets)) * 1e-4
+    returns = rng.multivariate_normal(np.linspace(1e-4, 6e-4, args.assets), cov_daily, size=args.periods)
+    weights = rng.dirichlet(np.ones(args.assets), size=args.portfolios)
+
+    loop_ms = _timed(lambda: _loop_statistics(weights, returns), 1)
+    vectorized_ms = _timed(lambda: pa.portfolio_statistics(weights, returns), args.repeat)
+    expected = np.array(_loop_statistics(weights[:5], returns))
+    got = pa.portfolio_statistics(weights[:5], returns)
+    assert np.allclose(expected[:, 1], got["volatility"]) and np.allclose(expected[:, 3], got["max_drawdown"])
+
+    cov = pa.covariance(returns)
+    mean = pa.asset_statistics(returns)["mean"]
+    prices = {f"asset{i}": list(100 * np.cumprod(1 + returns[:, i])) for i in range(args.assets)}
+    results = {
+        "portfolio_statistics": {"portfolios": args.portfolios, "loop_ms": loop_ms, "vectorized_ms": vectorized_ms,
+                                 "speedup": round(loop_ms / max(vectorized_ms, 1e-6), 1)},
+        "frontier_20_points_ms": _timed(lambda: pa.mean_variance_weights(mean, cov, np.logspace(0, 2, 20), 0.3),
+                                        args.repeat),
+        "max_sharpe_ms": _timed(lambda: pa.max_sharpe_weights(mean, cov), args.repeat),
+        "risk_parity_100_budgets_ms": _timed(
+            lambda: pa.risk_parity_weights(cov, rng.dirichlet(np.ones(args.assets), size=100)), args.repeat
+        ),
+        "optimize_portfolio_tool_ms": _timed(lambda: pa.optimize_portfolio.invoke({"prices": prices}), args.repeat),
+    }
+    for name, value in results.items():
+        print(f"{name:<28} {value}")
+
+    report = {
+        "benchmark": "bench_portfolio_analytics",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Search cache effectiveness against a local fake Tavily client.
+
+Replays a skewed stream of repeated queries (popular companies and reports
+are asked about far more often than others) through the ``tavily_search``
+tool, first with the cache bypassed and then with it enabled, and reports
+wall time, upstream calls and hit ratios. A second cache instance on the same
+SQLite file shows the disk tier serving a "restarted" process.
+
+Usage:
+    python -m benchmarks.bench_search_cache --calls 500 --latency 0.02
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from multi_agent_system import searcher_tool
+from multi_agent_system.fakes import FakeTavilyClient
+from multi_agent_system.search_cache import SearchCache, set_search_cache
+
+TOPICS = ["贵州茅台 2024 年报", "宁德时代 财报", "比亚迪 销量", "十四五 规划 新能源", "招商银行 分红",
+          "腾讯控股 业绩", "中国平安 估值", "美联储 利率决议", "沪深300 走势", "国债收益率"]
+
+
+def _queries(calls, seed=7):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(TOPICS))]
+    # Vary case/whitespace so normalization is exercised too.
+    return [rng.choice(["{}", " {} ", "{}  "]).format(rng.choices(TOPICS, weights)[0]) for _ in range(calls)]
+
+
+def _run(queries, config):
+    fake = FakeTavilyClient(latency=config["latency"])
+    searcher_tool.set_tavily_client(fake)
+    start = time.perf_counter()
+    for query in queries:
+        searcher_tool.tavily_search.invoke(
+            {"query": query}, {"configurable": {"search_cache_bypass": config["bypass"]}}
+        )
+    return time.perf_counter() - start, fake.search_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake upstream latency in seconds.")
+    args = parser.parse_args()
+
+    queries = _queries(args.calls)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search_cache.sqlite3")
+
+        set_search_cache(SearchCache(path=path))
+        elapsed, upstream = _run(queries, {"latency": args.latency, "bypass": True})
+        print(f"bypass     : {elapsed:7.3f} s  upstream calls={upstream}")
+
+        cache = SearchCache(path=path)
+        set_search_cache(cache)
+        elapsed, upstream = _run(queries, {"latency": args.latency, "bypass": False})
+        print(f"cold cache : {elapsed:7.3f} s  upstream calls={upstream}  stats={cache.stats()}")
+        cache.close()
+
+        # Same SQLite file, empty LRU: a restarted worker is served from disk.
+        cache = SearchCache(path=path)
+        set_search_cache(cache)
+        elapsed, upstream = _run(queries, {"latency": args.latency, "bypass": False})
+        print(f"restarted  : {elapsed:7.3f} s  upstream calls={upstream}  stats={cache.stats()}")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,48 @@ Multi-Agent System Package
 
 A modular, scalable multi-agent system using LangGraph and LangChain.
 Provides intelligent investment analysis through specialized agents.
+
+The public factories are imported on first access, so ``import
+multi_agent_system`` (or any single submodule) does not pull in LangChain,
+LangGraph and Tavily for every agent; see ``benchmarks/bench_import_time.py``.
 """
 
+import importlib
+from typing import TYPE_CHECKING
+
 __version__ = "1.0.0"
 __author__ = "Investment Assistant Contributors"
 
-from .invest_assistant import create_invest_assistant
-from .supervisor import create_supervisor
-from .searcher_agent import create_searcher_agent
-from .summary_agent import create_summary_agent
-from .coder_agent import create_coder_agent
-from .memory_agent import create_memory
-
-__all__ = [
-    "create_invest_assistant",
-    "create_supervisor",
-    "create_searcher_agent",
-    "create_summary_agent",
-    "create_coder_agent",
-    "create_memory",
-]
+# Public name -> submodule defining it.
+_EXPORTS = {
+    "create_invest_assistant": "invest_assistant",
+    "create_supervisor": "supervisor",
+    "create_searcher_agent": "searcher_agent",
+    "create_summary_agent": "summary_agent",
+    "create_coder_agent": "coder_agent",
+    "create_memory": "memory_agent",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .coder_agent import create_coder_agent
+    from .invest_assistant import create_invest_assistant
+    from .memory_agent import create_memory
+    from .searcher_agent import create_searcher_agent
+    from .summary_agent import create_summary_agent
+    from .supervisor import create_supervisor
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cache it so later lookups skip __getattr__.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,264 @@
+"""
+Offline batch runner for JSONL question files.
+
+Reads records such as ``{"user_id": "...", "thread_id": "...", "question": "..."}``
+(an optional ``id`` names the row; otherwise its line number does) and runs
+them through one compiled ``create_invest_assistant`` graph with bounded
+concurrency. Rows that share a ``thread_id`` run in file order, one at a time,
+so follow-up questions see the earlier answers.
+
+Every finished row is appended to the output JSONL right away, with its answer
+or error and timings. Rerunning with the same output file resumes: rows already
+recorded as ``ok`` are skipped and failed rows are retried. A failed attempt is
+rolled back to the thread's checkpoint from before the row, so neither a retry
+nor a later run stacks the question onto a half-finished turn.
+
+Usage:
+    python -m multi_agent_system.batch questions.jsonl results.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from .config import BATCH_CONFIG, load_env
+from .instrumentation import instrument
+from .memory_queue import flush_memory_updates
+from .rate_limit import retry_budget
+
+logger = logging.getLogger(__name__)
+
+
+def read_rows(path):
+    """
+    Load the input records.
+
+    Returns:
+        list: ``(row_id, record)`` pairs in file order; blank lines are skipped.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not str(record.get("question") or "").strip():
+                raise ValueError(f"{path}:{line_no}: record has no 'question'")
+            rows.append((str(record.get("id") or line_no), record))
+    return rows
+
+
+def completed_rows(path):
+    """Row ids recorded as ``ok`` in an existing output file (a torn last line is ignored)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get("status") == "ok":
+                done.add(str(result["row_id"]))
+            else:
+                done.discard(str(result.get("row_id")))
+    return done
+
+
+def _answer(values):
+    for message in reversed(values.get("messages", [])):
+        if isinstance(message, AIMessage) and message.content and not message.tool_calls:
+            return message.content
+    return ""
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BatchRunner:
+    """
+    Run a batch against one compiled graph and append results to ``output_path``.
+
+    Args:
+        graph: Compiled graph; defaults to ``create_invest_assistant()``.
+        output_path (str): JSONL file that doubles as the resume checkpoint.
+        concurrency (int): Rows processed at once.
+        row_timeout (float): Seconds allowed per attempt.
+        max_attempts (int): Attempts per row before it is recorded as failed.
+    """
+
+    def __init__(self, graph, output_path, concurrency=None, row_timeout=None, max_attempts=None):
+        self.graph = graph
+        self.output_path = output_path
+        self.concurrency = concurrency or BATCH_CONFIG["concurrency"]
+        self.row_timeout = row_timeout or BATCH_CONFIG["row_timeout_seconds"]
+        self.max_attempts = max_attempts or BATCH_CONFIG["max_attempts"]
+        self._slots = None
+        self._out = None
+        self._latencies = []
+        self._counts = {"ok": 0, "error": 0, "skipped": 0}
+        self._total = 0
+
+    def _write(self, result):
+        # One line per row, flushed and synced so a crash loses at most the rows in flight.
+        self._out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._out.flush()
+        os.fsync(self._out.fileno())
+
+    async def _checkpoint(self, config):
+        """Config of the thread's latest checkpoint, or None for a new thread (or a graph without persistence)."""
+        if not getattr(self.graph, "checkpointer", None):
+            return None
+        state = await self.graph.aget_state(config)
+        return state.config if state.config["configurable"].get("checkpoint_id") else None
+
+    async def _rollback(self, config, base):
+        """
+        Undo a failed attempt: make ``base`` the thread's latest checkpoint again.
+
+        A thread that had no checkpoint before the row is deleted. Returns an
+        error if ``base`` was already pruned by the per-thread checkpoint cap.
+        """
+        if not getattr(self.graph, "checkpointer", None):
+            return None
+        if base is None:
+            await self.graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+            return None
+        if await self.graph.checkpointer.aget_tuple(base) is None:
+            return f"checkpoint {base['configurable']['checkpoint_id']} was pruned; cannot roll back the thread"
+        await self.graph.aupdate_state(base, None, as_node="__copy__")
+        return None
+
+    async def _run_row(self, row_id, record):
+        thread_id = str(record.get("thread_id") or f"batch-{row_id}")
+        user_id = str(record.get("user_id") or thread_id)
+        config = instrument({"configurable": {"thread_id": thread_id, "user_id": user_id}}, row_id=row_id)
+        payload = {"messages": [HumanMessage(content=str(record["question"]))]}
+        queued = time.perf_counter()
+        async with self._slots:
+            started = time.perf_counter()
+            started_at = datetime.now(timezone.utc).isoformat()
+            error = None
+            answer = None
+            base = await self._checkpoint(config)
+            for attempt in range(1, self.max_attempts + 1):
+                if attempt > 1:
+                    rollback_error = await self._rollback(config, base)
+                    if rollback_error:
+                        error = f"{error}; {rollback_error}"
+                        attempt -= 1
+                        break
+                try:
+                    with retry_budget():
+                        values = await asyncio.wait_for(self.graph.ainvoke(payload, config), self.row_timeout)
+                    answer = _answer(values)
+                    error = None
+                    break
+                except asyncio.TimeoutError:
+                    error = f"timed out after {self.row_timeout:.0f} s"
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                logger.warning("row %s attempt %d failed: %s", row_id, attempt, error)
+            else:
+                # Leave the thread as it was before the row, for the rows after it and for a rerun.
+                rollback_error = await self._rollback(config, base)
+                if rollback_error:
+                    error = f"{error}; {rollback_error}"
+            latency = time.perf_counter() - started
+
+        status = "ok" if error is None else "error"
+        self._counts[status] += 1
+        self._latencies.append(latency)
+        self._write({
+            "row_id": row_id,
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "question": record["question"],
+            "status": status,
+            "answer": answer,
+            "error": error,
+            "attempts": attempt,
+            "started_at": started_at,
+            "queue_wait_seconds": round(started - queued, 4),
+            "latency_seconds": round(latency, 4),
+        })
+        finished = self._counts["ok"] + self._counts["error"]
+        if finished % BATCH_CONFIG["progress_every"] == 0 or finished == self._total:
+            logger.info("%d/%d rows done (%d failed)", finished, self._total, self._counts["error"])
+
+    async def _run_thread(self, rows):
+        # Rows of one thread build on each other, so they never overlap.
+        for row_id, record in rows:
+            await self._run_row(row_id, record)
+
+    async def arun(self, rows):
+        """
+        Run every row not yet completed in ``output_path``.
+
+        Returns:
+            dict: Counts, wall time and latency percentiles of this run.
+        """
+        done = completed_rows(self.output_path)
+        pending = [(row_id, record) for row_id, record in rows if row_id not in done]
+        self._counts["skipped"] = len(rows) - len(pending)
+        self._total = len(pending)
+        threads = {}
+        for row_id, record in pending:
+            threads.setdefault(str(record.get("thread_id") or f"batch-{row_id}"), []).append((row_id, record))
+
+        self._slots = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as self._out:
+            await asyncio.gather(*(self._run_thread(thread_rows) for thread_rows in threads.values()))
+        wall = time.perf_counter() - started
+        # Deferred profile updates belong to the batch too.
+        await asyncio.to_thread(flush_memory_updates)
+        return {
+            **self._counts,
+            "wall_seconds": round(wall, 3),
+            "rows_per_second": round(self._total / wall, 3) if wall else 0.0,
+            "latency_p50": round(_percentile(self._latencies, 0.50), 3),
+            "latency_p95": round(_percentile(self._latencies, 0.95), 3),
+        }
+
+
+def run_batch(input_path, output_path, concurrency=None, graph=None, **kwargs):
+    """Run (or resume) a batch from ``input_path`` into ``output_path``; returns the run summary."""
+    if graph is None:
+        from .invest_assistant import create_invest_assistant
+        graph = create_invest_assistant()
+    runner = BatchRunner(graph, output_path, concurrency=concurrency, **kwargs)
+    return asyncio.run(runner.arun(read_rows(input_path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of questions through the invest assistant.")
+    parser.add_argument("input", help="JSONL with user_id, thread_id and question per line.")
+    parser.add_argument("output", help="Results JSONL; rerun with the same file to resume.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Rows processed at once.")
+    parser.add_argument("--row-timeout", type=float, default=None, help="Seconds allowed per attempt.")
+    parser.add_argument("--max-attempts", type=int, default=None, help="Attempts per row.")
+    args = parser.parse_args()
+
+    load_env()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    summary = run_batch(
+        args.input, args.output, concurrency=args.concurrency,
+        row_timeout=args.row_timeout, max_attempts=args.max_attempts,
+    )
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,28 @@
 """LLM node for reasoning and tool selection."""
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
 
-from .config import LLM_CONFIG, CODER_ASSISTANT_PROMPT_TEMPLATE
+from .config import CODER_ASSISTANT_PROMPT_TEMPLATE
+from .llm_client import get_llm_for
 from .state import State
-from .utils import show_graph
+from .persistence import get_checkpointer, get_store
+from .history import build_agent_messages
+from .utils import show_graph, dual_node
 from .coder_tools import get_coder_tools
 
 
 
-def create_coder_agent():
+def create_coder_agent(embedded=False):
+    """
+    Build and compile the coder sub-agent graph.
+
+    Args:
+        embedded (bool): Compile without a private checkpointer/store so the
+            graph inherits persistence from the parent graph it runs in.
+    """
     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
+    llm = get_llm_for("coder")
     
     coder_tools = get_coder_tools()
     
@@ -28,17 +34,19 @@ def create_coder_agent():
     
     def coder_assistant(state: State, config: RunnableConfig):
         """LLM node for reasoning and tool selection."""
-        memory = "None" 
-        if "loaded_memory" in state: 
-            memory = state["loaded_memory"]
-
-        coder_assistant_prompt = CODER_ASSISTANT_PROMPT_TEMPLATE
-        
         response = llm_with_coder_tools.invoke(
-            [SystemMessage(coder_assistant_prompt)] + state["messages"]
+            build_agent_messages("coder", CODER_ASSISTANT_PROMPT_TEMPLATE, state)
         )
         
         return {"messages": [response]}
+
+    async def acoder_assistant(state: State, config: RunnableConfig):
+        """Async twin of ``coder_assistant`` used by ainvoke/astream."""
+        response = await llm_with_coder_tools.ainvoke(
+            build_agent_messages("coder", CODER_ASSISTANT_PROMPT_TEMPLATE, state)
+        )
+
+        return {"messages": [response]}
     
     # Define conditional edge function
     def should_continue(state: State, config: RunnableConfig):
@@ -55,7 +63,7 @@ def create_coder_agent():
     coder_workflow = StateGraph(State)
     
     # Add nodes
-    coder_workflow.add_node("coder_assistant", coder_assistant)
+    coder_workflow.add_node("coder_assistant", dual_node(coder_assistant, acoder_assistant))
     coder_workflow.add_node("coder_tool_node", coder_tool_node)
     
     # Add edges
@@ -70,9 +78,12 @@ def create_coder_agent():
     )
     coder_workflow.add_edge("coder_tool_node", "coder_assistant")
     
-    # Initialize memory components
-    checkpointer = MemorySaver()
-    in_memory_store = InMemoryStore()
+    if embedded:
+        return coder_workflow.compile(name="coder_subagent")
+
+    # Standalone use shares the process-wide checkpointer and store (see persistence.py)
+    checkpointer = get_checkpointer()
+    in_memory_store = get_store()
     
     # Compile the graph
     coder_subagent = coder_workflow.compile(
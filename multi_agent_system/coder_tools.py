@@ -1,30 +1,35 @@
 from typing import Annotated
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from langchain_experimental.utilities import PythonREPL
 
-# This executes code locally, which can be unsafe
-repl = PythonREPL()
+from .market_data import get_market_data_tools
+from .portfolio_analytics import get_portfolio_tools
+from .repl_pool import get_repl_pool
 
 
 @tool
 def python_repl_tool(
     code: Annotated[str, "The python code to execute to generate your chart."],
+    config: RunnableConfig,
 ):
     """Execute Python code and return the result."""
-    try:
-        result = repl.run(code)
-    except BaseException as e:
-        return f"Failed to execute. Error: {repr(e)}"
-    result_str = f"Successfully executed:\n```python\n{code}\n```\nStdout: {result}"
+    # Each conversation keeps its own variables in a sandboxed worker process (see repl_pool.py)
+    session_id = str((config or {}).get("configurable", {}).get("thread_id") or "default")
+    ok, output = get_repl_pool().execute(session_id, code)
+    if not ok:
+        return f"Failed to execute. Error: {output}"
+    result_str = f"Successfully executed:\n```python\n{code}\n```\nStdout: {output}"
     return result_str
 
 
 
 coder_tools = [
-    python_repl_tool
+    python_repl_tool,
+    *get_portfolio_tools(),
+    *get_market_data_tools(),
 ]
 
 
 def get_coder_tools():
-    return coder_tools
\ No newline at end of file
+    return coder_tools
@@ -3,12 +3,8 @@ Configuration module for the Multi-Agent System.
 Centralized configuration for LLM, database, and other settings.
 """
 
-from dotenv import load_dotenv
 import os
 
-# Load environment variables
-load_dotenv(dotenv_path=".env", override=True)
-
 # ============================================================================
 # LLM Configuration
 # ============================================================================
@@ -19,6 +15,80 @@ LLM_CONFIG = {
     "temperature": 0.7,
 }
 
+# Per-node model tiering, see llm_client.get_llm_for.
+LLM_NODE_CONFIG = {
+    "profile": "flagship",  # 环境变量 LLM_PROFILE；选用下面 profiles 中的哪一套
+    "profiles": {
+        # 所有节点都使用 LLM_CONFIG 中的旗舰模型（原有行为）
+        "flagship": {},
+        # 路由交接、画像抽取和历史摘要都是简短的分类/抽取任务，改用更快更便宜的模型；
+        # 每个节点可设置 model、temperature、max_tokens 和 timeout（读超时，秒），未设置的沿用 LLM_CONFIG；
+        # summary 和 coder 会输出长篇建议和表格，不限制 max_tokens 以免被截断
+        "tiered": {
+            "supervisor": {"model": "qwen-turbo-latest", "temperature": 0.1, "max_tokens": 1024, "timeout": 30.0},
+            "searcher": {"model": "qwen-plus-latest", "temperature": 0.3, "max_tokens": 1024, "timeout": 60.0},
+            "summary": {"model": "qwen-plus-latest", "temperature": 0.7, "timeout": 90.0},
+            "coder": {"model": "qwen-plus-latest", "temperature": 0.2, "timeout": 90.0},
+            "memory": {"model": "qwen-turbo-latest", "temperature": 0.0, "max_tokens": 512, "timeout": 30.0},
+            "history": {"model": "qwen-turbo-latest", "temperature": 0.0, "max_tokens": 512, "timeout": 30.0},
+        },
+    },
+}
+
+# ============================================================================
+# LLM HTTP Connection Pool
+# ============================================================================
+# Shared by every agent that talks to the same endpoint, see llm_client.py.
+LLM_POOL_CONFIG = {
+    "max_connections": 100,  # 同一端点的最大并发连接数
+    "max_keepalive_connections": 20,  # 保持长连接的空闲连接数
+    "keepalive_expiry": 30.0,  # 空闲连接保留时间（秒）
+    "connect_timeout": 5.0,
+    "read_timeout": 120.0,
+    "write_timeout": 30.0,
+    "pool_timeout": 30.0,  # 等待空闲连接的最长时间（秒）
+    "max_retries": 0,  # OpenAI SDK 自身的重试；重试统一由 RATE_LIMIT_CONFIG 控制
+}
+
+# Per-upstream rate limits and retries, see rate_limit.py.
+RATE_LIMIT_CONFIG = {
+    "upstreams": {
+        # 每个上游一个令牌桶（rate 次/秒，最多 burst 次突发）和自适应并发上限
+        "llm": {"rate": 20.0, "burst": 40, "max_concurrency": 64, "min_concurrency": 4},  # 每个模型单独限流
+        "tavily_search": {"rate": 10.0, "burst": 20, "max_concurrency": 16, "min_concurrency": 2},
+        "tavily_extract": {"rate": 5.0, "burst": 10, "max_concurrency": 8, "min_concurrency": 1},
+        "default": {"rate": None, "burst": 1, "max_concurrency": 16, "min_concurrency": 1},
+    },
+    "max_attempts": 4,  # 单次调用的最多尝试次数（429、5xx、超时、连接错误）
+    "base_delay": 0.5,  # 指数退避的初始间隔（秒），实际等待为随机抖动值
+    "max_delay": 20.0,  # 单次退避的最长间隔（秒）
+    "request_retry_budget": 10,  # 一次用户请求内所有上游调用共享的重试次数
+}
+
+# ============================================================================
+# Long-term Memory Configuration
+# ============================================================================
+MEMORY_CONFIG = {
+    "deferred": True,  # 回答先返回，用户画像更新放入后台队列
+    "queue_maxsize": 1000,  # 队列中最多等待的对话轮数
+    "workers": 2,  # 后台处理线程数
+    "enqueue_timeout": 0.0,  # 队列已满时最多等待的秒数，超时则丢弃本次更新
+    "shutdown_timeout": 10.0,  # 进程退出时等待队列清空的最长时间（秒）
+}
+
+# ============================================================================
+# Message History Configuration
+# ============================================================================
+# Applied by every agent when it builds its prompt, see history.py.
+HISTORY_CONFIG = {
+    "keep_last_turns": 4,  # 原样保留最近的 N 轮对话（0 表示不限制）
+    "summarize_every_turns": 2,  # 超出保留轮数达到该值时才压缩，避免每轮都调用摘要
+    "tool_payload_max_age": 2,  # 早于最近 K 次工具调用的工具结果只保留占位说明
+    "tool_payload_keep_chars": 200,  # 不超过该长度的工具结果（如转交消息）原样保留
+    "summary_max_tokens": 400,  # 滚动摘要的最大 token 数
+    "summarize_with_llm": True,  # False 时使用抽取式摘要，不额外调用模型
+}
+
 # ============================================================================
 # Search Configuration
 # ============================================================================
@@ -26,6 +96,180 @@ SEARCH_CONFIG = {
     "TAVILY_API_KEY": ""  # Tavily API Key
 }
 
+# Batched search tool (tavily_batch_search): how many queries/URLs one call may
+# carry and how many of them run concurrently.
+SEARCH_BATCH_CONFIG = {
+    "max_items": 10,  # 单次批量搜索最多包含的查询和网址数量
+    "max_workers": 6,  # 同时进行的 Tavily 请求数
+}
+
+# Shaping of search results before they reach the LLM, see search_results.py.
+SEARCH_RESULT_CONFIG = {
+    "search_budget_tokens": 600,  # 单次搜索返回给模型的最大 token 数
+    "page_budget_tokens": 1200,  # 单个网页返回给模型的最大 token 数
+    "batch_budget_tokens": 1500,  # 批量搜索返回给模型的最大 token 数
+    "snippet_max_tokens": 120,  # 单条摘录的最大 token 数
+    "full_result_page_chars": 6000,  # 按引用获取完整结果时每页的字符数
+}
+
+# Cache for Tavily search/extract responses, see search_cache.py.
+SEARCH_CACHE_CONFIG = {
+    "enabled": True,
+    "path": ".cache/search_cache.sqlite3",  # 环境变量 SEARCH_CACHE_PATH；为空则只使用进程内缓存
+    "memory_entries": 512,  # 进程内 LRU 最多保存的条目数
+    "max_disk_mb": 256,  # SQLite 缓存的最大体积，超出后按最近最少使用淘汰
+    "ttl_seconds": {
+        "tavily_search": 60 * 60,  # 搜索结果 1 小时后过期
+        "tavily_get_page_content": 24 * 60 * 60,  # 网页正文 1 天后过期
+        "search_payload": 24 * 60 * 60,  # 按引用保存的完整结果
+    },
+    "default_ttl_seconds": 60 * 60,
+}
+
+# Local BM25 index of fetched pages behind the search_local_corpus tool, see local_corpus.py.
+LOCAL_CORPUS_CONFIG = {
+    "enabled": True,  # 环境变量 LOCAL_CORPUS_ENABLED；关闭后不再索引网页，工具直接提示联网搜索
+    "path": ".cache/local_corpus.sqlite3",  # 环境变量 LOCAL_CORPUS_PATH；为空则只在进程内存中索引
+    "max_age_seconds": 7 * 24 * 60 * 60,  # 超过 7 天未重新抓取的文档标记为过期，提示重新获取
+    "retention_seconds": 90 * 24 * 60 * 60,  # 超过 90 天未重新抓取的文档从索引中删除
+    "max_documents": 20000,  # 最多保留的文档数，超出后删除最久未抓取的
+    "chunk_max_tokens": 240,  # 索引段落的最大 token 数
+    "top_k": 8,  # 每次检索的候选段落数
+    "budget_tokens": 1200,  # 返回给模型的段落总 token 数上限
+    "min_term_coverage": 0.5,  # 段落至少包含查询词的比例，低于此值视为未命中
+}
+
+
+# Exact-match cache for LLM responses, see response_cache.py.
+RESPONSE_CACHE_CONFIG = {
+    "enabled": False,  # 默认关闭，需显式开启（环境变量 RESPONSE_CACHE_ENABLED=true）
+    "agents": {  # 按智能体开启；依赖实时工具结果的智能体不缓存
+        "supervisor": True,
+        "summary": True,
+        "searcher": False,
+        "coder": False,
+    },
+    "path": ".cache/response_cache.sqlite3",  # 环境变量 RESPONSE_CACHE_PATH；为空则只使用进程内缓存
+    "memory_entries": 1024,  # 进程内 LRU 最多保存的条目数
+    "max_disk_mb": 128,  # SQLite 缓存的最大体积，超出后按最近最少使用淘汰
+    "ttl_seconds": {
+        "supervisor": 6 * 60 * 60,  # 路由决策变化较慢
+        "summary": 30 * 60,  # 投资建议时效性强，30 分钟后过期
+    },
+    "default_ttl_seconds": 30 * 60,
+}
+
+
+# Reuse of searcher results for paraphrased questions, see semantic_cache.py.
+SEMANTIC_CACHE_CONFIG = {
+    "enabled": False,  # 默认关闭，需显式开启（环境变量 SEMANTIC_CACHE_ENABLED=true）
+    "similarity_threshold": 0.85,  # 余弦相似度不低于该值才复用检索结果
+    "ttl_seconds": 30 * 60,  # 检索结果 30 分钟后过期（行情变化快）
+    "max_entries_per_profile": 2000,  # 每个风险偏好分区最多保存的问题数
+    "ngram_range": (1, 3),  # 字符 n-gram 范围，适合中英文混合问题
+    "n_features": 2 ** 18,  # 哈希向量维度
+    "first_turn_only": True,  # 只对会话的第一个问题使用，追问通常依赖上下文
+}
+
+
+
+# Checkpointer and long-term store shared by every graph, see persistence.py.
+PERSISTENCE_CONFIG = {
+    "backend": "sqlite",  # 环境变量 PERSISTENCE_BACKEND；"sqlite"：持久化到文件（生产默认）；"memory"：仅进程内，重启丢失
+    "path": ".data/invest_assistant.sqlite3",  # 环境变量 PERSISTENCE_PATH
+    "max_checkpoints_per_thread": 20,  # 每个会话最多保留的 checkpoint 数（None 表示不限制）
+    "thread_ttl_seconds": 30 * 24 * 60 * 60,  # 会话闲置超过该时间后删除（None 表示永不过期）
+    "store_ttl_minutes": None,  # 长期记忆条目的过期时间（分钟），None 表示永久保存
+    "maintenance_interval_seconds": 10 * 60,  # 后台过期清理与 VACUUM 的间隔（None 表示不启动）
+    "vacuum_min_free_pages": 1024,  # 旧数据库空闲页超过该值时执行一次完整 VACUUM
+    "busy_timeout_ms": 5000,  # 写锁等待时间
+}
+
+# ASGI serving entry point, see main.py.
+SERVER_CONFIG = {
+    "host": "0.0.0.0",  # 环境变量 SERVER_HOST
+    "port": 8000,  # 环境变量 SERVER_PORT
+    "workers": 2,  # 环境变量 SERVER_WORKERS；uvicorn 工作进程数，每个进程持有一份编译好的图
+    "max_concurrent_requests": 32,  # 每个进程同时处理的对话数
+    "queue_timeout_seconds": 5.0,  # 等待空闲名额的最长时间，超时返回 503
+    "request_timeout_seconds": 300.0,  # 单次对话的最长处理时间
+    "shutdown_timeout_seconds": 30.0,  # 优雅停机时等待进行中请求的时间
+    "stream_modes": ["messages", "updates"],  # SSE 推送的 LangGraph 流模式：逐 token 与节点更新
+}
+
+# Offline JSONL batch runner, see batch.py.
+BATCH_CONFIG = {
+    "concurrency": 8,  # 同时运行的问题数（同一 thread_id 的问题始终按顺序执行）
+    "row_timeout_seconds": 600.0,  # 单个问题的最长处理时间
+    "max_attempts": 2,  # 单个问题失败后的最多尝试次数
+    "progress_every": 20,  # 每完成 N 行打印一次进度
+}
+
+# Worker processes behind python_repl_tool, see repl_pool.py.
+REPL_POOL_CONFIG = {
+    "workers": 2,  # 预热的工作进程数
+    "max_concurrency": 2,  # 同时执行的代码片段数，超出的请求排队
+    "queue_timeout_seconds": 30.0,  # 排队等待空闲进程的最长时间
+    "timeout_seconds": 30.0,  # 单次执行的最长时间，超时后终止并替换该进程
+    "memory_limit_mb": 1024,  # 单个工作进程的内存上限（仅 Linux/macOS 生效）
+    "max_runs_per_worker": 100,  # 每个进程执行 N 次后回收重建，防止内存泄漏累积
+    "max_sessions_per_worker": 64,  # 每个进程保留的会话命名空间数，超出后淘汰最久未用的
+    "max_output_chars": 20000,  # 返回给模型的最大输出长度
+    "warm_imports": ["numpy", "pandas", "matplotlib.pyplot"],  # 进程启动时预先导入的库（未安装则跳过）
+}
+
+# Local columnar market-data store, see market_data.py.
+MARKET_DATA_CONFIG = {
+    "path": ".data/market_data",  # 环境变量 MARKET_DATA_PATH；每张表（prices、financials 等）一个目录
+    "max_rows": 120,  # 单次查询返回给模型的最多行数，超出时只返回最近的行
+    "ticker_columns": ["ticker", "symbol", "code", "ts_code", "证券代码", "股票代码", "代码"],  # 导入时识别为代码列的列名
+    "date_columns": ["date", "trade_date", "end_date", "report_date", "datetime", "日期", "交易日期", "报告期"],  # 导入时识别为日期列的列名
+}
+
+# Portfolio analytics tools of the coder agent, see portfolio_analytics.py.
+PORTFOLIO_CONFIG = {
+    "periods_per_year": 252,  # 价格序列每年的期数（日频 252，周频 52，月频 12），工具调用未指定时使用
+    "risk_free_rate": 0.02,  # 计算夏普比率和最大夏普组合时使用的年化无风险利率
+    "default_methods": ["equal_weight", "min_variance", "max_sharpe", "risk_parity"],  # optimize_portfolio 未指定方法时一次计算的组合
+    "risk_aversions": [2, 5, 10],  # mean_variance 未指定风险厌恶系数时生成的组合，数值越大越保守
+    "optimizer_iterations": 1000,  # 均值方差与风险平价求解的最大迭代次数
+    "max_assets": 50,  # 单次调用最多的资产数
+}
+
+# Supervisor routing, see router.py.
+ROUTER_CONFIG = {
+    "mode": "llm",  # 环境变量 ROUTER_MODE；"llm"：每次交接都由主管 LLM 决定；"rules"：可识别的问题直接按固定流程执行，其余交给 LLM；"shadow"：仍由 LLM 决定，同时记录规则的判断用于核对准确率
+    "max_question_chars": 200,  # 超过该长度的问题视为复杂问题，交给 LLM
+    # 命中任一模式的问题一律交给 LLM（编程/作图、纯寒暄、多步骤指令等规则无法覆盖的请求）
+    "llm_patterns": [
+        r"代码|编程|python|画图|作图|图表|表格",
+        r"^(你好|您好|嗨|hi|hello|谢谢|感谢|你是谁|再见)[\s!！。.？?~]*$",
+        r"先.+(再|然后|最后)",
+    ],
+    # 按顺序匹配，第一条命中的规则决定本轮依次调用的子代理
+    "rules": [
+        {
+            "name": "follow_up_summary",  # 基于已有检索结果的追问：只需重新分析总结
+            "plan": ["summary_subagent"],
+            "requires_research": True,  # 之前的轮次中必须已有检索结果
+            "patterns": [r"^(请|麻烦)?(你)?(帮我)?(再)?(总结|概括|归纳|简单(说|讲|解释)|解释一下|换个说法|展开(说|讲))"],
+        },
+        {
+            "name": "research_advice",  # 常见投资问题：先检索再分析总结
+            "plan": ["searcher_subagent", "summary_subagent"],
+            "patterns": [r"投资|理财|基金|股票|股市|a股|港股|美股|债|存单|存款|黄金|指数|定投|etf|板块|行业|"
+                         r"资产配置|仓位|收益|回报|风险|财报|政策|规划|行情|利率|通胀|汇率"],
+        },
+    ],
+    "log_decisions": True,  # 在 multi_agent_system.router 日志中为每次判断输出一行 JSON
+}
+
+# Per-node and per-tool spans, metrics and trace logs, see instrumentation.py.
+INSTRUMENTATION_CONFIG = {
+    "enabled": True,  # 环境变量 INSTRUMENTATION_ENABLED；为每次对话记录节点、模型和工具的耗时与用量
+    "trace_log": True,  # 环境变量 TRACE_LOG；对话结束时在 multi_agent_system.trace 日志中输出一行 JSON 追踪
+    "max_spans_per_trace": 500,  # 单次对话日志中保留的最多 span 数，超出的只计数
+}
 
 
 # ============================================================================
@@ -39,6 +283,20 @@ CODER_ASSISTANT_PROMPT_TEMPLATE = """
 你可以使用以下工具完成你的任务：
 
 - python_repl_tool：执行Python代码并返回结果。
+
+- list_market_data：列出本地行情与财务数据库中已有的表、字段、股票代码和日期范围。
+
+- query_market_data：按股票代码和日期范围读取本地行情（prices）或财务报表（financials）数据，可按周、月、季、年取期末值。
+
+- portfolio_metrics：一次性计算多个资产和多个组合的年化收益、波动率、夏普比率、最大回撤以及相关系数矩阵。
+
+- optimize_portfolio：一次性计算等权、最小方差、最大夏普、风险平价和不同风险偏好的均值方差配置，并输出配置表格。
+
+- render_allocation_table：把一个或多个资产配置方案渲染成 Markdown 表格（可按投资金额显示每项金额）。
+
+需要计算组合指标、资产配置或制作配置表格时，直接调用以上组合分析工具，一次调用即可得到结果，不要在 python_repl_tool 中自己编写循环。
+
+涉及收益率、波动率、估值等定量计算时，优先使用本地数据：先用 list_market_data 确认数据是否存在，再在 python_repl_tool 中用 `from multi_agent_system.market_data import load_frame` 和 `load_frame("600519.SH", start="2024-01-01", columns=["close"])` 以 pandas DataFrame 读取，不要手工抄写数字。
 """
 
 SEARCHER_ASSISTANT_PROMPT_TEMPLATE = """
@@ -46,11 +304,23 @@ SEARCHER_ASSISTANT_PROMPT_TEMPLATE = """
 
 你可以协助用户构建搜索查询、解读搜索结果，并根据他们的搜索需求提供相关信息，请记住你的工作是根据用户输入的关键词进行搜索并将搜索出来的内容进行简单整理。
 
-你可以使用两个工具，这些工具可以帮助你检索和处理金融和政府规划的信息。以下是这些工具：
+你可以使用以下工具，这些工具可以帮助你检索和处理金融和政府规划的信息。以下是这些工具：
+
+- search_local_corpus：检索此前（包括其他对话中）已抓取过的网页正文，如财报、政府规划全文。结果会注明抓取时间；标记为过期的网页请用 tavily_get_page_content 重新获取。
+
+- tavily_batch_search：一次性并发执行多个搜索查询并获取多个网页内容，结果会自动去重。
 
 - tavily_search：使用Tavily搜索引擎在网络上搜索信息。
 
-- tavily_get_page_content：使用Tavily获取网页内容。
+- tavily_get_page_content：使用Tavily获取网页内容，可通过 query 参数指定关注的内容。
+
+- get_full_search_result：搜索结果只返回与问题最相关的摘录；如确需完整内容，可用结果中的 ref 获取全文。
+
+- list_market_data、query_market_data：查询本地行情与财务数据库。价格、成交量、营收、利润等数据如果本地已有，直接读取，无需再上网搜索。
+
+每次检索先调用 search_local_corpus；本地已有新鲜的相关内容时直接使用，只有未命中或内容不足时才联网搜索。
+
+当问题涉及多个公司、多个指标或需要对比时，请先列出所需的全部查询（以及已知的网址），并通过一次 tavily_batch_search 调用获取全部信息，避免逐条搜索。只有在批量结果不足时才补充单独的搜索。
 
 你的任务是根据用户的请求，选择合适的工具进行信息检索，并将结果返回给用户，整理出来的信息控制在300以内。
 """  
@@ -58,7 +328,7 @@ SEARCHER_ASSISTANT_PROMPT_TEMPLATE = """
 SUMMARY_ASSISTANT_PROMPT_TEMPLATE = """
 你是一位专业的金融分析师，尤其擅长结合公司财报和政府规划对金融行情进行分析和总结。您的任务是对获取到的财报、政府规划等信息进行分析和总结，并向用户提供投资建议。
 
-同时你的回答需要结合历史信息: {memory}
+同时你的回答需要结合下文提供的用户画像和早前对话摘要（如有）。
 
 提供的投资建议需要满足以下要求：
 1. 建议应具体且可操作，避免过于笼统或模糊。
@@ -90,6 +360,17 @@ SUPERVISOR_PROMPT = """
 
 
 
+HISTORY_SUMMARY_PROMPT = """
+你负责维护一段用户与基金经理之间对话的滚动摘要。
+
+请将已有摘要与下面较早的对话合并为一段新的摘要，保留用户的问题、关注的公司和产品、关键数据、已经给出的投资建议和结论，删除寒暄和重复内容。
+
+摘要使用中文，控制在{max_tokens}字以内，只输出摘要本身。
+
+已有摘要和较早的对话在下文给出。
+"""
+
+
 CREATE_MEMORY_PROMPT = """
 你是一位资深分析师，正在观察一位用户与基金经理之间的对话。这位基金经理就职于中国某家基金公司，并使用多子方向专家团队来解答用户的请求。
 
@@ -107,16 +388,6 @@ CREATE_MEMORY_PROMPT = """
 
 你需要跟踪并更新这些字段。如果用户没有提供任何新信息，则无需更新内存配置文件。如果你没有新信息需要更新内存配置文件，完全没问题。在这种情况下，只需保留现有值即可。
 
-*以下为重要信息*
-
-你需要分析的用户与基金经理之间的对话如下：
-
-{conversation}
-
-你需要根据对话内容更新或创建与该用户关联的现有内存配置文件如下：
-
-{memory_profile}
-
 请确保你的回复是一个包含以下 JSON 格式字段的对象：
 
 - customer_id：客户的 ID
@@ -128,5 +399,65 @@ CREATE_MEMORY_PROMPT = """
 重要提示：请以结构化对象的形式返回 JSON 格式的回复。
 
 回复前请仔细思考。
+
+*以下为重要信息*：你需要分析的对话记录和需要更新或创建的现有记忆档案在下文给出。
 """
 
+
+# ============================================================================
+# Environment
+# ============================================================================
+# Settings above that may be overridden by environment variables.
+def _flag(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+_ENV_SETTINGS = (
+    ("LLM_PROFILE", LLM_NODE_CONFIG, "profile", str),
+    ("SEARCH_CACHE_PATH", SEARCH_CACHE_CONFIG, "path", str),
+    ("LOCAL_CORPUS_ENABLED", LOCAL_CORPUS_CONFIG, "enabled", _flag),
+    ("LOCAL_CORPUS_PATH", LOCAL_CORPUS_CONFIG, "path", str),
+    ("RESPONSE_CACHE_ENABLED", RESPONSE_CACHE_CONFIG, "enabled", _flag),
+    ("RESPONSE_CACHE_PATH", RESPONSE_CACHE_CONFIG, "path", str),
+    ("SEMANTIC_CACHE_ENABLED", SEMANTIC_CACHE_CONFIG, "enabled", _flag),
+    ("PERSISTENCE_BACKEND", PERSISTENCE_CONFIG, "backend", str),
+    ("PERSISTENCE_PATH", PERSISTENCE_CONFIG, "path", str),
+    ("SERVER_HOST", SERVER_CONFIG, "host", str),
+    ("SERVER_PORT", SERVER_CONFIG, "port", int),
+    ("SERVER_WORKERS", SERVER_CONFIG, "workers", int),
+    ("ROUTER_MODE", ROUTER_CONFIG, "mode", str),
+    ("MARKET_DATA_PATH", MARKET_DATA_CONFIG, "path", str),
+    ("INSTRUMENTATION_ENABLED", INSTRUMENTATION_CONFIG, "enabled", _flag),
+    ("TRACE_LOG", INSTRUMENTATION_CONFIG, "trace_log", _flag),
+)
+
+
+def _apply_env():
+    for name, settings, key, parse in _ENV_SETTINGS:
+        value = os.environ.get(name)
+        if value is not None:
+            settings[key] = parse(value)
+
+
+_env_loaded = False
+
+
+def load_env(path=".env"):
+    """
+    Load ``.env`` into ``os.environ`` (once per process) and re-apply the overrides above.
+
+    Importing this module has no side effects beyond reading variables that are
+    already set. The first client, store or cache to be built calls this, as do
+    the server and batch entry points, so ``.env`` still configures everything.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=path, override=True)
+    _apply_env()
+
+
+_apply_env()
@@ -0,0 +1,252 @@
+"""
+Deterministic, offline stand-ins for external services.
+
+Used by benchmarks and local experiments to exercise the tools and graphs
+without DashScope or Tavily credentials or network access.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+import typing
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+_HANDOFF_PREFIX = "transfer_to_"
+
+# Provider-style prefix cache of FakeChatModel: prompts are cached in blocks
+# of this many characters, and a block only hits when every block before it did.
+_PREFIX_BLOCK = 256
+_PREFIX_CAPACITY = 100_000
+_prefix_blocks = OrderedDict()
+_prefix_lock = threading.Lock()
+
+
+def _cached_prefix(model, text):
+    """Characters at the start of ``text`` served from the prefix cache of ``model``; caches ``text`` too."""
+    digest = hashlib.sha1(model.encode("utf-8"))
+    keys = []
+    for start in range(0, len(text) - _PREFIX_BLOCK + 1, _PREFIX_BLOCK):
+        digest.update(text[start:start + _PREFIX_BLOCK].encode("utf-8"))
+        keys.append(digest.digest())
+    cached = 0
+    with _prefix_lock:
+        for index, key in enumerate(keys):
+            if key in _prefix_blocks and cached == index * _PREFIX_BLOCK:
+                cached += _PREFIX_BLOCK
+                _prefix_blocks.move_to_end(key)
+            _prefix_blocks[key] = None
+        while len(_prefix_blocks) > _PREFIX_CAPACITY:
+            _prefix_blocks.popitem(last=False)
+    return cached
+
+
+class FakeTavilyClient:
+    """
+    Drop-in replacement for ``TavilyClient`` returning deterministic results.
+
+    Args:
+        latency (float): Seconds to sleep per call, to mimic network time.
+        results_per_query (int): Number of results returned by ``search``.
+    """
+
+    def __init__(self, latency=0.0, results_per_query=5):
+        self.latency = latency
+        self.results_per_query = results_per_query
+        self.search_calls = 0
+        self.extract_calls = 0
+
+    def _search_response(self, query, max_results=None):
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+        count = min(self.results_per_query, max_results or self.results_per_query)
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"{query} - result {i}",
+                    "url": f"https://example.com/{digest}/{i}",
+                    "content": f"Snippet {i} about {query}. " * 8,
+                    "score": round(1.0 - i * 0.1, 2),
+                }
+                for i in range(count)
+            ],
+        }
+
+    def _extract_response(self, urls):
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        return {
+            "results": [
+                {"url": url, "raw_content": f"Full page content of {url}. " * 200}
+                for url in urls
+            ],
+            "failed_results": [],
+        }
+
+    def search(self, query, max_results=None, **kwargs):
+        self.search_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._search_response(query, max_results)
+
+    def extract(self, urls, **kwargs):
+        self.extract_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._extract_response(urls)
+
+
+class FakeAsyncTavilyClient(FakeTavilyClient):
+    """Drop-in replacement for ``AsyncTavilyClient``."""
+
+    async def search(self, query, max_results=None, **kwargs):
+        self.search_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._search_response(query, max_results)
+
+    async def extract(self, urls, **kwargs):
+        self.extract_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._extract_response(urls)
+
+
+def _placeholder_args(parameters, question):
+    """Fill the required arguments of a JSON schema with values derived from ``question``."""
+    args = {}
+    properties = parameters.get("properties", {})
+    for name in parameters.get("required", []):
+        kind = properties.get(name, {}).get("type")
+        if name == "code":
+            args[name] = "print('ok')"
+        elif kind == "array":
+            args[name] = [question]
+        elif kind in ("integer", "number"):
+            args[name] = 1
+        elif kind == "boolean":
+            args[name] = False
+        else:
+            args[name] = question
+    return args
+
+
+def _placeholder_value(annotation):
+    origin = typing.get_origin(annotation)
+    if origin in (list, List):
+        return ["示例偏好"]
+    if annotation in (int, float):
+        return annotation(0)
+    if annotation is bool:
+        return False
+    return "fake"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that plays the assistant's usual script without a provider.
+
+    Per user turn:
+    - with handoff tools bound (the supervisor): transfer to each agent in
+      ``route`` once, then answer;
+    - with other tools bound (searcher, coder): call one tool with placeholder
+      arguments, then answer from its result;
+    - without tools (summary, history summary): answer;
+    - ``with_structured_output(schema)``: a ``schema`` instance with placeholder values.
+
+    Args:
+        model (str): Model name reported to callbacks (token and cost accounting).
+        latency (float): Seconds each call takes, to mimic the provider.
+        route (list): Agents the supervisor hands off to, in order.
+        preferred_tools (list): Tool picked first when several are bound.
+        answer_chars (int): Length of generated answers.
+        prefix_cache (bool): Report ``cache_read`` prompt tokens like a
+            provider that caches repeated prompt prefixes.
+    """
+
+    model: str = "fake-chat"
+    latency: float = 0.0
+    route: List[str] = ["searcher_subagent", "summary_subagent"]
+    preferred_tools: List[str] = ["tavily_search", "python_repl_tool"]
+    answer_chars: int = 400
+    prefix_cache: bool = True
+    tools: List[dict] = []
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self):
+        return {"model": self.model, "latency": self.latency, "route": self.route, "answer_chars": self.answer_chars}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools": [convert_to_openai_tool(tool)["function"] for tool in tools]})
+
+    def with_structured_output(self, schema, **kwargs):
+        def parse(_):
+            values = {
+                name: _placeholder_value(field.annotation)
+                for name, field in schema.model_fields.items() if field.is_required()
+            }
+            return schema.model_validate(values)
+
+        # A real model call first, so latency, callbacks and token accounting apply.
+        return self | RunnableLambda(parse, name="FakeStructuredOutput")
+
+    def _answer(self, text):
+        filler = "示例回答。" * (self.answer_chars // 5 + 1)
+        return f"{text} {filler}"[: self.answer_chars]
+
+    def _respond(self, messages):
+        turn_start = max((i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)), default=-1)
+        question = str(messages[turn_start].content) if turn_start >= 0 else ""
+        turn = messages[turn_start + 1:]
+        called = {call["name"] for msg in turn if isinstance(msg, AIMessage) for call in msg.tool_calls}
+        names = [tool["name"] for tool in self.tools]
+
+        def call(tool, args):
+            digest = hashlib.sha1(f"{tool}{len(messages)}".encode("utf-8")).hexdigest()[:12]
+            return AIMessage(content="", tool_calls=[{"name": tool, "args": args, "id": f"call_{digest}"}])
+
+        if any(name.startswith(_HANDOFF_PREFIX) for name in names):
+            for agent in self.route:
+                handoff = f"{_HANDOFF_PREFIX}{agent}"
+                if handoff in names and handoff not in called:
+                    return call(handoff, {})
+            return AIMessage(content=self._answer(f"综合建议：{question}"))
+        if names and not any(isinstance(msg, ToolMessage) and msg.name in names for msg in turn):
+            tool = next((name for name in self.preferred_tools if name in names), names[0])
+            spec = next(spec for spec in self.tools if spec["name"] == tool)
+            return call(tool, _placeholder_args(spec.get("parameters", {}), question))
+        return AIMessage(content=self._answer(f"关于“{question}”的回答："))
+
+    def _result(self, messages):
+        message = self._respond(messages)
+        # Roughly one token per character, enough to exercise token accounting.
+        prompt = sum(len(str(msg.content)) for msg in messages)
+        completion = len(str(message.content)) + sum(len(str(call["args"])) for call in message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion,
+        }
+        if self.prefix_cache:
+            text = "".join(f"{msg.type}:{msg.content}\n" for msg in messages)
+            cached = min(prompt, _cached_prefix(self.model, text))
+            message.usage_metadata["input_token_details"] = {"cache_read": cached}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
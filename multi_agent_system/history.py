@@ -0,0 +1,190 @@
+"""
+Bounded message-history policy shared by every agent.
+
+``State.messages`` only ever grows, and each agent used to send all of it with
+every LLM call. The policy below keeps the last N turns verbatim, folds older
+turns into a rolling summary and replaces tool payloads older than K tool steps
+with a short placeholder. ``build_agent_messages`` applies it to the prompt of
+any agent (assembled by prompts.py); the ``summarize_history`` node applies it
+to the stored state so the thread itself stops growing.
+"""
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from .config import HISTORY_CONFIG, HISTORY_SUMMARY_PROMPT
+from .llm_client import get_llm_for
+from .prompts import MEMORY_HEADER, build_prompt
+from .state import State
+from .utils import estimate_tokens
+
+SUMMARY_HEADER = "早前对话摘要："
+
+
+def split_turns(messages):
+    """Split messages into turns, each starting at a HumanMessage."""
+    turns = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def _split_recent(messages):
+    """Return (older messages, recent messages) according to ``keep_last_turns``."""
+    keep = HISTORY_CONFIG["keep_last_turns"]
+    turns = split_turns(messages)
+    if keep <= 0 or len(turns) <= keep:
+        return [], list(messages)
+    older = [msg for turn in turns[:-keep] for msg in turn]
+    recent = [msg for turn in turns[-keep:] for msg in turn]
+    return older, recent
+
+
+def compact_tool_payloads(messages, max_age=None):
+    """
+    Replace the content of tool results older than ``max_age`` tool steps.
+
+    A tool step is one AIMessage with tool calls plus its ToolMessages. The
+    ToolMessages themselves are kept, so every tool call still has its answer.
+    """
+    max_age = HISTORY_CONFIG["tool_payload_max_age"] if max_age is None else max_age
+    keep_chars = HISTORY_CONFIG["tool_payload_keep_chars"]
+    compacted = []
+    steps_seen = 0
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            steps_seen += 1
+        elif isinstance(msg, ToolMessage) and steps_seen >= max_age and len(str(msg.content)) > keep_chars:
+            ref = (msg.artifact or {}).get("ref") if isinstance(msg.artifact, dict) else None
+            note = f"[{msg.name or 'tool'} result from an earlier step omitted"
+            note += f"; ref={ref}]" if ref else "]"
+            msg = msg.model_copy(update={"content": note})
+        compacted.append(msg)
+    compacted.reverse()
+    return compacted
+
+
+def extractive_summary(messages, max_tokens=None):
+    """Summarize messages without an LLM: user questions and final answers, newest kept first."""
+    max_tokens = max_tokens or HISTORY_CONFIG["summary_max_tokens"]
+    lines = []
+    for msg in messages:
+        text = " ".join(str(msg.content).split())
+        if not text:
+            continue
+        if isinstance(msg, HumanMessage):
+            lines.append(f"用户：{text[:200]}")
+        elif isinstance(msg, AIMessage) and not msg.tool_calls:
+            lines.append(f"{msg.name or '助手'}：{text[:200]}")
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+def _join_summary(*parts):
+    """Join summary parts, dropping the oldest lines once over ``summary_max_tokens``."""
+    lines = [line for part in parts if part for line in part.splitlines() if line.strip()]
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > HISTORY_CONFIG["summary_max_tokens"] and kept:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+def build_agent_messages(agent, system_prompt, state):
+    """
+    Build the message list an agent sends to its LLM under the history policy.
+
+    Args:
+        agent (str): Agent name for the prompt metrics (see prompts.py).
+        system_prompt (str): The agent's static instructions.
+        state (State): Current graph state.
+
+    Returns:
+        list: One SystemMessage (instructions, then user profile and rolling
+        summary) followed by the recent turns with stale tool payloads
+        compacted.
+    """
+    older, recent = _split_recent(state["messages"])
+    summary = state.get("history_summary") or ""
+    if older:
+        # The state has not been compacted yet (e.g. a standalone sub-agent):
+        # summarize the overflow on the fly without an extra LLM call.
+        summary = _join_summary(summary, extractive_summary(older))
+    sections = [(MEMORY_HEADER, state.get("loaded_memory") or ""), (SUMMARY_HEADER, summary)]
+    return build_prompt(agent, system_prompt, sections, compact_tool_payloads(recent))
+
+
+def _summary_prompt(summary, older):
+    conversation = "".join(f"{msg.__class__.__name__}: {msg.content}\n" for msg in older
+                           if not isinstance(msg, ToolMessage))
+    return build_prompt(
+        "history",
+        HISTORY_SUMMARY_PROMPT.format(max_tokens=HISTORY_CONFIG["summary_max_tokens"]),
+        [("已有摘要：", summary or "无"), ("较早的对话：", conversation)],
+        [HumanMessage("请输出合并后的新摘要。")],
+    )
+
+
+def _older_to_compress(state):
+    """Return the messages to fold into the summary, or [] if the thread is still short enough."""
+    keep = HISTORY_CONFIG["keep_last_turns"]
+    if keep <= 0:
+        return []
+    turns = split_turns(state["messages"])
+    if len(turns) < keep + max(1, HISTORY_CONFIG["summarize_every_turns"]):
+        return []
+    older, _ = _split_recent(state["messages"])
+    return older
+
+
+def _compress_update(older, summary):
+    return {
+        "history_summary": summary,
+        "messages": [RemoveMessage(id=msg.id) for msg in older if msg.id],
+    }
+
+
+def summarize_history(state: State, config: RunnableConfig):
+    """Fold turns beyond the verbatim window into ``history_summary`` and drop them from the thread."""
+    older = _older_to_compress(state)
+    if not older:
+        return {}
+    previous = state.get("history_summary") or ""
+    summary = None
+    if HISTORY_CONFIG["summarize_with_llm"]:
+        try:
+            summary = get_llm_for("history").invoke(_summary_prompt(previous, older)).content
+        except Exception as e:
+            print(f"Warning: History summarization failed, using extractive summary. Error: {e}")
+    if not summary:
+        summary = _join_summary(previous, extractive_summary(older))
+    return _compress_update(older, summary)
+
+
+async def asummarize_history(state: State, config: RunnableConfig):
+    """Async twin of ``summarize_history`` used by ainvoke/astream."""
+    older = _older_to_compress(state)
+    if not older:
+        return {}
+    previous = state.get("history_summary") or ""
+    summary = None
+    if HISTORY_CONFIG["summarize_with_llm"]:
+        try:
+            summary = (await get_llm_for("history").ainvoke(_summary_prompt(previous, older))).content
+        except Exception as e:
+            print(f"Warning: History summarization failed, using extractive summary. Error: {e}")
+    if not summary:
+        summary = _join_summary(previous, extractive_summary(older))
+    return _compress_update(older, summary)
@@ -0,0 +1,437 @@
+"""
+Per-node and per-tool instrumentation of graph runs.
+
+``TraceRecorder`` is a LangChain callback handler that turns the callbacks of
+one graph run into a tree of spans: every graph node (keyed by its path
+through the sub-agent graphs, e.g. ``supervisor/searcher_subagent/searcher_tool_node``),
+every chat model call and every tool call. Each span records:
+
+- wall time, and the part of it spent waiting for an upstream rate limiter
+  (``rate_limit.py``);
+- prompt, completion and cached prompt tokens of model calls, and the
+  prefix-cache hit ratio the provider reports;
+- input and output sizes of tool calls;
+- cache lookups (search, response and semantic caches) made inside it.
+
+Finished spans update the metrics registry (``graph_node_seconds``,
+``llm_call_seconds``, ``llm_tokens_total``, ``tool_seconds``,
+``tool_payload_bytes``, ...), which ``metrics.render_prometheus()`` exposes on
+``GET /metrics``. When the run itself finishes, its whole span tree is logged
+as one JSON line on the ``multi_agent_system.trace`` logger.
+
+Attach the recorder with ``instrument(config)`` before running the graph.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .config import INSTRUMENTATION_CONFIG
+from .metrics import counter, histogram
+
+trace_logger = logging.getLogger("multi_agent_system.trace")
+
+
+class _Span:
+    """One node, model or tool run inside a trace."""
+
+    __slots__ = ("index", "parent", "kind", "name", "node", "namespace", "started", "seconds", "queue_seconds",
+                 "tokens", "cached", "payload", "cache_lookups", "error")
+
+    def __init__(self, index, parent, kind, name, node, namespace=None):
+        self.index = index
+        self.parent = parent  # index of the enclosing span, or None
+        self.kind = kind  # "node" | "llm" | "tool"
+        self.name = name
+        self.node = node  # path of the enclosing node (the span's own path for nodes)
+        self.namespace = namespace
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.queue_seconds = 0.0
+        self.tokens = None
+        self.cached = False
+        self.payload = None
+        self.cache_lookups = {}  # cache name -> [hits, misses]
+        self.error = None
+
+    def as_dict(self, trace_started):
+        span = {
+            "id": self.index,
+            "parent": self.parent,
+            "kind": self.kind,
+            "name": self.name,
+            "node": self.node,
+            "start_ms": round((self.started - trace_started) * 1000, 2),
+            "ms": None if self.seconds is None else round(self.seconds * 1000, 2),
+        }
+        if self.queue_seconds:
+            span["queue_ms"] = round(self.queue_seconds * 1000, 2)
+        if self.tokens:
+            span["tokens"] = self.tokens
+        if self.cached:
+            span["cached"] = True
+        if self.payload:
+            span["payload_bytes"] = self.payload
+        if self.cache_lookups:
+            span["cache_lookups"] = {name: {"hits": hits, "misses": misses}
+                                     for name, (hits, misses) in self.cache_lookups.items()}
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class _Trace:
+    """Spans of one root graph run."""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.run_ids = set()
+
+
+def _size(value):
+    """Bytes of a tool input or output as it is sent to / returned from the tool."""
+    content = getattr(value, "content", value)
+    if not isinstance(content, str):
+        try:
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            content = str(content)
+    return len(content.encode("utf-8"))
+
+
+def _is_failure(error):
+    """LangGraph signals handoffs and interrupts by raising ``GraphBubbleUp`` subclasses; those are not failures."""
+    return error is not None and not any(cls.__name__ == "GraphBubbleUp" for cls in type(error).__mro__)
+
+
+def _usage(response):
+    """``(prompt, completion, cached prompt)`` tokens and the cache flag of an ``LLMResult``."""
+    prompt = completion = cached_prompt = 0
+    cached = False
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is None:
+                continue
+            cached = cached or bool(message.response_metadata.get("cache_hit"))
+            usage = getattr(message, "usage_metadata", None) or {}
+            prompt += usage.get("input_tokens", 0)
+            completion += usage.get("output_tokens", 0)
+            cached_prompt += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if not (prompt or completion):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0) or 0
+        completion = usage.get("completion_tokens", 0) or 0
+        cached_prompt = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    return prompt, completion, cached_prompt, cached
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """
+    Callback handler recording a span tree per root graph run.
+
+    One recorder serves any number of concurrent runs; spans are grouped by
+    the root run they descend from.
+
+    Args:
+        trace_log (bool): Log each finished run as JSON on ``multi_agent_system.trace``.
+        max_spans (int): Spans kept per logged trace; later ones are only counted.
+    """
+
+    # Cheap and lock-protected, so run it on the caller's thread or event loop
+    # instead of LangChain's default executor hop per callback.
+    run_inline = True
+
+    def __init__(self, trace_log=True, max_spans=500):
+        self.trace_log = trace_log
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._runs = {}  # open run id -> (parent run id, trace)
+        self._spans = {}  # open run id -> span
+
+    # -- span bookkeeping -------------------------------------------------
+
+    def _enclosing(self, run_id):
+        """The innermost open span at or above ``run_id``."""
+        while run_id is not None:
+            span = self._spans.get(run_id)
+            if span is not None:
+                return span
+            entry = self._runs.get(run_id)
+            run_id = entry[0] if entry else None
+        return None
+
+    def _ancestors(self, run_id):
+        while run_id is not None:
+            span = self._spans.get(run_id)
+            if span is not None:
+                yield span
+            entry = self._runs.get(run_id)
+            run_id = entry[0] if entry else None
+
+    def _open(self, run_id, parent_run_id, metadata=None):
+        """Register a run and return its trace (a new one for a root run)."""
+        entry = self._runs.get(parent_run_id) if parent_run_id is not None else None
+        trace = entry[1] if entry else _Trace(dict(metadata or {}))
+        self._runs[run_id] = (parent_run_id, trace)
+        trace.run_ids.add(run_id)
+        return trace
+
+    def _start_span(self, run_id, parent_run_id, trace, kind, name, node, namespace=None):
+        parent = self._enclosing(parent_run_id)
+        span = _Span(len(trace.spans) + trace.dropped, parent.index if parent else None, kind, name, node, namespace)
+        if len(trace.spans) < self.max_spans:
+            trace.spans.append(span)
+        else:
+            trace.dropped += 1
+        self._spans[run_id] = span
+        return span
+
+    def _end(self, run_id, error=None):
+        """Close ``run_id``; returns ``(span or None, finished trace or None)``."""
+        entry = self._runs.get(run_id)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.seconds = time.perf_counter() - span.started
+            if _is_failure(error):
+                span.error = type(error).__name__
+        if entry is None:
+            return span, None
+        parent_run_id, trace = entry
+        if parent_run_id is not None:
+            del self._runs[run_id]
+            trace.run_ids.discard(run_id)
+            return span, None
+        # The root finished: forget whatever it left open (cancelled children).
+        for open_run in trace.run_ids:
+            self._runs.pop(open_run, None)
+            self._spans.pop(open_run, None)
+        return span, trace
+
+    # -- chains (graph nodes) ---------------------------------------------
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        with self._lock:
+            trace = self._open(run_id, parent_run_id, metadata)
+            # Only the node run itself, not the runnables nested inside it.
+            if node is None or kwargs.get("name") != node:
+                return
+            namespace = str(metadata.get("langgraph_checkpoint_ns", ""))
+            # A sub-agent node wraps a compiled graph run with the same namespace; record it once.
+            if any(span.namespace == namespace for span in self._ancestors(parent_run_id)):
+                return
+            parts = [part.split(":")[0] for part in namespace.split("|")]
+            path = "/".join(parts[:-1] + [node])
+            self._start_span(run_id, parent_run_id, trace, "node", node, path, namespace)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    # -- chat models --------------------------------------------------------
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        with self._lock:
+            trace = self._open(run_id, parent_run_id, metadata)
+            enclosing = self._enclosing(parent_run_id)
+            name = metadata.get("ls_model_name") or kwargs.get("name") or (serialized or {}).get("name") or "chat_model"
+            self._start_span(run_id, parent_run_id, trace, "llm", name, enclosing.node if enclosing else None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt, completion, cached_prompt, cached = _usage(response)
+        with self._lock:
+            span = self._spans.get(run_id)
+            if span is not None:
+                span.cached = cached
+                # A cached reply carries the usage of the call that produced it; nothing was spent now.
+                if (prompt or completion) and not cached:
+                    span.tokens = {"prompt": prompt, "completion": completion, "cached_prompt": cached_prompt}
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    # -- tools --------------------------------------------------------------
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, inputs=None,
+                      **kwargs):
+        with self._lock:
+            trace = self._open(run_id, parent_run_id, metadata)
+            enclosing = self._enclosing(parent_run_id)
+            name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+            span = self._start_span(run_id, parent_run_id, trace, "tool", name, enclosing.node if enclosing else None)
+            span.payload = {"input": _size(inputs if inputs is not None else input_str)}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self._lock:
+            span = self._spans.get(run_id)
+            if span is not None and span.payload is not None:
+                span.payload["output"] = _size(output)
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    # -- annotations from inside a run --------------------------------------
+
+    def add_queue_wait(self, run_id, upstream, seconds):
+        """Charge ``seconds`` of rate-limiter wait to every open span around ``run_id``."""
+        with self._lock:
+            for span in self._ancestors(run_id):
+                span.queue_seconds += seconds
+
+    def add_cache_lookup(self, run_id, cache, hit):
+        """Count a cache lookup made inside the innermost open span around ``run_id``."""
+        with self._lock:
+            span = self._enclosing(run_id)
+            if span is None:
+                return
+            counts = span.cache_lookups.setdefault(cache, [0, 0])
+            counts[0 if hit else 1] += 1
+            node = span.node
+        counter("graph_cache_lookups_total", "Cache lookups per graph node").inc(
+            node=node, cache=cache, outcome="hit" if hit else "miss"
+        )
+
+    # -- export ---------------------------------------------------------------
+
+    def _finish(self, run_id, error=None):
+        with self._lock:
+            span, trace = self._end(run_id, error)
+        if span is not None:
+            _record(span)
+        if trace is not None:
+            self._emit(trace, error)
+
+    def _emit(self, trace, error):
+        if not self.trace_log or not trace_logger.isEnabledFor(logging.INFO):
+            return
+        metadata = trace.metadata
+        record = {
+            "request_id": metadata.get("request_id"),
+            "thread_id": metadata.get("thread_id"),
+            "user_id": metadata.get("user_id"),
+            "outcome": type(error).__name__ if _is_failure(error) else "ok",
+            "ms": round((time.perf_counter() - trace.started) * 1000, 2),
+            "admission_wait_ms": round(metadata.get("admission_wait_seconds", 0.0) * 1000, 2),
+            "spans": [span.as_dict(trace.started) for span in trace.spans],
+        }
+        if trace.dropped:
+            record["dropped_spans"] = trace.dropped
+        trace_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _record(span):
+    """Feed a finished span into the metrics registry."""
+    outcome = "error" if span.error else "ok"
+    if span.kind == "node":
+        histogram("graph_node_seconds", "Wall time per graph node").observe(
+            span.seconds, node=span.node, outcome=outcome
+        )
+        if span.queue_seconds:
+            histogram("graph_node_queue_wait_seconds", "Rate-limiter wait inside each graph node").observe(
+                span.queue_seconds, node=span.node
+            )
+    elif span.kind == "llm":
+        histogram("llm_call_seconds", "Wall time per chat model call").observe(
+            span.seconds, node=span.node, model=span.name, cached=str(span.cached).lower()
+        )
+        if span.tokens:
+            tokens = counter("llm_tokens_total", "Tokens per node, model and kind")
+            for kind, count in span.tokens.items():
+                if count:
+                    tokens.inc(count, node=span.node, model=span.name, kind=kind)
+            if span.tokens["prompt"]:
+                # Share of the prompt the provider served from its prefix cache (see prompts.py).
+                histogram("llm_prefix_cache_hit_ratio", "Cached share of prompt tokens per call").observe(
+                    span.tokens["cached_prompt"] / span.tokens["prompt"], node=span.node, model=span.name
+                )
+    else:
+        histogram("tool_seconds", "Wall time per tool call").observe(
+            span.seconds, tool=span.name, node=span.node, outcome=outcome
+        )
+        payload = histogram("tool_payload_bytes", "Tool input and output sizes")
+        for direction, size in (span.payload or {}).items():
+            payload.observe(size, tool=span.name, direction=direction)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_trace_recorder():
+    """Return the process-wide recorder built from ``INSTRUMENTATION_CONFIG``."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = TraceRecorder(
+                    trace_log=INSTRUMENTATION_CONFIG["trace_log"],
+                    max_spans=INSTRUMENTATION_CONFIG["max_spans_per_trace"],
+                )
+    return _recorder
+
+
+def instrument(config, **metadata):
+    """
+    Attach the recorder to a run config (in place) and return it.
+
+    ``metadata`` (e.g. ``admission_wait_seconds``) ends up in the trace log
+    together with the thread and user ids; a ``request_id`` is generated
+    unless one is given.
+    """
+    if not INSTRUMENTATION_CONFIG["enabled"]:
+        return config
+    configurable = config.get("configurable", {})
+    merged = {
+        "request_id": uuid.uuid4().hex,
+        "thread_id": configurable.get("thread_id"),
+        "user_id": configurable.get("user_id"),
+    }
+    merged.update(metadata)
+    config["metadata"] = {**config.get("metadata", {}), **merged}
+    config["callbacks"] = [*(config.get("callbacks") or []), get_trace_recorder()]
+    return config
+
+
+def _current():
+    """The recorder and run of the runnable executing in this context, if any."""
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    config = var_child_runnable_config.get()
+    manager = config.get("callbacks") if config else None
+    run_id = getattr(manager, "parent_run_id", None)
+    if run_id is None:
+        return None, None
+    for handler in manager.handlers:
+        if isinstance(handler, TraceRecorder):
+            return handler, run_id
+    return None, None
+
+
+def record_queue_wait(upstream, seconds):
+    """Attribute rate-limiter wait to the running node/tool; a no-op outside a traced run."""
+    if seconds <= 0:
+        return
+    recorder, run_id = _current()
+    if recorder is not None:
+        recorder.add_queue_wait(run_id, upstream, seconds)
+
+
+def record_cache_lookup(cache, hit):
+    """Attribute a cache lookup to the running node/tool; a no-op outside a traced run."""
+    recorder, run_id = _current()
+    if recorder is not None:
+        recorder.add_cache_lookup(run_id, cache, hit)
@@ -1,36 +1,50 @@
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
 from multi_agent_system.state import State
-from multi_agent_system.utils import show_graph
-from multi_agent_system.memory_tool import load_memory
-from multi_agent_system.supervisor import create_supervisor
-from multi_agent_system.memory_agent import create_memory
-from langgraph.checkpoint.memory import MemorySaver # For short-term memory (thread-level state persistence)
-from langgraph.store.memory import InMemoryStore # For long-term memory (storing user preferences)
-from multi_agent_system.config import LLM_CONFIG
+from multi_agent_system.utils import show_graph, store_node, dual_node
+from multi_agent_system.history import summarize_history, asummarize_history
+from multi_agent_system.memory_tool import load_memory, aload_memory
+from multi_agent_system.registry import get_supervisor, warm_up
+from multi_agent_system.memory_agent import create_memory, acreate_memory, enqueue_memory, aenqueue_memory
+from multi_agent_system.config import MEMORY_CONFIG
+from multi_agent_system.memory_queue import flush_memory_updates
+from multi_agent_system.persistence import get_checkpointer, get_store
 
 
 def create_invest_assistant():
     """Creates a multi-agent investment assistant with memory management."""
-     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
+    # Short-term (thread checkpoints) and long-term (user profiles) memory come
+    # from the shared backend selected by PERSISTENCE_CONFIG.
+    in_memory_store = get_store()
 
-    in_memory_store = InMemoryStore()
+    checkpointer = get_checkpointer()
 
-    checkpointer = MemorySaver()
+    # Compile the supervisor and its sub-agents once; every turn reuses them.
+    warm_up()
 
     invest_assistan_agent = StateGraph(State)
 
-    invest_assistan_agent.add_node("load_memory", load_memory) 
-    invest_assistan_agent.add_node("supervisor", create_supervisor)  # Call the function to get the compiled graph
-    invest_assistan_agent.add_node("create_memory", create_memory)
+    # Memory nodes carry sync and async implementations, so the compiled graph
+    # serves invoke/stream as well as ainvoke/astream.
+    invest_assistan_agent.add_node("load_memory", store_node(load_memory, aload_memory))
+    # Fold turns beyond the verbatim window into the rolling summary so the
+    # thread (and every agent prompt) stays bounded.
+    invest_assistan_agent.add_node("summarize_history", dual_node(summarize_history, asummarize_history))
+    invest_assistan_agent.add_node("supervisor", get_supervisor())  # Shared compiled graph, built once per process
+
+    # By default the profile update is queued for background workers so the
+    # answer is not held back by the extra LLM round trip.
+    if MEMORY_CONFIG["deferred"]:
+        memory_node = "enqueue_memory"
+        invest_assistan_agent.add_node(memory_node, store_node(enqueue_memory, aenqueue_memory))
+    else:
+        memory_node = "create_memory"
+        invest_assistan_agent.add_node(memory_node, store_node(create_memory, acreate_memory))
 
     invest_assistan_agent.add_edge(START, "load_memory")
-    invest_assistan_agent.add_edge("load_memory", "supervisor")
-    invest_assistan_agent.add_edge("supervisor", "create_memory")
-    invest_assistan_agent.add_edge("create_memory", END)
+    invest_assistan_agent.add_edge("load_memory", "summarize_history")
+    invest_assistan_agent.add_edge("summarize_history", "supervisor")
+    invest_assistan_agent.add_edge("supervisor", memory_node)
+    invest_assistan_agent.add_edge(memory_node, END)
 
     # Compile the entire, sophisticated graph.
     invest_assistant_workflow = invest_assistan_agent.compile(name="multi_agent_verify", checkpointer=checkpointer, store=in_memory_store)
@@ -55,4 +69,7 @@ if __name__ == "__main__":
     # Print results
     print("Response:")
     for message in result["messages"]:
-        message.pretty_print() 
\ No newline at end of file
+        message.pretty_print()
+
+    # Make sure the deferred profile update is written before exiting.
+    flush_memory_updates() 
\ No newline at end of file
@@ -0,0 +1,385 @@
+"""
+Shared, connection-pooled LLM clients.
+
+Every agent used to build its own ``ChatOpenAI`` and therefore its own HTTP
+client, losing keep-alive and TLS session reuse to the DashScope endpoint.
+This module keeps one sync and one async ``httpx`` client per endpoint and one
+``ChatOpenAI`` per distinct model setting, all shared process-wide. Requests
+go through the per-model rate limiter and retry policy of rate_limit.py.
+Agents ask for their model by node name (``get_llm_for``), so the active
+``LLM_NODE_CONFIG`` profile decides which model each node uses.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+
+from .config import LLM_CONFIG, LLM_NODE_CONFIG, LLM_POOL_CONFIG, load_env
+from .rate_limit import OK, TRANSIENT, classify_error, classify_status, get_limiter, retry_delay
+
+_lock = threading.Lock()
+_http_clients = {}  # (base_url, "sync" | "async") -> httpx client
+_pool_stats = {}  # base_url -> _PoolStats
+_llms = {}  # frozen settings -> ChatOpenAI
+_llm_factory = None  # replaces ChatOpenAI when set, see set_llm_factory
+
+
+class _PoolStats:
+    """Request counters for one endpoint, shared by its sync and async transports."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests_total = 0
+        self.errors_total = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests_total += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, failed):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors_total += 1
+
+
+def _upstream(request):
+    """Rate-limiter name for an LLM request: ``llm:<model>`` taken from the JSON body."""
+    model = None
+    try:
+        model = json.loads(request.content).get("model")
+    except (httpx.RequestNotRead, ValueError, AttributeError):
+        pass
+    return f"llm:{model or LLM_CONFIG['model']}"
+
+
+class _ReleaseOnClose:
+    """Runs ``release`` once, when the response body is closed (or garbage collected)."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __del__(self):
+        self._done()
+
+
+class _ReleasingStream(_ReleaseOnClose, httpx.SyncByteStream):
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+
+class _AsyncReleasingStream(_ReleaseOnClose, httpx.AsyncByteStream):
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+def _retry_or_none(name, attempt, request, outcome, retry_after):
+    # Only requests with an in-memory body can be sent again.
+    if outcome == OK or not isinstance(request.stream, httpx.ByteStream):
+        return None
+    return retry_delay(name, attempt, outcome, retry_after)
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """
+    HTTP transport that applies the shared rate limiter and retry policy (see
+    rate_limit.py) and records in-flight requests for ``pool_stats``.
+
+    The limiter slot is held until the response body is closed, so streamed
+    completions count against the concurrency limit for their whole duration.
+    """
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def _send(self, request):
+        self._stats.started()
+        failed = True
+        try:
+            response = super().handle_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._stats.finished(failed)
+
+    def handle_request(self, request):
+        name = _upstream(request)
+        limiter = get_limiter(name)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                response = self._send(request)
+            except Exception as e:
+                outcome, retry_after = classify_error(e)
+                limiter.release(outcome or TRANSIENT, retry_after)
+                delay = _retry_or_none(name, attempt, request, outcome, retry_after)
+                if delay is None:
+                    raise
+            else:
+                outcome, retry_after = classify_status(response.status_code, response.headers)
+                delay = _retry_or_none(name, attempt, request, outcome, retry_after)
+                if delay is None:
+                    response.stream = _ReleasingStream(response.stream, lambda: limiter.release(outcome, retry_after))
+                    return response
+                response.close()
+                limiter.release(outcome, retry_after)
+            time.sleep(delay)
+            attempt += 1
+
+
+class _AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of ``_CountingTransport``."""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def _send(self, request):
+        self._stats.started()
+        failed = True
+        try:
+            response = await super().handle_async_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._stats.finished(failed)
+
+    async def handle_async_request(self, request):
+        name = _upstream(request)
+        limiter = get_limiter(name)
+        attempt = 0
+        while True:
+            await limiter.aacquire()
+            try:
+                response = await self._send(request)
+            except Exception as e:
+                outcome, retry_after = classify_error(e)
+                limiter.release(outcome or TRANSIENT, retry_after)
+                delay = _retry_or_none(name, attempt, request, outcome, retry_after)
+                if delay is None:
+                    raise
+            else:
+                outcome, retry_after = classify_status(response.status_code, response.headers)
+                delay = _retry_or_none(name, attempt, request, outcome, retry_after)
+                if delay is None:
+                    response.stream = _AsyncReleasingStream(
+                        response.stream, lambda: limiter.release(outcome, retry_after)
+                    )
+                    return response
+                await response.aclose()
+                limiter.release(outcome, retry_after)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_POOL_CONFIG["max_connections"],
+        max_keepalive_connections=LLM_POOL_CONFIG["max_keepalive_connections"],
+        keepalive_expiry=LLM_POOL_CONFIG["keepalive_expiry"],
+    )
+
+
+def _timeout(read=None):
+    return httpx.Timeout(
+        connect=LLM_POOL_CONFIG["connect_timeout"],
+        read=read or LLM_POOL_CONFIG["read_timeout"],
+        write=LLM_POOL_CONFIG["write_timeout"],
+        pool=LLM_POOL_CONFIG["pool_timeout"],
+    )
+
+
+def _get_http_client(base_url, kind):
+    key = (base_url, kind)
+    client = _http_clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _http_clients.get(key)
+        if client is None:
+            stats = _pool_stats.setdefault(base_url, _PoolStats())
+            if kind == "sync":
+                transport = _CountingTransport(stats, limits=_limits())
+                client = httpx.Client(transport=transport, timeout=_timeout())
+            else:
+                transport = _AsyncCountingTransport(stats, limits=_limits())
+                client = httpx.AsyncClient(transport=transport, timeout=_timeout())
+            _http_clients[key] = client
+    return client
+
+
+def get_http_client(base_url=None):
+    """Return the shared, pooled sync ``httpx.Client`` for ``base_url``."""
+    return _get_http_client(base_url or LLM_CONFIG["base_url"], "sync")
+
+
+def get_async_http_client(base_url=None):
+    """
+    Return the shared, pooled ``httpx.AsyncClient`` for ``base_url``.
+
+    Async connections belong to the event loop that opened them, so a process
+    should drive async calls from a single long-lived loop.
+    """
+    return _get_http_client(base_url or LLM_CONFIG["base_url"], "async")
+
+
+def get_llm(**overrides):
+    """
+    Return a shared ``ChatOpenAI`` for ``LLM_CONFIG`` updated with ``overrides``.
+
+    Instances are cached per distinct setting, and all instances that target
+    the same endpoint share one sync and one async connection pool.
+
+    Args:
+        **overrides: Any ``ChatOpenAI`` argument, e.g. ``model`` or ``temperature``.
+            A numeric ``timeout`` replaces the read timeout of the pool defaults.
+
+    Returns:
+        ChatOpenAI: The shared chat model.
+    """
+    settings = {**LLM_CONFIG, **overrides}
+    key = tuple(sorted((name, repr(value)) for name, value in settings.items()))
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+
+    if _llm_factory is not None:
+        with _lock:
+            return _llms.setdefault(key, _llm_factory(**settings))
+
+    # Deferred so that modules which only need the helpers here stay cheap to import.
+    from langchain_openai import ChatOpenAI
+
+    load_env()
+    base_url = settings.get("base_url")
+    settings.setdefault("max_retries", LLM_POOL_CONFIG["max_retries"])
+    if not isinstance(settings.get("timeout"), httpx.Timeout):
+        settings["timeout"] = _timeout(settings.get("timeout"))
+    llm = ChatOpenAI(
+        **settings,
+        http_client=get_http_client(base_url),
+        http_async_client=get_async_http_client(base_url),
+    )
+    # Two threads may race to build the same model; keep the first one.
+    with _lock:
+        return _llms.setdefault(key, llm)
+
+
+def get_llm_for(node, **overrides):
+    """
+    Return the shared chat model for ``node`` under the active ``LLM_NODE_CONFIG`` profile.
+
+    Args:
+        node (str): "supervisor", "searcher", "summary", "coder", "memory" or "history".
+        **overrides: Applied on top of the node's settings, e.g. ``cache``.
+    """
+    load_env()
+    profile = LLM_NODE_CONFIG["profiles"].get(LLM_NODE_CONFIG["profile"])
+    if profile is None:
+        raise ValueError(f"Unknown LLM profile: {LLM_NODE_CONFIG['profile']}")
+    return get_llm(**{**profile.get(node, {}), **overrides})
+
+
+def set_llm_factory(factory):
+    """
+    Build chat models with ``factory(**settings)`` instead of ``ChatOpenAI``.
+
+    Used by benchmarks to run the graphs against ``fakes.FakeChatModel``; pass
+    None to restore the real client. Graphs compiled earlier keep their models,
+    so call ``registry.reset()`` as well.
+    """
+    global _llm_factory
+    with _lock:
+        _llm_factory = factory
+        _llms.clear()
+
+
+def _pool_connections(client):
+    """Best-effort (open, idle) connection counts from the client's httpcore pool."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+    return len(connections), idle
+
+
+def pool_stats():
+    """
+    Report connection-pool utilization per endpoint.
+
+    Returns:
+        dict: ``{base_url: {...}}`` with request counters, open/idle connections
+        for the sync and async pools and the configured connection limit.
+    """
+    report = {}
+    with _lock:
+        clients = dict(_http_clients)
+        stats = dict(_pool_stats)
+    for base_url, counters in stats.items():
+        entry = {
+            "in_flight": counters.in_flight,
+            "peak_in_flight": counters.peak_in_flight,
+            "requests_total": counters.requests_total,
+            "errors_total": counters.errors_total,
+            "max_connections": LLM_POOL_CONFIG["max_connections"],
+        }
+        for kind in ("sync", "async"):
+            client = clients.get((base_url, kind))
+            open_count, idle_count = _pool_connections(client) if client else (0, 0)
+            entry[f"{kind}_open_connections"] = open_count
+            entry[f"{kind}_idle_connections"] = idle_count
+        entry["utilization"] = counters.in_flight / max(1, LLM_POOL_CONFIG["max_connections"])
+        report[base_url] = entry
+    return report
+
+
+def close_clients():
+    """Close the shared sync clients and forget every cached client (e.g. at shutdown)."""
+    with _lock:
+        clients = dict(_http_clients)
+        _http_clients.clear()
+        _llms.clear()
+    for (_, kind), client in clients.items():
+        if kind == "sync":
+            client.close()
+
+
+async def aclose_clients():
+    """Async variant of ``close_clients`` that also closes the async pools."""
+    with _lock:
+        clients = dict(_http_clients)
+        _http_clients.clear()
+        _llms.clear()
+    for (_, kind), client in clients.items():
+        if kind == "sync":
+            client.close()
+        else:
+            await client.aclose()
@@ -0,0 +1,315 @@
+"""
+Local BM25 index over every page the searcher has fetched.
+
+Pages returned by ``tavily_get_page_content`` and ``tavily_batch_search``
+(earnings reports, government plans, ...) used to be read once and then only
+live inside one thread's messages, so a follow-up question in any thread
+fetched them again. ``LocalCorpus`` keeps them in SQLite, next to the search
+cache and shared by every worker on the host:
+
+- ``corpus_documents``: one row per distinct page content (SHA-1 of the
+  whitespace-normalized text), so mirrors and re-fetches of an unchanged page
+  are indexed once;
+- ``corpus_urls``: the URLs serving each document and when each was last
+  fetched (freshness);
+- ``corpus_chunks`` and the FTS5 table ``corpus_index``: the page split into
+  passages (``search_results.split_chunks``) and indexed by the same terms
+  (words plus CJK bigrams) the result shaping ranks by, so ``bm25()`` works for
+  Chinese text.
+
+The ``search_local_corpus`` tool is offered to the searcher before the web
+tools. Passages of documents older than ``max_age_seconds`` are reported as
+stale with their URL so the searcher fetches them again; re-fetched pages
+replace the old copy.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Annotated
+
+from langchain_core.tools import StructuredTool
+
+from .config import LOCAL_CORPUS_CONFIG, load_env
+from .instrumentation import record_cache_lookup
+from .metrics import counter
+from .search_cache import normalize_url
+from .search_results import split_chunks, tokenize_terms
+from .utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# FTS5 query length is bounded; long questions keep their first terms.
+_MAX_QUERY_TERMS = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corpus_documents (
+    doc_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL UNIQUE, title TEXT NOT NULL,
+    size INTEGER NOT NULL, indexed_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS corpus_urls (
+    url TEXT PRIMARY KEY, doc_id INTEGER NOT NULL, fetched_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS corpus_urls_doc ON corpus_urls (doc_id);
+CREATE INDEX IF NOT EXISTS corpus_urls_fetched ON corpus_urls (fetched_at);
+CREATE TABLE IF NOT EXISTS corpus_chunks (
+    chunk_id INTEGER PRIMARY KEY, doc_id INTEGER NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS corpus_chunks_doc ON corpus_chunks (doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS corpus_index USING fts5(terms);
+"""
+
+_SEARCH = """
+SELECT c.doc_id, c.position, c.text, d.title, u.url, u.fetched_at
+FROM (SELECT rowid, rank FROM corpus_index WHERE corpus_index MATCH ? ORDER BY rank LIMIT ?) AS top
+JOIN corpus_chunks c ON c.chunk_id = top.rowid
+JOIN corpus_documents d ON d.doc_id = c.doc_id
+JOIN corpus_urls u ON u.url = (
+    SELECT url FROM corpus_urls WHERE doc_id = c.doc_id ORDER BY fetched_at DESC LIMIT 1)
+ORDER BY top.rank
+"""
+
+
+def content_hash(text):
+    """Hash of ``text`` with whitespace normalized, so re-rendered copies of a page match."""
+    return hashlib.sha1(" ".join(str(text).split()).encode("utf-8")).hexdigest()
+
+
+class LocalCorpus:
+    """
+    Deduplicated, chunked BM25 index of fetched pages in SQLite.
+
+    Args:
+        path (str): SQLite file; falsy keeps the index in memory.
+        chunk_max_tokens (int): Passage size (approximate tokens).
+        max_documents (int): Documents kept; those fetched least recently go first.
+        retention_seconds (float): Documents not fetched for this long are dropped.
+    """
+
+    def __init__(self, path=None, chunk_max_tokens=240, max_documents=20000, retention_seconds=90 * 24 * 60 * 60):
+        self.chunk_max_tokens = chunk_max_tokens
+        self.max_documents = max_documents
+        self.retention_seconds = retention_seconds
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add_page(self, url, content, title="", fetched_at=None):
+        """
+        Index one fetched page.
+
+        ``fetched_at`` (default: now) becomes the freshness of ``url``. A page
+        whose content is already indexed, under this or another URL, is not
+        indexed again; only the URL and its freshness are recorded.
+
+        Returns:
+            str: "indexed", "duplicate" (same content under another URL),
+            "refreshed" (same URL and content) or "empty".
+        """
+        text = str(content or "").strip()
+        if not url or not text:
+            return "empty"
+        url = normalize_url(url)
+        digest = content_hash(text)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        # Known content only needs its URL recorded; new content is chunked and
+        # tokenized outside the lock, so only the writes are serialized.
+        chunks = None
+        with self._lock:
+            known = self._document(digest) is not None
+        if not known:
+            chunks = self._chunk(text)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                doc_id = self._document(digest)
+                previous = self._conn.execute("SELECT doc_id FROM corpus_urls WHERE url = ?", (url,)).fetchone()
+                if doc_id is not None:
+                    outcome = "refreshed" if previous and previous[0] == doc_id else "duplicate"
+                else:
+                    # Evicted since the first look: chunk it now.
+                    doc_id = self._insert(digest, title or url, text, *(chunks or self._chunk(text)))
+                    outcome = "indexed"
+                self._conn.execute(
+                    "INSERT INTO corpus_urls (url, doc_id, fetched_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(url) DO UPDATE SET doc_id = excluded.doc_id, fetched_at = excluded.fetched_at",
+                    (url, doc_id, fetched_at),
+                )
+                if previous and previous[0] != doc_id:
+                    self._drop_orphans([previous[0]])
+                self._evict(fetched_at)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        counter("local_corpus_pages_total", "Fetched pages offered to the local corpus").inc(outcome=outcome)
+        return outcome
+
+    def _document(self, digest):
+        row = self._conn.execute("SELECT doc_id FROM corpus_documents WHERE content_hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def _chunk(self, text):
+        chunks = split_chunks(text, self.chunk_max_tokens)
+        return chunks, [" ".join(tokenize_terms(chunk)) for chunk in chunks]
+
+    def _insert(self, digest, title, text, chunks, terms):
+        doc_id = self._conn.execute(
+            "INSERT INTO corpus_documents (content_hash, title, size, indexed_at) VALUES (?, ?, ?, ?)",
+            (digest, str(title)[:300], len(text), time.time()),
+        ).lastrowid
+        for position, (chunk, chunk_terms) in enumerate(zip(chunks, terms)):
+            chunk_id = self._conn.execute(
+                "INSERT INTO corpus_chunks (doc_id, position, text) VALUES (?, ?, ?)", (doc_id, position, chunk)
+            ).lastrowid
+            self._conn.execute("INSERT INTO corpus_index (rowid, terms) VALUES (?, ?)", (chunk_id, chunk_terms))
+        return doc_id
+
+    def _drop_orphans(self, doc_ids):
+        """Delete the documents among ``doc_ids`` that no URL serves any more."""
+        for doc_id in doc_ids:
+            if self._conn.execute("SELECT 1 FROM corpus_urls WHERE doc_id = ? LIMIT 1", (doc_id,)).fetchone():
+                continue
+            self._conn.execute(
+                "DELETE FROM corpus_index WHERE rowid IN (SELECT chunk_id FROM corpus_chunks WHERE doc_id = ?)",
+                (doc_id,),
+            )
+            self._conn.execute("DELETE FROM corpus_chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM corpus_documents WHERE doc_id = ?", (doc_id,))
+
+    def _evict(self, now):
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT DISTINCT doc_id FROM corpus_urls WHERE fetched_at < ?", (now - self.retention_seconds,)
+        )]
+        if expired:
+            self._conn.execute("DELETE FROM corpus_urls WHERE fetched_at < ?", (now - self.retention_seconds,))
+            self._drop_orphans(expired)
+        excess = self._conn.execute("SELECT COUNT(*) FROM corpus_documents").fetchone()[0] - self.max_documents
+        if excess > 0:
+            oldest = [row[0] for row in self._conn.execute(
+                "SELECT doc_id FROM corpus_urls GROUP BY doc_id ORDER BY MAX(fetched_at) LIMIT ?", (excess,)
+            )]
+            self._conn.executemany("DELETE FROM corpus_urls WHERE doc_id = ?", [(doc_id,) for doc_id in oldest])
+            self._drop_orphans(oldest)
+
+    def search(self, query, limit=8):
+        """
+        Passages matching ``query``, best first.
+
+        Returns:
+            list: Dicts with ``text``, ``title``, ``url`` (most recently
+            fetched URL of the document), ``fetched_at``, ``doc_id``,
+            ``position`` and ``coverage`` (share of the query terms the
+            passage contains).
+        """
+        query_terms = list(dict.fromkeys(tokenize_terms(query)))[:_MAX_QUERY_TERMS]
+        if not query_terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in query_terms)
+        with self._lock:
+            rows = self._conn.execute(_SEARCH, (match, limit)).fetchall()
+        wanted = set(query_terms)
+        return [
+            {"doc_id": doc_id, "position": position, "text": text, "title": title, "url": url,
+             "fetched_at": fetched_at, "coverage": len(wanted & set(tokenize_terms(text))) / len(wanted)}
+            for doc_id, position, text, title, url, fetched_at in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": self._conn.execute("SELECT COUNT(*) FROM corpus_documents").fetchone()[0],
+                "urls": self._conn.execute("SELECT COUNT(*) FROM corpus_urls").fetchone()[0],
+                "chunks": self._conn.execute("SELECT COUNT(*) FROM corpus_chunks").fetchone()[0],
+            }
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_local_corpus():
+    """Return the process-wide corpus built from ``LOCAL_CORPUS_CONFIG``."""
+    global _corpus
+    if _corpus is None:
+        load_env()
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = LocalCorpus(
+                    path=LOCAL_CORPUS_CONFIG["path"],
+                    chunk_max_tokens=LOCAL_CORPUS_CONFIG["chunk_max_tokens"],
+                    max_documents=LOCAL_CORPUS_CONFIG["max_documents"],
+                    retention_seconds=LOCAL_CORPUS_CONFIG["retention_seconds"],
+                )
+    return _corpus
+
+
+def set_local_corpus(corpus):
+    """Replace the process-wide corpus (e.g. with an in-memory one in tests)."""
+    global _corpus
+    _corpus = corpus
+
+
+def index_pages(pages):
+    """Add the pages of a Tavily ``extract`` response to the corpus; failures are logged, never raised."""
+    if not LOCAL_CORPUS_CONFIG["enabled"]:
+        return
+    for page in pages or ():
+        try:
+            get_local_corpus().add_page(page.get("url"), page.get("raw_content"), page.get("title") or "")
+        except Exception as e:
+            logger.warning("Could not index %s in the local corpus: %s", page.get("url"), e)
+
+
+def _age(seconds):
+    days, hours = int(seconds // 86400), int(seconds // 3600)
+    if days:
+        return f"{days} day{'s' if days > 1 else ''} ago"
+    return f"{hours} hour{'s' if hours > 1 else ''} ago" if hours else "less than an hour ago"
+
+
+def _search_local_corpus(
+    query: Annotated[str, "What to look for in pages fetched earlier."],
+):
+    """Search pages fetched earlier (any thread) before going to the web; stale pages are flagged for refetching."""
+    if not LOCAL_CORPUS_CONFIG["enabled"]:
+        return "The local corpus is disabled; use the web search tools."
+    now = time.time()
+    max_age = LOCAL_CORPUS_CONFIG["max_age_seconds"]
+    hits = [hit for hit in get_local_corpus().search(query, LOCAL_CORPUS_CONFIG["top_k"])
+            if hit["coverage"] >= LOCAL_CORPUS_CONFIG["min_term_coverage"]]
+    fresh = [hit for hit in hits if now - hit["fetched_at"] <= max_age]
+    stale = list(dict.fromkeys(hit["url"] for hit in hits if now - hit["fetched_at"] > max_age))
+    outcome = "hit" if fresh else "stale" if stale else "miss"
+    counter("local_corpus_lookups_total", "search_local_corpus calls by outcome").inc(outcome=outcome)
+    record_cache_lookup("local_corpus", bool(fresh))
+
+    lines = []
+    if fresh:
+        lines.append(f"Local corpus results for \"{query}\" (pages fetched earlier; cite their URLs)")
+        used = estimate_tokens(lines[0])
+        # Passages are picked best first within the budget, then printed per document in page order.
+        documents = {}
+        for hit in fresh:
+            cost = estimate_tokens(hit["text"]) + 2
+            if used + cost > LOCAL_CORPUS_CONFIG["budget_tokens"]:
+                continue
+            used += cost
+            documents.setdefault(hit["doc_id"], []).append(hit)
+        for passages in documents.values():
+            first = passages[0]
+            lines.append(f"- {first['title']} ({first['url']}; fetched {_age(now - first['fetched_at'])})")
+            lines.extend(f"    {hit['text']}" for hit in sorted(passages, key=lambda hit: hit["position"]))
+    else:
+        lines.append(f"No fresh local pages match \"{query}\"; use tavily_batch_search or tavily_search.")
+    if stale:
+        lines.append("Stale matches, refetch with tavily_get_page_content if still relevant: " + ", ".join(stale))
+    return "\n".join(lines)
+
+
+search_local_corpus = StructuredTool.from_function(func=_search_local_corpus, name="search_local_corpus")
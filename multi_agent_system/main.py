@@ -0,0 +1,413 @@
+"""
+ASGI serving entry point for the investment assistant.
+
+Each worker process compiles one ``create_invest_assistant`` graph at startup
+and serves it over HTTP:
+
+- ``POST /v1/chat/stream``: Server-Sent Events. ``token`` events carry LLM
+  tokens as they are generated, ``update`` events report finished nodes
+  (routing, tool calls, tool results), and ``done`` carries the final answer.
+  The first token therefore arrives long before the turn completes.
+- ``POST /v1/chat``: the same turn as a single JSON response.
+- ``GET /healthz``: liveness. ``GET /readyz``: graph compiled and not draining.
+- ``GET /metrics``: this process's metrics in the Prometheus text format,
+  including per-node and per-tool timings (see ``instrumentation.py``).
+
+Request body: ``{"message": "...", "thread_id": "...", "user_id": "..."}``;
+``thread_id`` defaults to a new id and ``user_id`` to the thread id. A thread
+runs one turn at a time: a request for a thread whose previous turn is still
+running in this process gets 409.
+
+Run with ``python -m multi_agent_system.main`` (settings in ``SERVER_CONFIG``)
+or ``uvicorn multi_agent_system.main:app --workers N``.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, RemoveMessage
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from .config import SERVER_CONFIG, load_env
+from .instrumentation import instrument
+from .invest_assistant import create_invest_assistant
+from .llm_client import aclose_clients
+from .memory_queue import shutdown_memory_queue
+from .metrics import counter, histogram, render_prometheus
+from .persistence import close_persistence
+from .rate_limit import retry_budget
+from .repl_pool import close_repl_pool
+
+logger = logging.getLogger(__name__)
+
+# Longest message content echoed in ``update`` events.
+_UPDATE_CONTENT_CHARS = 500
+
+
+class ServerState:
+    """
+    Per-process serving state: the compiled graph plus admission control.
+
+    A slot is held per running turn, and so is its thread id: two turns of
+    one thread would otherwise interleave their checkpoint writes.
+
+    Args:
+        max_concurrent (int): Turns processed at once; further requests wait
+            for a slot up to ``queue_timeout_seconds`` and are then rejected.
+    """
+
+    def __init__(self, max_concurrent):
+        self.graph = None
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._threads = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def acquire(self, timeout):
+        """Wait for a free slot; return False if none frees up within ``timeout`` seconds."""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            histogram("server_queue_wait_seconds", "Time requests waited for a free slot").observe(
+                time.perf_counter() - started
+            )
+        self.in_flight += 1
+        self._idle.clear()
+        return True
+
+    def claim(self, thread_id):
+        """Mark a turn of ``thread_id`` as running; return False if one already is."""
+        if thread_id in self._threads:
+            return False
+        self._threads.add(thread_id)
+        return True
+
+    def unclaim(self, thread_id):
+        self._threads.discard(thread_id)
+
+    def release(self, thread_id):
+        """Free the slot and the thread claimed for one admitted turn."""
+        self.unclaim(thread_id)
+        self.in_flight -= 1
+        self._slots.release()
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def releaser(self, thread_id):
+        """A callable that releases one admitted turn the first time it is called and is a no-op after."""
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.release(thread_id)
+
+        return release
+
+    async def wait_idle(self, timeout):
+        """Wait until no request is in flight; return False on timeout."""
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        return self.in_flight == 0
+
+
+def _error(status, message):
+    headers = {"Retry-After": "1"} if status == 503 else None
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+async def _parse_turn(request):
+    """Return ``(graph input, config)`` or ``(None, error response)``."""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not str(body.get("message") or "").strip():
+        return None, _error(400, "Body must be a JSON object with a non-empty 'message'.")
+    thread_id = str(body.get("thread_id") or uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id, "user_id": str(body.get("user_id") or thread_id)}}
+    return {"messages": [HumanMessage(content=str(body["message"]))]}, config
+
+
+async def _admit(server, endpoint, config):
+    """Reserve the thread and a slot for one turn, or return the 409/503 response to send instead."""
+    if not server.ready or server.draining:
+        counter("server_rejected_total", "Requests rejected before running").inc(endpoint=endpoint, reason="not_ready")
+        return _error(503, "Server is not ready.")
+    thread_id = config["configurable"]["thread_id"]
+    if not server.claim(thread_id):
+        counter("server_rejected_total", "Requests rejected before running").inc(endpoint=endpoint, reason="thread_busy")
+        return _error(409, "A turn for this thread is still running.")
+    queued = time.perf_counter()
+    admitted = False
+    try:
+        admitted = await server.acquire(SERVER_CONFIG["queue_timeout_seconds"])
+    finally:
+        # Also when the client disconnects while queued.
+        if not admitted:
+            server.unclaim(thread_id)
+    if not admitted:
+        counter("server_rejected_total", "Requests rejected before running").inc(endpoint=endpoint, reason="busy")
+        return _error(503, "Too many concurrent requests.")
+    instrument(config, endpoint=endpoint, admission_wait_seconds=time.perf_counter() - queued)
+    return None
+
+
+def _final_answer(values):
+    """Content of the last AI message of the turn."""
+    for message in reversed(values.get("messages", [])):
+        if isinstance(message, AIMessage) and message.content and not message.tool_calls:
+            return message.content
+    return ""
+
+
+def _is_llm_output(message, metadata):
+    """
+    Whether a ``messages``-mode item is model text worth streaming.
+
+    That is a streamed chunk, or a whole message from a model that does not
+    stream (recognisable by the ``ls_provider`` tracing metadata). Messages
+    emitted by nodes, such as handoff notices and tool results, are left to the
+    ``update`` events.
+    """
+    if not isinstance(message, AIMessage) or not isinstance(message.content, str) or not message.content:
+        return False
+    return isinstance(message, AIMessageChunk) or bool(metadata.get("ls_provider"))
+
+
+def _describe_message(message):
+    data = {
+        "type": message.type,
+        "name": message.name,
+        "content": str(message.content)[:_UPDATE_CONTENT_CHARS],
+    }
+    if isinstance(message, AIMessage) and message.tool_calls:
+        data["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in message.tool_calls]
+    return data
+
+
+def _update_events(namespace, update):
+    """Turn one ``updates`` chunk ({node: output}) into ``update`` event payloads."""
+    for node, output in (update or {}).items():
+        messages = output.get("messages", []) if isinstance(output, dict) else []
+        yield {
+            "namespace": list(namespace),
+            "node": node,
+            "messages": [
+                _describe_message(message) for message in messages
+                if isinstance(message, BaseMessage) and not isinstance(message, RemoveMessage)
+            ],
+        }
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    ``StreamingResponse`` that releases the request's slot when it is done.
+
+    The body generator releases the slot as soon as the turn ends; this covers
+    the case where it never runs at all, e.g. the client disconnected before
+    the body was iterated.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+async def _stream_turn(server, payload, config, release):
+    """Run one turn and yield it as SSE; ``release`` frees the slot reserved by ``_admit``."""
+    thread_id = config["configurable"]["thread_id"]
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + SERVER_CONFIG["request_timeout_seconds"]
+    first_token_at = None
+    outcome = "ok"
+    stream = server.graph.astream(
+        payload, config, stream_mode=SERVER_CONFIG["stream_modes"], subgraphs=True
+    ).__aiter__()
+    try:
+        with retry_budget():
+            yield _sse("start", {"thread_id": thread_id})
+            while True:
+                try:
+                    # Bound each step rather than wrapping the generator in a
+                    # timeout scope, which would also cover our own yields.
+                    namespace, mode, data = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if mode == "messages":
+                    chunk, metadata = data
+                    if _is_llm_output(chunk, metadata):
+                        if first_token_at is None:
+                            first_token_at = loop.time()
+                            histogram(
+                                "server_time_to_first_token_seconds", "Time until the first streamed token"
+                            ).observe(first_token_at - started)
+                        yield _sse("token", {
+                            "text": chunk.content,
+                            "node": metadata.get("langgraph_node"),
+                            "namespace": list(namespace),
+                        })
+                elif mode == "updates":
+                    for event in _update_events(namespace, data):
+                        yield _sse("update", event)
+            state = await server.graph.aget_state(config)
+            yield _sse("done", {"thread_id": thread_id, "answer": _final_answer(state.values)})
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        yield _sse("error", {"thread_id": thread_id, "error": "Request timed out."})
+    except Exception as e:
+        outcome = "error"
+        logger.exception("streamed turn failed for thread %s", thread_id)
+        yield _sse("error", {"thread_id": thread_id, "error": str(e)})
+    except asyncio.CancelledError:
+        # The client went away; stop the graph and free the slot.
+        outcome = "cancelled"
+        raise
+    finally:
+        with contextlib.suppress(Exception):
+            await stream.aclose()
+        release()
+        histogram("server_request_seconds", "End-to-end turn latency").observe(
+            loop.time() - started, endpoint="stream", outcome=outcome
+        )
+
+
+async def chat_stream(request):
+    server = request.app.state.server
+    payload, config = await _parse_turn(request)
+    if payload is None:
+        return config
+    rejected = await _admit(server, "stream", config)
+    if rejected is not None:
+        return rejected
+    release = server.releaser(config["configurable"]["thread_id"])
+    return _AdmittedStreamingResponse(
+        _stream_turn(server, payload, config, release),
+        release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def chat(request):
+    server = request.app.state.server
+    payload, config = await _parse_turn(request)
+    if payload is None:
+        return config
+    rejected = await _admit(server, "chat", config)
+    if rejected is not None:
+        return rejected
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        with retry_budget():
+            result = await asyncio.wait_for(
+                server.graph.ainvoke(payload, config), SERVER_CONFIG["request_timeout_seconds"]
+            )
+        return JSONResponse({"thread_id": config["configurable"]["thread_id"], "answer": _final_answer(result)})
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        return _error(504, "Request timed out.")
+    except Exception as e:
+        outcome = "error"
+        logger.exception("turn failed for thread %s", config["configurable"]["thread_id"])
+        return _error(500, str(e))
+    finally:
+        server.release(config["configurable"]["thread_id"])
+        histogram("server_request_seconds", "End-to-end turn latency").observe(
+            time.perf_counter() - started, endpoint="chat", outcome=outcome
+        )
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def readyz(request):
+    server = request.app.state.server
+    if not server.ready or server.draining:
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    return JSONResponse({"status": "ready", "in_flight": server.in_flight})
+
+
+async def metrics(request):
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    load_env()
+    server = ServerState(SERVER_CONFIG["max_concurrent_requests"])
+    app.state.server = server
+    # Compiling the graphs is blocking work; keep the event loop responsive.
+    server.graph = await asyncio.to_thread(create_invest_assistant)
+    server.ready = True
+    logger.info("invest assistant ready")
+    try:
+        yield
+    finally:
+        # Refuse new turns, let in-flight ones finish, then flush deferred
+        # profile updates before closing the store and HTTP pools they use.
+        server.draining = True
+        timeout = SERVER_CONFIG["shutdown_timeout_seconds"]
+        if not await server.wait_idle(timeout):
+            logger.warning("shutting down with %d request(s) still in flight", server.in_flight)
+        await asyncio.to_thread(shutdown_memory_queue, timeout)
+        await asyncio.to_thread(close_repl_pool)
+        close_persistence()
+        await aclose_clients()
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/chat/stream", chat_stream, methods=["POST"]),
+        Route("/v1/chat", chat, methods=["POST"]),
+        Route("/healthz", healthz, methods=["GET"]),
+        Route("/readyz", readyz, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+def main():
+    """Serve ``app`` with uvicorn using ``SERVER_CONFIG``."""
+    import uvicorn
+
+    load_env()
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(
+        "multi_agent_system.main:app",
+        host=SERVER_CONFIG["host"],
+        port=SERVER_CONFIG["port"],
+        workers=SERVER_CONFIG["workers"],
+        timeout_graceful_shutdown=int(SERVER_CONFIG["shutdown_timeout_seconds"]),
+    )
+
+
+if __name__ == "__main__":
+    main()
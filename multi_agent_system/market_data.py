@@ -0,0 +1,498 @@
+"""
+Local columnar store of market data for quantitative questions.
+
+Price histories and financial statements are ingested from CSV or Parquet
+files into one directory per table under ``MARKET_DATA_CONFIG["path"]``.
+Each ingest writes a new version directory and then switches the table's
+``CURRENT`` pointer to it, so readers never see a half-written table:
+
+- ``meta.json``: the columns, and per ticker its row range and first/last date;
+- ``date.npy``: one ``datetime64[D]`` per row;
+- ``c<i>.npy``: one ``float64`` per row for the i-th numeric column.
+
+Rows are sorted by ticker, then date: the rows of one ticker are contiguous
+and a date range inside them is found by binary search. Arrays are opened with
+``numpy.load(mmap_mode="r")``, so a query only touches the pages of the rows it
+returns and every worker process on the host shares them through the page
+cache. Open stores notice a new ``CURRENT`` and remap.
+
+``query_market_data`` and ``list_market_data`` give the searcher and coder
+agents range queries over the store; ``load_frame`` returns the same rows as a
+pandas DataFrame inside ``python_repl_tool``.
+
+Ingest from the command line:
+    python -m multi_agent_system.market_data prices data/prices.csv
+    python -m multi_agent_system.market_data financials data/600519.parquet --ticker 600519.SH
+"""
+
+import argparse
+import csv
+import difflib
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Annotated, List
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+from .config import MARKET_DATA_CONFIG, load_env
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = ("daily", "weekly", "monthly", "quarterly", "yearly")
+
+_MISSING = {"", "-", "--", "nan", "none", "null", "n/a"}
+
+
+def normalize_ticker(ticker):
+    return str(ticker).strip().upper()
+
+
+def _column_name(name):
+    name = "_".join(str(name).strip().lower().split())
+    if name in MARKET_DATA_CONFIG["ticker_columns"]:
+        return "ticker"
+    if name in MARKET_DATA_CONFIG["date_columns"]:
+        return "date"
+    return name
+
+
+# "2024-1-5", "2024/01/05", "2024年1月5日", "20240105", optionally followed by a time.
+_DATE_RE = re.compile(r"(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?|(\d{4})(\d{2})(\d{2})")
+
+
+def _to_date(value):
+    """``YYYY-MM-DD`` from a date in one of the accepted spellings; ValueError otherwise."""
+    match = _DATE_RE.match(str(value).strip())
+    if match is None:
+        raise ValueError(f"Unrecognised date {value!r}")
+    year, month, day = (int(part) for part in match.groups() if part is not None)
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def parse_dates(values):
+    """``datetime64[D]`` array from ISO dates, ``YYYYMMDD``, ``YYYY/M/D`` or datetimes."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[D]")
+    text = np.char.strip(values.astype(str))
+    try:
+        if np.all((np.char.str_len(text) == 8) & np.char.isdigit(text)):
+            compact = text.astype(np.int64)
+            months = (compact // 10000 - 1970) * 12 + compact // 100 % 100 - 1
+            return months.astype("datetime64[M]").astype("datetime64[D]") + (compact % 100 - 1)
+        # Timestamps from Parquet print as "2024-01-02 00:00:00".
+        return np.char.replace(np.char.ljust(text, 10).astype("<U10"), "/", "-").astype("datetime64[D]")
+    except ValueError:
+        pass
+    # Not zero-padded ("2024/1/2") or spelled out ("2024年1月2日"): normalise each distinct value once.
+    uniques, inverse = np.unique(text, return_inverse=True)
+    try:
+        return np.array([_to_date(value) for value in uniques], dtype="datetime64[D]")[inverse.reshape(-1)]
+    except ValueError as e:
+        raise ValueError(f"Unrecognised date in market data: {e}") from None
+
+
+def _parse_numbers(values):
+    """``float64`` array, or None when the column is not numeric (e.g. a company name)."""
+    values = np.asarray(values)
+    if values.dtype.kind in "biuf":
+        return values.astype(np.float64)
+    text = np.char.strip(values.astype(str))
+    text = np.where(np.isin(np.char.lower(text), list(_MISSING)), "nan", text)
+    if np.any(np.char.find(text, ",") >= 0):
+        text = np.char.replace(text, ",", "")
+    try:
+        return text.astype(np.float64)
+    except ValueError:
+        return None
+
+
+def read_table_file(path):
+    """``{column: values}`` of a CSV or Parquet file, with normalized column names."""
+    if path.lower().endswith((".parquet", ".pq")):
+        # Optional dependency: only Parquet input needs pandas (with pyarrow or fastparquet).
+        import pandas as pd
+
+        frame = pd.read_parquet(path)
+        raw = {name: frame[name].to_numpy() for name in frame.columns}
+        return {_column_name(name): values for name, values in raw.items()}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    if pd is not None:
+        # pandas' C parser is much faster; tickers stay text so "000001" keeps its zeros.
+        text = {name: str for name in header if _column_name(name) in ("ticker", "date")}
+        frame = pd.read_csv(path, dtype=text, thousands=",", encoding="utf-8-sig", keep_default_na=True)
+        raw = {name: frame[name].to_numpy() for name in frame.columns}
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            cells = list(itertools.zip_longest(*reader, fillvalue=""))
+        raw = {name: cells[i] if i < len(cells) else () for i, name in enumerate(header)}
+    return {_column_name(name): values for name, values in raw.items()}
+
+
+def _period_ends(dates, frequency):
+    """Mask of the last row of each period (rows are sorted by date)."""
+    days = dates.astype(np.int64)
+    if frequency == "weekly":
+        key = (days + 3) // 7  # Monday-based weeks; day 0 (1970-01-01) was a Thursday.
+    elif frequency == "monthly":
+        key = dates.astype("datetime64[M]").astype(np.int64)
+    elif frequency == "quarterly":
+        key = dates.astype("datetime64[M]").astype(np.int64) // 3
+    elif frequency == "yearly":
+        key = dates.astype("datetime64[Y]").astype(np.int64)
+    else:
+        return np.ones(len(dates), dtype=bool)
+    return np.r_[key[1:] != key[:-1], True]
+
+
+class _Table:
+    """One version of a table, memory-mapped read-only."""
+
+    def __init__(self, directory, version):
+        self.version = version
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.columns = meta["columns"]
+        self.tickers = meta["tickers"]  # ticker -> [start row, end row, first date, last date]
+        self.rows = meta["rows"]
+        self.dates = np.load(os.path.join(directory, "date.npy"), mmap_mode="r")
+        self.arrays = {
+            column: np.load(os.path.join(directory, f"c{i}.npy"), mmap_mode="r")
+            for i, column in enumerate(self.columns)
+        }
+
+    def all_rows(self):
+        """``(tickers, dates, {column: values})`` of every row, copied into memory for re-ingesting."""
+        names = np.array(list(self.tickers), dtype=object)
+        counts = [end - start for start, end, _, _ in self.tickers.values()]
+        return np.repeat(names, counts), np.array(self.dates), {c: np.array(a) for c, a in self.arrays.items()}
+
+
+class MarketDataStore:
+    """
+    Directory of versioned, memory-mapped tables keyed by ticker and date.
+
+    Args:
+        path (str): Root directory; one sub-directory per table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tables = {}  # name -> _Table
+        self._lock = threading.Lock()
+        self._ingest_lock = threading.Lock()
+
+    def _pointer(self, table):
+        return os.path.join(self.path, table, "CURRENT")
+
+    def table(self, name):
+        """The current version of table ``name``, or None if it was never ingested."""
+        try:
+            with open(self._pointer(name), encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        loaded = self._tables.get(name)
+        if loaded is not None and loaded.version == version:
+            return loaded
+        with self._lock:
+            loaded = self._tables.get(name)
+            if loaded is None or loaded.version != version:
+                loaded = self._tables[name] = _Table(os.path.join(self.path, name, version), version)
+        return loaded
+
+    def table_names(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if os.path.exists(self._pointer(name)))
+
+    def query(self, table, ticker, start=None, end=None, columns=None):
+        """
+        Rows of ``ticker`` between ``start`` and ``end`` (inclusive ISO dates).
+
+        Returns:
+            tuple: ``(dates, {column: values})`` as read-only views of the
+            mapped files, or None when the table or ticker is unknown.
+
+        Raises:
+            KeyError: A requested column does not exist.
+            ValueError: ``start`` or ``end`` is not a date.
+        """
+        loaded = self.table(table)
+        span = loaded.tickers.get(normalize_ticker(ticker)) if loaded else None
+        if span is None:
+            return None
+        unknown = [column for column in columns or () if column not in loaded.arrays]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        start = np.datetime64(_to_date(start), "D") if start else None
+        end = np.datetime64(_to_date(end), "D") if end else None
+        first, last = span[0], span[1]
+        dates = loaded.dates[first:last]
+        lo = np.searchsorted(dates, start) if start is not None else 0
+        hi = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+        return dates[lo:hi], {
+            column: loaded.arrays[column][first + lo:first + hi] for column in (columns or loaded.columns)
+        }
+
+    def ingest(self, table, data, ticker=None):
+        """
+        Merge ``data`` into ``table``.
+
+        For a ticker and date already stored, the values present in ``data``
+        replace the stored ones and missing values (empty cells, NaN) keep them,
+        so columns can be added from a separate file. Rows without a date are
+        dropped with a warning.
+
+        Args:
+            table (str): Table name, e.g. "prices" or "financials".
+            data (dict): ``{column: values}``, e.g. from ``read_table_file``;
+                needs a ``date`` column and a ``ticker`` column unless ``ticker`` is given.
+            ticker (str): Ticker of every row, for single-ticker files.
+
+        Returns:
+            int: Rows in the table after the merge.
+        """
+        if "date" not in data:
+            raise ValueError(f"Market data for {table} has no date column")
+        dates = np.asarray(data["date"])
+        if np.issubdtype(dates.dtype, np.datetime64):
+            keep = ~np.isnat(dates)
+        else:
+            keep = ~np.isin(np.char.lower(np.char.strip(dates.astype(str))), list(_MISSING))
+        if not keep.all():
+            logger.warning("Market data for %s: dropped %d rows without a date", table, len(keep) - keep.sum())
+            data = {column: np.asarray(values)[keep] for column, values in data.items()}
+        dates = parse_dates(data["date"])
+        if not len(dates):
+            raise ValueError(f"Market data for {table} has no rows")
+        if ticker is not None:
+            tickers = np.full(len(dates), normalize_ticker(ticker), dtype=object)
+        elif "ticker" in data:
+            tickers = np.char.upper(np.char.strip(np.asarray(data["ticker"]).astype(str))).astype(object)
+        else:
+            raise ValueError(f"Market data for {table} has no ticker column; pass ticker=")
+        new_columns = {}
+        for column, values in data.items():
+            if column not in ("date", "ticker"):
+                parsed = _parse_numbers(values)
+                if parsed is not None:
+                    new_columns[column] = parsed
+
+        with self._ingest_lock:
+            current = self.table(table)
+            if current is not None:
+                old_tickers, old_dates, old_columns = current.all_rows()
+            else:
+                old_tickers, old_dates, old_columns = np.array([], dtype=object), dates[:0], {}
+            columns = list(old_columns) + [c for c in new_columns if c not in old_columns]
+
+            def merged(column):
+                old = old_columns.get(column, np.full(len(old_dates), np.nan))
+                return np.concatenate([old, new_columns.get(column, np.full(len(dates), np.nan))])
+
+            all_tickers = np.concatenate([old_tickers, tickers])
+            all_dates = np.concatenate([old_dates, dates])
+            names, codes = np.unique(all_tickers.astype(str), return_inverse=True)
+            # Stable sort by ticker and date, so the rows of a (ticker, date) are adjacent, oldest first.
+            order = np.lexsort((np.arange(len(codes)), all_dates, codes))
+            codes, all_dates = codes[order], all_dates[order]
+            starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (all_dates[1:] != all_dates[:-1])])
+            positions = np.arange(len(codes))
+            arrays = {}
+            for column in columns:
+                values = merged(column)[order]
+                # Per (ticker, date), the newest value that is not missing.
+                latest = np.maximum.reduceat(np.where(np.isnan(values), -1, positions), starts)
+                arrays[column] = np.where(latest >= starts, values[np.maximum(latest, 0)], np.nan)
+            codes, all_dates = codes[starts], all_dates[starts]
+            self._write(table, names, codes, all_dates, columns, arrays)
+        return len(all_dates)
+
+    def _write(self, table, names, codes, dates, columns, arrays):
+        directory = os.path.join(self.path, table)
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        target = os.path.join(directory, version)
+        os.makedirs(target)
+        bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+        meta = {
+            "columns": columns,
+            "rows": len(dates),
+            "tickers": {
+                str(name): [int(bounds[i]), int(bounds[i + 1]),
+                            str(dates[bounds[i]]), str(dates[bounds[i + 1] - 1])]
+                for i, name in enumerate(names) if bounds[i + 1] > bounds[i]
+            },
+        }
+        np.save(os.path.join(target, "date.npy"), dates.astype("datetime64[D]"))
+        for i, column in enumerate(columns):
+            np.save(os.path.join(target, f"c{i}.npy"), arrays[column].astype(np.float64))
+        with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        pointer = self._pointer(table)
+        with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(f"{pointer}.tmp", pointer)
+        # Keep the previous version for readers that mapped it before the switch.
+        versions = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+        for name in versions[:-2]:
+            if name != version:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_market_data_store():
+    """Return the process-wide store at ``MARKET_DATA_CONFIG["path"]``."""
+    global _store
+    if _store is None:
+        load_env()
+        with _store_lock:
+            if _store is None:
+                _store = MarketDataStore(MARKET_DATA_CONFIG["path"])
+    return _store
+
+
+def set_market_data_store(store):
+    """Replace the process-wide store (e.g. with one in a temporary directory)."""
+    global _store
+    _store = store
+
+
+def load_frame(ticker, start=None, end=None, columns=None, table="prices"):
+    """Rows of ``ticker`` as a pandas DataFrame indexed by date, for use in ``python_repl_tool``."""
+    import pandas as pd
+
+    result = get_market_data_store().query(table, ticker, start, end, columns)
+    if result is None:
+        raise KeyError(f"No local {table} data for {ticker}")
+    dates, values = result
+    return pd.DataFrame({column: np.array(array) for column, array in values.items()},
+                        index=pd.DatetimeIndex(np.array(dates), name="date"))
+
+
+def _format_value(value):
+    return "" if np.isnan(value) else f"{value:.6g}"
+
+
+def _unknown_ticker(store, table, ticker):
+    loaded = store.table(table)
+    if loaded is None:
+        tables = ", ".join(store.table_names()) or "none"
+        return f"No local {table} table (available tables: {tables}); use web search instead."
+    close = difflib.get_close_matches(normalize_ticker(ticker), list(loaded.tickers), n=5, cutoff=0.5)
+    hint = f" Similar tickers: {', '.join(close)}." if close else " Use list_market_data to find the ticker."
+    return f"No local {table} data for {ticker}.{hint}"
+
+
+def _query_market_data(
+    ticker: Annotated[str, "Ticker as stored locally, e.g. 600519.SH (see list_market_data)."],
+    start: Annotated[str, "First date, YYYY-MM-DD, inclusive; omit for the earliest."] = None,
+    end: Annotated[str, "Last date, YYYY-MM-DD, inclusive; omit for the latest."] = None,
+    columns: Annotated[List[str], "Columns to return, e.g. [\"close\"]; omit for all."] = None,
+    table: Annotated[str, "\"prices\" for daily prices or \"financials\" for financial statements."] = "prices",
+    frequency: Annotated[str, "daily, weekly, monthly, quarterly or yearly (last row of each period)."] = "daily",
+):
+    """Read a date range of one ticker from the local market-data store as CSV rows."""
+    frequency = str(frequency or "daily").strip().lower()
+    if frequency not in FREQUENCIES:
+        counter("market_data_queries_total", "Local market-data queries").inc(table=table, outcome="bad_frequency")
+        return f"Unknown frequency {frequency!r}; use one of {', '.join(FREQUENCIES)}."
+    store = get_market_data_store()
+    try:
+        result = store.query(table, ticker, start, end, columns)
+    except KeyError as e:
+        counter("market_data_queries_total", "Local market-data queries").inc(table=table, outcome="bad_column")
+        return f"Unknown column(s) {e.args[0]} in {table}; available: {', '.join(store.table(table).columns)}."
+    except ValueError as e:
+        counter("market_data_queries_total", "Local market-data queries").inc(table=table, outcome="bad_date")
+        return f"Bad date: {e}; use YYYY-MM-DD."
+    if result is None:
+        counter("market_data_queries_total", "Local market-data queries").inc(table=table, outcome="miss")
+        return _unknown_ticker(store, table, ticker)
+    counter("market_data_queries_total", "Local market-data queries").inc(table=table, outcome="hit")
+    dates, values = result
+    selected = np.flatnonzero(_period_ends(dates, frequency))
+    total = len(selected)
+    selected = selected[-MARKET_DATA_CONFIG["max_rows"]:]
+    lines = [f"{table} {normalize_ticker(ticker)} {frequency}: {total} rows"
+             + (f", showing the last {len(selected)}; narrow the range or use a coarser frequency"
+                if len(selected) < total else ""),
+             ",".join(["date", *values])]
+    columns = [np.asarray(array[selected]) for array in values.values()]
+    for row, date in enumerate(dates[selected]):
+        lines.append(",".join([str(date), *(_format_value(column[row]) for column in columns)]))
+    return "\n".join(lines)
+
+
+def _list_market_data(
+    ticker: Annotated[str, "Ticker or part of it to look for; omit to list everything."] = None,
+):
+    """List the tables, columns, tickers and date ranges available in the local market-data store."""
+    store = get_market_data_store()
+    needle = normalize_ticker(ticker) if ticker else ""
+    limit = MARKET_DATA_CONFIG["max_rows"]
+    lines = []
+    for name in store.table_names():
+        loaded = store.table(name)
+        matches = [t for t in loaded.tickers if needle in t]
+        lines.append(f"{name}: columns {', '.join(loaded.columns)}; {len(matches)} of {len(loaded.tickers)} tickers")
+        for t in matches[:limit]:
+            start, end, first, last = loaded.tickers[t]
+            lines.append(f"  {t} {first}..{last} ({end - start} rows)")
+        if len(matches) > limit:
+            lines.append(f"  ... {len(matches) - limit} more; pass a ticker to narrow the list")
+    return "\n".join(lines) or "The local market-data store is empty; use web search instead."
+
+
+query_market_data = StructuredTool.from_function(func=_query_market_data, name="query_market_data")
+
+list_market_data = StructuredTool.from_function(func=_list_market_data, name="list_market_data")
+
+market_data_tools = [
+    list_market_data,
+    query_market_data,
+]
+
+
+def get_market_data_tools():
+    """Get the tools reading the local market-data store."""
+    return market_data_tools
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest CSV or Parquet files into the local market-data store.")
+    parser.add_argument("table", help="Table to merge into, e.g. prices or financials.")
+    parser.add_argument("files", nargs="+", help="CSV or Parquet files with a date column.")
+    parser.add_argument("--ticker", help="Ticker of every row, for files without a ticker column.")
+    parser.add_argument("--path", help="Store directory (default: MARKET_DATA_CONFIG['path']).")
+    args = parser.parse_args()
+
+    load_env()
+    store = MarketDataStore(args.path or MARKET_DATA_CONFIG["path"])
+    for path in args.files:
+        started = time.perf_counter()
+        rows = store.ingest(args.table, read_table_file(path), ticker=args.ticker)
+        print(f"{path}: {args.table} now has {rows} rows ({time.perf_counter() - started:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
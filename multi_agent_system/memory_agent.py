@@ -1,76 +1,235 @@
+import asyncio
 from langgraph.store.base import BaseStore # Base class for defining custom stores for LangGraph
 from langchain_core.runnables import RunnableConfig # Configuration class for runnable nodes in LangGraph
 from .state import State # Importing the State schema defined for our multi-agent system
-from .config import LLM_CONFIG, CREATE_MEMORY_PROMPT
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
+from .config import CREATE_MEMORY_PROMPT, MEMORY_CONFIG
+from .llm_client import get_llm_for
 from langchain_core.messages import HumanMessage
 from .user_file import UserProfile
+from .memory_tool import get_profile, get_user_id
+from .memory_queue import get_memory_queue
+from .metrics import counter
+from .prompts import build_prompt
+from .utils import estimate_tokens
 
 
-def create_memory(state: State, config: RunnableConfig, store: BaseStore):
-     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
-    
-    # Get the customer ID from the state, with fallback to config
-    user_id = state.get("customer_id")
-    
-    # If customer_id is not in state, try to get it from config
-    if not user_id:
-        if isinstance(config, dict):
-            user_id = config.get("configurable", {}).get("user_id", "unknown")
-        elif hasattr(config, 'configurable'):
-            user_id = config.configurable.get("user_id", "unknown") if isinstance(config.configurable, dict) else "unknown"
-        else:
-            user_id = "unknown"
-    
-    user_id = str(user_id) # Convert to string
-    namespace = ("memory_profile", user_id) # Define the namespace for this user's memory profile.
-    
-    # Retrieve the existing memory profile for this user from the long-term store.
-    existing_memory = store.get(namespace, "user_memory")
-    
+# Namespace of the per-thread high-water marks: the id of the last message that
+# went into a successful profile update.
+WATERMARK_NAMESPACE = "memory_watermark"
+
+
+def _get_thread_id(config: RunnableConfig):
+    """Return the thread ID of the current run, or "default" outside a thread."""
+    configurable = config.get("configurable", {}) if isinstance(config, dict) else {}
+    return str(configurable.get("thread_id", "default"))
+
+
+def _format_message(msg):
+    """Render one message as a line of the conversation transcript."""
+    if hasattr(msg, 'content'):
+        return f"{msg.__class__.__name__}: {msg.content}\n"
+    return f"{str(msg)}\n"
+
+
+def _messages_since(messages, watermark):
+    """Return the messages added after the high-water mark (all of them if it is unknown)."""
+    last_id = watermark.value.get("message_id") if watermark and watermark.value else None
+    if last_id:
+        for index in range(len(messages) - 1, -1, -1):
+            if getattr(messages[index], "id", None) == last_id:
+                return list(messages[index + 1:])
+    return list(messages)
+
+
+def _has_user_content(messages):
+    """True if any new message carries non-empty user text."""
+    return any(isinstance(msg, HumanMessage) and str(msg.content).strip() for msg in messages)
+
+
+def _plan_update(threads, watermarks):
+    """
+    Work out what a profile update has to send.
+
+    Args:
+        threads (dict): thread_id -> that thread's messages.
+        watermarks (dict): thread_id -> stored high-water mark item (or None).
+
+    Returns:
+        tuple: (new messages across all threads, new marks per thread,
+        estimated tokens a full re-send would have cost).
+    """
+    new_messages = []
+    new_marks = {}
+    full_tokens = 0
+    for thread_id, messages in threads.items():
+        full_tokens += sum(estimate_tokens(_format_message(msg)) for msg in messages)
+        new_messages.extend(_messages_since(messages, watermarks.get(thread_id)))
+        if messages and getattr(messages[-1], "id", None):
+            new_marks[thread_id] = {"message_id": messages[-1].id, "count": len(messages)}
+    return new_messages, new_marks, full_tokens
+
+
+def _record_update(full_transcript_tokens, prompt_messages):
+    """Record the tokens saved compared with re-sending every thread in full."""
+    # What the old path sent: the instructions plus the whole transcript of every thread.
+    full_tokens = estimate_tokens(CREATE_MEMORY_PROMPT) + full_transcript_tokens
+    if prompt_messages is None:
+        counter("memory_update_skipped_total", "Profile updates skipped for lack of user content").inc()
+        sent_tokens = 0
+    else:
+        counter("memory_update_llm_calls_total", "Profile-extraction LLM calls").inc()
+        sent_tokens = sum(estimate_tokens(msg.content) for msg in prompt_messages)
+        counter("memory_update_prompt_tokens_total", "Estimated prompt tokens sent for profile updates").inc(sent_tokens)
+    counter("memory_update_tokens_saved_total", "Estimated prompt tokens not re-sent thanks to watermarks").inc(
+        max(0, full_tokens - sent_tokens)
+    )
+
+
+def _record_failure(user_id, error):
+    """Report a failed profile update; the profile is left untouched."""
+    counter("memory_update_failures_total", "Profile updates that failed after retries").inc()
+    print(f"Warning: Memory update for user {user_id} failed, keeping the existing profile. Error: {error}")
+
+
+def _build_memory_messages(messages, existing_memory):
+    """Build the prompt messages for the memory-extraction LLM call."""
     formatted_memory = "" # Initialize formatted memory for the prompt.
     if existing_memory and existing_memory.value:
         existing_memory_dict = existing_memory.value # Get the dictionary containing the UserProfile instance.
         # Format existing invest preferences into a string for the prompt.
         formatted_memory = (
-            f"Invest Preferences: {', '.join(existing_memory_dict.get('memory').invest_preferences or [])}" # Access the UserProfile object via 'memory' key
+            f"Invest Preferences: {', '.join(get_profile(existing_memory_dict).invest_preferences or [])}" # Access the UserProfile object via 'memory' key
         )
 
-    # Format the conversation history as a string
-    conversation_str = ""
-    for msg in state["messages"]:
-        if hasattr(msg, 'content'):
-            conversation_str += f"{msg.__class__.__name__}: {msg.content}\n"
-        else:
-            conversation_str += f"{str(msg)}\n"
-    
-    # Create a SystemMessage with the formatted prompt, injecting the full conversation history
-    # and the existing memory profile.
-    formatted_system_message = SystemMessage(
-        content=CREATE_MEMORY_PROMPT.format(conversation=conversation_str, memory_profile=formatted_memory)
-    )
-    
+    # Format only the new part of the conversation; everything older is
+    # already reflected in the existing memory profile.
+    conversation_str = "".join(_format_message(msg) for msg in messages)
+
+    # Static instructions first, then the new messages and the existing memory
+    # profile in the context slot (see prompts.py).
+    context = [
+        ("你需要分析的用户与基金经理之间的对话如下：", conversation_str),
+        ("你需要根据对话内容更新或创建与该用户关联的现有内存配置文件如下：", formatted_memory or "无"),
+    ]
+
     # Create a modified message that includes JSON instruction for OpenAI API
     modified_message = HumanMessage(
         content="请分析对话内容，并以包含更新后内存配置文件的 JSON 对象的形式回复。 "
                 "请务必将 customer_id（如果未提及，则使用提供的 user_id）和 invest_preferences 作为列表包含在内。"
     )
-    
+
+    return build_prompt("memory", CREATE_MEMORY_PROMPT, context, [modified_message])
+
+
+def update_memory_profile(store: BaseStore, user_id: str, threads):
+    """
+    Fold the messages added since the last update into the profile of ``user_id``.
+
+    Shared by the ``create_memory`` node and the deferred memory queue.
+
+    Args:
+        store: Long-term store holding profiles and high-water marks.
+        user_id (str): Owner of the profile.
+        threads (dict): thread_id -> that thread's messages.
+    """
+    watermark_namespace = (WATERMARK_NAMESPACE, user_id)
+    watermarks = {thread_id: store.get(watermark_namespace, thread_id) for thread_id in threads}
+    new_messages, new_marks, full_tokens = _plan_update(threads, watermarks)
+
+    # Nothing the user said since the last update: skip the LLM call entirely.
+    if not _has_user_content(new_messages):
+        _record_update(full_tokens, None)
+        for thread_id, mark in new_marks.items():
+            store.put(watermark_namespace, thread_id, mark)
+        return
+
+     # Initialize the LLM
+    llm = get_llm_for("memory")
+
+    namespace = ("memory_profile", user_id) # Define the namespace for this user's memory profile.
+
+    # Retrieve the existing memory profile for this user from the long-term store.
+    existing_memory = store.get(namespace, "user_memory")
+
+    prompt = _build_memory_messages(new_messages, existing_memory)
+    _record_update(full_tokens, prompt)
+
     # Invoke the LLM with structured output (`UserProfile`) to analyze the conversation
     # and update the memory profile based on new information.
+    # Rate limiting and retries happen in the shared LLM client. If the call
+    # still fails, keep the existing profile and the marks as they are: the
+    # same messages are picked up again by the next update.
     try:
-        updated_memory = llm.with_structured_output(UserProfile).invoke([formatted_system_message, modified_message])
+        updated_memory = llm.with_structured_output(UserProfile).invoke(prompt)
     except Exception as e:
-        # Fallback: create a simple UserProfile if structured output fails
-        print(f"Warning: Structured output failed, using fallback. Error: {e}")
-        updated_memory = UserProfile(customer_id=user_id, invest_preferences=[])
-    
+        _record_failure(user_id, e)
+        return
+
     key = "user_memory" # Define the key for storing this specific memory object.
-    
-    # Store the updated memory profile back into the `InMemoryStore`.
-    # We wrap `updated_memory` in a dictionary under the key 'memory' for consistency in access.
-    store.put(namespace, key, {"memory": updated_memory})
+
+    # Store the updated memory profile back into the long-term store.
+    # We wrap `updated_memory` in a dictionary under the key 'memory' for consistency in access;
+    # it is stored as a plain dict so JSON-backed stores (SQLite) can persist it.
+    store.put(namespace, key, {"memory": updated_memory.model_dump()})
+
+    for thread_id, mark in new_marks.items():
+        store.put(watermark_namespace, thread_id, mark)
+
+
+def create_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Update the user's long-term memory profile inline, before the turn ends."""
+    update_memory_profile(store, get_user_id(state, config), {_get_thread_id(config): state["messages"]})
+
+
+async def acreate_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Async twin of ``create_memory`` used by ainvoke/astream."""
+    user_id = get_user_id(state, config)
+    thread_id = _get_thread_id(config)
+    watermark_namespace = (WATERMARK_NAMESPACE, user_id)
+
+    watermark = await store.aget(watermark_namespace, thread_id)
+    new_messages, new_marks, full_tokens = _plan_update({thread_id: state["messages"]}, {thread_id: watermark})
+
+    if not _has_user_content(new_messages):
+        _record_update(full_tokens, None)
+        for mark_thread_id, mark in new_marks.items():
+            await store.aput(watermark_namespace, mark_thread_id, mark)
+        return
+
+    llm = get_llm_for("memory")
+    namespace = ("memory_profile", user_id)
+
+    existing_memory = await store.aget(namespace, "user_memory")
+
+    prompt = _build_memory_messages(new_messages, existing_memory)
+    _record_update(full_tokens, prompt)
+
+    try:
+        updated_memory = await llm.with_structured_output(UserProfile).ainvoke(prompt)
+    except Exception as e:
+        _record_failure(user_id, e)
+        return
+
+    await store.aput(namespace, "user_memory", {"memory": updated_memory.model_dump()})
+
+    for mark_thread_id, mark in new_marks.items():
+        await store.aput(watermark_namespace, mark_thread_id, mark)
+
+
+def enqueue_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Hand the finished turn to the background memory queue and return immediately."""
+    get_memory_queue().submit(
+        store,
+        get_user_id(state, config),
+        state["messages"],
+        thread_id=_get_thread_id(config),
+        timeout=MEMORY_CONFIG["enqueue_timeout"],
+    )
+    return {}
 
 
+async def aenqueue_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Async twin of ``enqueue_memory``; only waits off-loop when the queue may block."""
+    if MEMORY_CONFIG["enqueue_timeout"]:
+        return await asyncio.to_thread(enqueue_memory, state, config, store)
+    return enqueue_memory(state, config, store)
@@ -0,0 +1,221 @@
+"""
+Deferred long-term memory updates.
+
+Extracting the user profile costs a structured-output LLM round trip. Instead
+of running it before the answer is returned, the graph hands the finished turn
+to a bounded background queue. Worker threads drain the queue, merge every
+pending turn of the same user into a single LLM call and write the result to
+the store.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .config import MEMORY_CONFIG
+from .rate_limit import retry_budget
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryUpdateQueue:
+    """
+    Bounded, per-user coalescing queue of pending memory updates.
+
+    Args:
+        handler: Callable ``(store, user_id, threads)`` that performs the update,
+            where ``threads`` maps thread_id to that thread's messages.
+        maxsize (int): Maximum number of pending turns across all users.
+        workers (int): Number of background worker threads.
+    """
+
+    def __init__(self, handler, maxsize=1000, workers=2):
+        self._handler = handler
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # user_id -> {"store", "threads", "turns"}
+        self._pending_turns = 0
+        self._in_progress = set()
+        self._closed = False
+        self._stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "processed_batches": 0,
+            "processed_turns": 0,
+            "dropped": 0,
+            "failed": 0,
+        }
+        self._workers = [
+            threading.Thread(target=self._run, name=f"memory-update-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, store, user_id, messages, thread_id=None, timeout=0.0):
+        """
+        Queue one finished turn for ``user_id``.
+
+        Args:
+            store: The long-term store the profile is written to.
+            user_id (str): Owner of the conversation.
+            messages (list): The turn's messages.
+            thread_id (str): Conversation thread the messages belong to.
+            timeout (float): Seconds to wait for room when the queue is full.
+
+        Returns:
+            bool: False when the update was dropped because the queue stayed full.
+        """
+        deadline = time.monotonic() + (timeout or 0.0)
+        with self._cond:
+            while self._pending_turns >= self._maxsize and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["dropped"] += 1
+                    logger.warning("Memory update queue full, dropping update for user %s", user_id)
+                    return False
+                self._cond.wait(remaining)
+            if self._closed:
+                self._stats["dropped"] += 1
+                return False
+
+            self._stats["submitted"] += 1
+            self._pending_turns += 1
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = {"store": store, "threads": {thread_id: list(messages)}, "turns": 1}
+            else:
+                # Coalesce with the update that is already waiting for this user.
+                self._stats["coalesced"] += 1
+                threads = entry["threads"]
+                threads[thread_id] = _merge_messages(threads.get(thread_id, []), messages)
+                entry["turns"] += 1
+                entry["store"] = store
+            self._cond.notify_all()
+        return True
+
+    def _next_batch(self):
+        """Pop the oldest user that no other worker is processing; None once closed and empty."""
+        with self._cond:
+            while True:
+                for user_id in self._pending:
+                    if user_id not in self._in_progress:
+                        entry = self._pending.pop(user_id)
+                        self._pending_turns -= entry["turns"]
+                        self._in_progress.add(user_id)
+                        self._cond.notify_all()
+                        return user_id, entry
+                if self._closed and not self._pending:
+                    return None
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            user_id, entry = batch
+            try:
+                # Each batch is one request as far as upstream retries go.
+                with retry_budget():
+                    self._handler(entry["store"], user_id, entry["threads"])
+                failed = False
+            except Exception:
+                logger.exception("Deferred memory update failed for user %s", user_id)
+                failed = True
+            with self._cond:
+                self._in_progress.discard(user_id)
+                self._stats["processed_batches"] += 1
+                self._stats["processed_turns"] += entry["turns"]
+                if failed:
+                    self._stats["failed"] += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued update has been written.
+
+        Returns:
+            bool: True if the queue drained before ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_progress:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None):
+        """Stop accepting updates, drain what is queued and stop the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        drained = self.flush(timeout)
+        for worker in self._workers:
+            worker.join(0 if not drained else timeout)
+        return drained
+
+    def stats(self):
+        """Return queue counters and current depth."""
+        with self._cond:
+            return {
+                **self._stats,
+                "pending_users": len(self._pending),
+                "pending_turns": self._pending_turns,
+                "in_progress": len(self._in_progress),
+            }
+
+
+def _merge_messages(existing, new):
+    """Union of two message lists in order, de-duplicated by message id."""
+    merged = OrderedDict()
+    for msg in list(existing) + list(new):
+        key = getattr(msg, "id", None) or id(msg)
+        merged[key] = msg
+    return list(merged.values())
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_memory_queue():
+    """Return the process-wide memory update queue, starting it on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from .memory_agent import update_memory_profile
+
+                _queue = MemoryUpdateQueue(
+                    update_memory_profile,
+                    maxsize=MEMORY_CONFIG["queue_maxsize"],
+                    workers=MEMORY_CONFIG["workers"],
+                )
+    return _queue
+
+
+def flush_memory_updates(timeout=None):
+    """Wait until all deferred memory updates are written (no-op if none were queued)."""
+    return _queue.flush(timeout) if _queue is not None else True
+
+
+def shutdown_memory_queue(timeout=None):
+    """Drain and stop the memory update queue; a later submit starts a fresh one."""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is None:
+        return True
+    return queue.shutdown(MEMORY_CONFIG["shutdown_timeout"] if timeout is None else timeout)
+
+
+def _shutdown_at_exit():
+    shutdown_memory_queue()
+
+
+atexit.register(_shutdown_at_exit)
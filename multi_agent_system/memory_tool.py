@@ -1,11 +1,20 @@
 from langgraph.store.base import BaseStore # Base class for defining custom stores for LangGraph
 from langchain_core.runnables import RunnableConfig # Configuration class for runnable nodes in LangGraph
 from .state import State # Importing the State schema defined for our multi-agent system
+from .user_file import UserProfile
+
+# Helper function to read the profile stored under the 'memory' key.
+def get_profile(user_data):
+    """Returns the stored UserProfile; durable stores keep it as a plain dict."""
+    profile = user_data.get('memory')
+    if isinstance(profile, dict):
+        profile = UserProfile.model_validate(profile)
+    return profile
 
 # Helper function to format user memory into a readable string.
 def format_user_memory(user_data):
     """Formats invest preferences from users, if available."""
-    profile = user_data['memory'] # Access the 'memory' key from the stored dictionary
+    profile = get_profile(user_data) # Access the 'memory' key from the stored dictionary
     result = "" # Initialize an empty string for the formatted result
     
     if hasattr(profile, 'invest_preferences') and profile.invest_preferences:
@@ -13,12 +22,9 @@ def format_user_memory(user_data):
     
     return result.strip() # Return the formatted string, removing any leading/trailing whitespace.
 
-# Define the `load_memory` node function.
-# This node loads a user's long-term memory into the current state.
-def load_memory(state: State, config: RunnableConfig, store: BaseStore):
-    """Loads invest preferences from users, if available."""
-    
-    # Get the current customer ID from the state, with a default value if not provided
+# Helper function to resolve which user a turn belongs to.
+def get_user_id(state: State, config: RunnableConfig):
+    """Returns the customer ID from the state, falling back to config["configurable"]["user_id"]."""
     user_id = state.get("customer_id")
     
     # If customer_id is not in state, try to get it from config
@@ -30,6 +36,16 @@ def load_memory(state: State, config: RunnableConfig, store: BaseStore):
         else:
             user_id = "unknown"
     
+    return str(user_id) # Convert to string so every node uses the same namespace
+
+# Define the `load_memory` node function.
+# This node loads a user's long-term memory into the current state.
+def load_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Loads invest preferences from users, if available."""
+    
+    # Get the current customer ID from the state, with fallback to config
+    user_id = get_user_id(state, config)
+    
     namespace = ("memory_profile", user_id) # Define a namespace for storing user-specific memory.
                                           # This creates a unique key for each user's profile.
     
@@ -43,4 +59,17 @@ def load_memory(state: State, config: RunnableConfig, store: BaseStore):
         formatted_memory = format_user_memory(existing_memory.value)
 
     # Update the `loaded_memory` field in the state with the retrieved and formatted memory.
-    return {"loaded_memory" : formatted_memory, "existing_memory": existing_memory}
\ No newline at end of file
+    return {"loaded_memory" : formatted_memory, "existing_memory": existing_memory}
+
+
+async def aload_memory(state: State, config: RunnableConfig, store: BaseStore):
+    """Async twin of ``load_memory`` used by ainvoke/astream."""
+    user_id = get_user_id(state, config)
+
+    existing_memory = await store.aget(("memory_profile", user_id), "user_memory")
+
+    formatted_memory = ""
+    if existing_memory and existing_memory.value:
+        formatted_memory = format_user_memory(existing_memory.value)
+
+    return {"loaded_memory" : formatted_memory, "existing_memory": existing_memory}
@@ -0,0 +1,191 @@
+"""
+Process-wide performance counters.
+
+A tiny, dependency-free metrics registry shared by the agents, tools and
+background workers. Metrics are created on first use by name and can carry
+labels, e.g. ``counter("search_cache_hits_total").inc(tool="tavily_search")``.
+``render_prometheus()`` exports them in the Prometheus text format.
+"""
+
+import re
+import threading
+
+_lock = threading.Lock()
+_metrics = {}  # name -> Counter | Gauge | Histogram
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        """Return ``[(labels_dict, value), ...]``."""
+        with self._lock:
+            return [(dict(key), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """Tracks count, sum, min and max of observed values, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                self._values[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                entry["count"] += 1
+                entry["sum"] += value
+                entry["min"] = min(entry["min"], value)
+                entry["max"] = max(entry["max"], value)
+
+    def value(self, **labels):
+        with self._lock:
+            entry = self._values.get(_label_key(labels))
+            return dict(entry) if entry else {"count": 0, "sum": 0, "min": 0, "max": 0}
+
+    def samples(self):
+        with self._lock:
+            return [(dict(key), dict(entry)) for key, entry in self._values.items()]
+
+
+class Gauge:
+    """Last set value, optionally split by labels."""
+
+    kind = "gauge"
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(dict(key), value) for key, value in self._values.items()]
+
+
+def _get_or_create(cls, name, description):
+    metric = _metrics.get(name)
+    if metric is None:
+        with _lock:
+            metric = _metrics.setdefault(name, cls(name, description))
+    if not isinstance(metric, cls):
+        raise TypeError(f"Metric {name} is a {metric.kind}, not a {cls.kind}")
+    return metric
+
+
+def counter(name, description=""):
+    """Return the counter registered under ``name``, creating it on first use."""
+    return _get_or_create(Counter, name, description)
+
+
+def histogram(name, description=""):
+    """Return the histogram registered under ``name``, creating it on first use."""
+    return _get_or_create(Histogram, name, description)
+
+
+def gauge(name, description=""):
+    """Return the gauge registered under ``name``, creating it on first use."""
+    return _get_or_create(Gauge, name, description)
+
+
+def snapshot():
+    """
+    Return every metric as plain data.
+
+    Returns:
+        dict: ``{name: {"kind", "description", "samples": [(labels, value), ...]}}``.
+    """
+    with _lock:
+        metrics = dict(_metrics)
+    return {
+        name: {"kind": metric.kind, "description": metric.description, "samples": metric.samples()}
+        for name, metric in metrics.items()
+    }
+
+
+def _prometheus_name(name):
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return name if re.match(r"[a-zA-Z_:]", name) else f"_{name}"
+
+
+def _escape(text):
+    return str(text).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{_prometheus_name(key)}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def render_prometheus():
+    """
+    Return every metric in the Prometheus text exposition format.
+
+    Histograms only track count, sum, min and max, so they are exported as
+    summaries without quantiles plus ``_min`` and ``_max`` gauges. Each
+    process has its own registry; with several server workers every scrape
+    sees one of them.
+    """
+    lines = []
+    for name, metric in sorted(snapshot().items()):
+        name = _prometheus_name(name)
+        help_text = metric["description"].replace("\\", "\\\\").replace("\n", "\\n")
+        if metric["kind"] == "histogram":
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for labels, entry in metric["samples"]:
+                lines.append(f"{name}_count{_prometheus_labels(labels)} {entry['count']}")
+                lines.append(f"{name}_sum{_prometheus_labels(labels)} {entry['sum']}")
+            for bound in ("min", "max"):
+                lines.append(f"# TYPE {name}_{bound} gauge")
+                lines += [f"{name}_{bound}{_prometheus_labels(labels)} {entry[bound]}"
+                          for labels, entry in metric["samples"]]
+        else:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric['kind']}"]
+            lines += [f"{name}{_prometheus_labels(labels)} {value}" for labels, value in metric["samples"]]
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget every metric (tests and benchmarks)."""
+    with _lock:
+        _metrics.clear()
@@ -0,0 +1,314 @@
+"""
+Persistence backends for thread checkpoints and the long-term store.
+
+Every compiled graph used to create its own ``MemorySaver`` and
+``InMemoryStore``: memory grew for as long as the process lived and every
+conversation and user profile was lost on restart. ``get_persistence()``
+returns one process-wide backend selected by ``PERSISTENCE_CONFIG["backend"]``
+that all graphs share:
+
+- ``"sqlite"`` (default): a WAL-mode SQLite checkpointer and store in one file,
+  with a cap on checkpoints per thread, a TTL for idle threads and a background
+  maintenance thread that expires threads and store items and vacuums the file.
+- ``"memory"``: the in-process savers, for experiments and tests.
+
+Other backends can be added with ``register_backend``.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.store.memory import InMemoryStore
+from langgraph.store.sqlite import SqliteStore
+
+from .config import PERSISTENCE_CONFIG, load_env
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(path, busy_timeout_ms, autocommit=False):
+    """Open a connection shared across threads, in WAL mode with incremental vacuum."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # SqliteSaver commits after each operation; SqliteStore issues BEGIN itself.
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None if autocommit else "DEFERRED")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    # auto_vacuum only takes effect on a file without tables (or after VACUUM).
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class DurableSqliteSaver(SqliteSaver):
+    """
+    ``SqliteSaver`` with retention and async support.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database file.
+        max_checkpoints (int): Checkpoints kept per thread in the root namespace;
+            subgraph checkpoints older than the oldest kept one are dropped too.
+            None keeps everything.
+        thread_ttl_seconds (float): Threads idle for longer are deleted by
+            ``expire_threads``. None disables expiry.
+
+    The async methods run the sync implementation in a worker thread; SQLite
+    calls are short and serialized by the saver's lock either way. Pruning
+    assumes the graphs do not use ``DeltaChannel``, which none of ours do.
+    """
+
+    def __init__(self, conn, *, max_checkpoints=None, thread_ttl_seconds=None, serde=None):
+        super().__init__(conn, serde=serde)
+        self.max_checkpoints = max_checkpoints
+        self.thread_ttl_seconds = thread_ttl_seconds
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity ("
+            " thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS thread_activity_updated ON thread_activity (updated_at)")
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            if self.max_checkpoints and not config["configurable"].get("checkpoint_ns"):
+                self._trim_thread(cur, thread_id, self.max_checkpoints)
+        return saved
+
+    def _trim_thread(self, cur, thread_id, keep):
+        """Drop everything older than the ``keep``-th newest root checkpoint of a thread."""
+        # Checkpoint ids are time-ordered (uuid6), which list() relies on as well.
+        row = cur.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''"
+            " ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, keep - 1),
+        ).fetchone()
+        if row is None:
+            return
+        cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id < ?", (thread_id, row[0]))
+        pruned = cur.rowcount
+        cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_id < ?", (thread_id, row[0]))
+        if pruned > 0:
+            counter("checkpoints_pruned_total", "Checkpoints removed by the per-thread cap").inc(pruned)
+
+    def prune(self, thread_ids, *, strategy="keep_latest"):
+        """Keep only the latest root checkpoint of each thread, or delete the threads."""
+        for thread_id in thread_ids:
+            if strategy == "delete":
+                self.delete_thread(thread_id)
+                continue
+            with self.cursor() as cur:
+                self._trim_thread(cur, str(thread_id), 1)
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def expire_threads(self, now=None):
+        """Delete threads idle for longer than ``thread_ttl_seconds``; return how many."""
+        if not self.thread_ttl_seconds:
+            return 0
+        cutoff = (now or time.time()) - self.thread_ttl_seconds
+        with self.cursor(transaction=False) as cur:
+            expired = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,)
+            ).fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            counter("threads_expired_total", "Threads deleted after the idle TTL").inc(len(expired))
+        return len(expired)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids, *, strategy="keep_latest"):
+        return await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
+
+    async def aget_delta_channel_history(self, *, config, channels):
+        return await asyncio.to_thread(self.get_delta_channel_history, config=config, channels=channels)
+
+
+class DurableSqliteStore(SqliteStore):
+    """``SqliteStore`` whose async API runs the sync implementation in a worker thread."""
+
+    async def abatch(self, ops):
+        return await asyncio.to_thread(self.batch, list(ops))
+
+
+class Persistence:
+    """
+    A checkpointer/store pair plus optional background maintenance.
+
+    Args:
+        checkpointer: A LangGraph checkpointer shared by all compiled graphs.
+        store: A LangGraph store shared by all compiled graphs.
+        maintenance_interval_seconds (float): Period of ``maintain``; None disables it.
+    """
+
+    def __init__(self, checkpointer, store, maintenance_interval_seconds=None):
+        self.checkpointer = checkpointer
+        self.store = store
+        self._interval = maintenance_interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def maintain(self):
+        """Expire idle threads and store items, then return free pages to the OS."""
+        result = {"threads_expired": 0, "store_items_expired": 0}
+        if hasattr(self.checkpointer, "expire_threads"):
+            result["threads_expired"] = self.checkpointer.expire_threads()
+        if getattr(self.store, "ttl_config", None) and hasattr(self.store, "sweep_ttl"):
+            result["store_items_expired"] = self.store.sweep_ttl()
+        conn = getattr(self.checkpointer, "conn", None)
+        if conn is not None:
+            with self.checkpointer.lock:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    # execute() steps the pragma only once (freeing a single page);
+                    # executescript() runs it to completion.
+                    conn.executescript("PRAGMA incremental_vacuum;")
+                elif conn.execute("PRAGMA freelist_count").fetchone()[0] > PERSISTENCE_CONFIG["vacuum_min_free_pages"]:
+                    # Databases created before auto_vacuum was set need one full VACUUM.
+                    conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info("persistence maintenance: %s", result)
+        return result
+
+    def start_maintenance(self):
+        """Run ``maintain`` periodically in a daemon thread."""
+        if not self._interval or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(self._interval):
+                try:
+                    self.maintain()
+                except Exception:
+                    logger.exception("persistence maintenance failed")
+
+        self._thread = threading.Thread(target=loop, name="persistence-maintenance", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop maintenance and close the underlying connections."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for component in (self.checkpointer, self.store):
+            conn = getattr(component, "conn", None)
+            if conn is not None:
+                lock = getattr(component, "lock", None) or threading.Lock()
+                with lock:
+                    conn.close()
+
+
+def _sqlite_backend(settings):
+    path = settings["path"]
+    busy_timeout_ms = settings["busy_timeout_ms"]
+    checkpointer = DurableSqliteSaver(
+        _connect(path, busy_timeout_ms),
+        max_checkpoints=settings["max_checkpoints_per_thread"],
+        thread_ttl_seconds=settings["thread_ttl_seconds"],
+    )
+    checkpointer.setup()
+    ttl = None
+    if settings["store_ttl_minutes"]:
+        ttl = {"default_ttl": settings["store_ttl_minutes"], "refresh_on_read": True}
+    store = DurableSqliteStore(_connect(path, busy_timeout_ms, autocommit=True), ttl=ttl)
+    store.setup()
+    return Persistence(checkpointer, store, settings["maintenance_interval_seconds"])
+
+
+def _memory_backend(settings):
+    return Persistence(MemorySaver(), InMemoryStore())
+
+
+_BACKENDS = {
+    "sqlite": _sqlite_backend,
+    "memory": _memory_backend,
+}
+
+
+def register_backend(name, factory):
+    """Register ``factory(settings) -> Persistence`` under ``name`` for ``PERSISTENCE_CONFIG["backend"]``."""
+    _BACKENDS[name] = factory
+
+
+_persistence = None
+_persistence_lock = threading.Lock()
+
+
+def get_persistence():
+    """Return the process-wide backend built from ``PERSISTENCE_CONFIG``."""
+    global _persistence
+    if _persistence is None:
+        load_env()
+        with _persistence_lock:
+            if _persistence is None:
+                backend = PERSISTENCE_CONFIG["backend"]
+                if backend not in _BACKENDS:
+                    raise ValueError(f"Unknown persistence backend: {backend!r} (known: {sorted(_BACKENDS)})")
+                persistence = _BACKENDS[backend](PERSISTENCE_CONFIG)
+                persistence.start_maintenance()
+                _persistence = persistence
+    return _persistence
+
+
+def get_checkpointer():
+    """Shared checkpointer for every compiled graph."""
+    return get_persistence().checkpointer
+
+
+def get_store():
+    """Shared long-term store for every compiled graph."""
+    return get_persistence().store
+
+
+def close_persistence():
+    """
+    Close the process-wide backend; the next ``get_persistence`` opens a new one.
+
+    Committed data is durable without this, so it is not registered with
+    atexit: a server should drain the memory queue first and then call it.
+    """
+    global _persistence
+    with _persistence_lock:
+        if _persistence is not None:
+            _persistence.close()
+            _persistence = None
@@ -0,0 +1,428 @@
+"""
+Vectorized portfolio analytics, exposed as coder tools.
+
+The coder agent used to answer allocation questions by writing loops over
+returns in ``python_repl_tool``, one round trip per step and with new bugs
+each time. The functions below work on whole matrices instead: prices are
+``(periods, assets)``, weights are ``(portfolios, assets)``, and every
+statistic, frontier point or risk-parity solution for all portfolios comes out
+of one NumPy pass:
+
+- ``simple_returns``, ``asset_statistics``, ``max_drawdown``, ``covariance``;
+- ``portfolio_statistics`` for many weight vectors at once;
+- ``mean_variance_weights`` (long-only, optional weight cap) for a vector of
+  risk aversions, and ``max_sharpe_weights`` picked from that frontier;
+- ``risk_parity_weights`` for one or many covariance matrices and risk budgets;
+- ``allocation_table``, a Markdown table of allocations.
+
+``portfolio_metrics``, ``optimize_portfolio`` and ``render_allocation_table``
+wrap them as tools. Prices come from the local market-data store (see
+market_data.py) or are passed inline.
+"""
+
+import functools
+from typing import Annotated, Dict, List
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+from .config import PORTFOLIO_CONFIG
+from .market_data import get_market_data_store, normalize_ticker
+from .metrics import counter
+
+METHODS = ("equal_weight", "min_variance", "max_sharpe", "risk_parity", "mean_variance")
+
+# Annualized volatility below which an asset or portfolio counts as riskless
+# (cash, deposits, money-market funds); optimizer round-off stays under it.
+_MIN_VOLATILITY = 1e-9
+
+METHOD_LABELS = {
+    "equal_weight": "等权",
+    "min_variance": "最小方差",
+    "max_sharpe": "最大夏普",
+    "risk_parity": "风险平价",
+}
+
+
+def simple_returns(prices):
+    """Period returns of ``(periods, assets)`` prices."""
+    prices = np.asarray(prices, dtype=np.float64)
+    return prices[1:] / prices[:-1] - 1
+
+
+def max_drawdown(returns):
+    """Largest peak-to-trough loss of each column of ``(periods, series)`` returns, as a negative fraction."""
+    wealth = np.cumprod(1 + np.asarray(returns, dtype=np.float64), axis=0)
+    wealth = np.vstack([np.ones((1, wealth.shape[1])), wealth])
+    return (wealth / np.maximum.accumulate(wealth, axis=0) - 1).min(axis=0)
+
+
+def covariance(returns, periods_per_year=None):
+    """Annualized ``(assets, assets)`` covariance of ``(periods, assets)`` returns."""
+    periods_per_year = periods_per_year or PORTFOLIO_CONFIG["periods_per_year"]
+    return np.atleast_2d(np.cov(returns, rowvar=False)) * periods_per_year
+
+
+def asset_statistics(returns, periods_per_year=None, risk_free=None):
+    """
+    Per-column statistics of ``(periods, series)`` returns.
+
+    Returns:
+        dict: Arrays ``annual_return`` (compound), ``mean`` (arithmetic,
+        annualized), ``volatility``, ``sharpe`` and ``max_drawdown``.
+    """
+    periods_per_year = periods_per_year or PORTFOLIO_CONFIG["periods_per_year"]
+    risk_free = PORTFOLIO_CONFIG["risk_free_rate"] if risk_free is None else risk_free
+    returns = np.asarray(returns, dtype=np.float64)
+    periods = len(returns)
+    mean = returns.mean(axis=0) * periods_per_year
+    volatility = returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+    growth = np.prod(1 + returns, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "annual_return": growth ** (periods_per_year / periods) - 1,
+            "mean": mean,
+            "volatility": volatility,
+            "sharpe": np.where(volatility > _MIN_VOLATILITY, (mean - risk_free) / volatility, np.nan),
+            "max_drawdown": max_drawdown(returns),
+        }
+
+
+def portfolio_statistics(weights, returns, periods_per_year=None, risk_free=None):
+    """
+    Statistics of ``(portfolios, assets)`` weights, rebalanced every period, over ``(periods, assets)`` returns.
+
+    Returns:
+        dict: Arrays of length ``portfolios``, as ``asset_statistics``.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    return asset_statistics(np.asarray(returns, dtype=np.float64) @ weights.T, periods_per_year, risk_free)
+
+
+def project_capped_simplex(values, cap=1.0):
+    """Euclidean projection of each row of ``values`` onto ``{w: 0 <= w <= cap, sum(w) = 1}``."""
+    values = np.atleast_2d(values)
+    low = (values.min(axis=1) - cap)[:, None]
+    high = values.max(axis=1)[:, None]
+    # sum(clip(v - t, 0, cap)) falls monotonically in t; bisect for the t where it equals 1.
+    for _ in range(60):
+        middle = (low + high) / 2
+        above = np.clip(values - middle, 0, cap).sum(axis=1, keepdims=True) > 1
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+    return np.clip(values - (low + high) / 2, 0, cap)
+
+
+def mean_variance_weights(mean, cov, risk_aversions, max_weight=None, iterations=None):
+    """
+    Long-only weights maximizing ``mean @ w - risk_aversion / 2 * w @ cov @ w`` for each risk aversion.
+
+    Solved for all risk aversions at once by projected gradient ascent; a
+    risk aversion of ``inf`` gives the minimum-variance portfolio.
+
+    Args:
+        mean (array): Annualized expected returns, ``(assets,)``.
+        cov (array): Annualized covariance, ``(assets, assets)``.
+        risk_aversions (array): One value per portfolio.
+        max_weight (float): Cap on every weight; None for 1.
+
+    Returns:
+        array: ``(portfolios, assets)`` weights.
+    """
+    mean = np.asarray(mean, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    cap = 1.0 if max_weight is None else float(max_weight)
+    if cap * len(mean) < 1 - 1e-9:
+        raise ValueError(f"max_weight {cap} is too small for {len(mean)} assets")
+    iterations = iterations or PORTFOLIO_CONFIG["optimizer_iterations"]
+    aversion = np.asarray(risk_aversions, dtype=np.float64)[:, None]
+    minimum_variance = np.isinf(aversion)
+    # Minimum variance: drop the return term and use unit risk aversion.
+    gain = np.where(minimum_variance, 0.0, 1.0)
+    aversion = np.where(minimum_variance, 1.0, aversion)
+    step = 1.0 / (aversion * max(np.linalg.eigvalsh(cov)[-1], 1e-12))
+    weights = project_capped_simplex(np.full((len(aversion), len(mean)), 1.0 / len(mean)), cap)
+    for _ in range(iterations):
+        gradient = gain * mean - aversion * (weights @ cov)
+        updated = project_capped_simplex(weights + step * gradient, cap)
+        if np.abs(updated - weights).max() < 1e-10:
+            return updated
+        weights = updated
+    return weights
+
+
+def max_sharpe_weights(mean, cov, risk_free=None, max_weight=None):
+    """Long-only weights with the highest Sharpe ratio on a dense mean-variance frontier."""
+    risk_free = PORTFOLIO_CONFIG["risk_free_rate"] if risk_free is None else risk_free
+    frontier = mean_variance_weights(mean, cov, np.r_[np.logspace(-1, 3, 41), np.inf], max_weight)
+    expected = frontier @ mean
+    volatility = np.sqrt(np.einsum("pi,ij,pj->p", frontier, cov, frontier))
+    return frontier[np.argmax((expected - risk_free) / np.maximum(volatility, 1e-12))]
+
+
+def risk_parity_weights(cov, budgets=None, iterations=None, tolerance=1e-10):
+    """
+    Weights whose risk contributions match ``budgets`` (equal by default).
+
+    ``cov`` may be ``(assets, assets)`` or a stack ``(portfolios, assets,
+    assets)``, and ``budgets`` ``(assets,)`` or ``(portfolios, assets)``; all
+    portfolios are solved together by cyclical coordinate descent on
+    ``cov @ y = budgets / y``.
+
+    Returns:
+        array: ``(portfolios, assets)`` weights.
+    """
+    cov = np.asarray(cov, dtype=np.float64)
+    cov = cov[None] if cov.ndim == 2 else cov
+    assets = cov.shape[-1]
+    budgets = np.full(assets, 1.0 / assets) if budgets is None else np.asarray(budgets, dtype=np.float64)
+    budgets = budgets / budgets.sum(axis=-1, keepdims=True)
+    count = max(len(cov), len(budgets) if budgets.ndim == 2 else 1)
+    budgets = np.broadcast_to(budgets, (count, assets))
+    cov = np.broadcast_to(cov, (count, assets, assets))
+    diagonal = np.einsum("pii->pi", cov)
+    if (diagonal <= _MIN_VOLATILITY ** 2).any():
+        raise ValueError("Risk parity needs every asset to have non-zero variance.")
+    y = np.sqrt(budgets / diagonal)
+    for _ in range(iterations or PORTFOLIO_CONFIG["optimizer_iterations"]):
+        previous = y.copy()
+        for i in range(assets):
+            others = np.einsum("pj,pj->p", cov[:, i, :], y) - diagonal[:, i] * y[:, i]
+            y[:, i] = (-others + np.sqrt(others ** 2 + 4 * diagonal[:, i] * budgets[:, i])) / (2 * diagonal[:, i])
+        if np.abs(y - previous).max() < tolerance:
+            break
+    return y / y.sum(axis=1, keepdims=True)
+
+
+def risk_contributions(weights, cov):
+    """Share of portfolio variance from each asset, for ``(portfolios, assets)`` weights."""
+    weights = np.atleast_2d(weights)
+    marginal = weights @ cov
+    return weights * marginal / np.einsum("pi,pi->p", weights, marginal)[:, None]
+
+
+def _percent(value, digits=1):
+    return "-" if value is None or not np.isfinite(value) else f"{value * 100:.{digits}f}%"
+
+
+def _number(value, digits=2):
+    return "-" if value is None or not np.isfinite(value) else f"{value:,.{digits}f}"
+
+
+def _markdown(header, rows):
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join(" --- " for _ in header) + "|"]
+    lines.extend("| " + " | ".join(str(cell) for cell in row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def allocation_table(assets, portfolios, weights, capital=None, statistics=None):
+    """
+    Markdown table with one row per asset and one column per portfolio.
+
+    Args:
+        assets (list): Asset names, one per column of ``weights``.
+        portfolios (list): Portfolio names, one per row of ``weights``.
+        weights (array): ``(portfolios, assets)`` weights as fractions.
+        capital (float): When given, each cell also shows the amount.
+        statistics (dict): Optional output of ``portfolio_statistics``, added as rows below.
+    """
+    weights = np.atleast_2d(weights)
+    rows = []
+    for i, asset in enumerate(assets):
+        cells = [_percent(w) if not capital else f"{_percent(w)}（{_number(w * capital, 0)}）" for w in weights[:, i]]
+        rows.append([asset, *cells])
+    rows.append(["合计", *(_percent(total) if not capital else f"{_percent(total)}（{_number(total * capital, 0)}）"
+                          for total in weights.sum(axis=1))])
+    if statistics:
+        rows.append(["年化收益", *map(_percent, statistics["annual_return"])])
+        rows.append(["年化波动", *map(_percent, statistics["volatility"])])
+        rows.append(["夏普比率", *map(_number, statistics["sharpe"])])
+        rows.append(["最大回撤", *map(_percent, statistics["max_drawdown"])])
+    return _markdown(["资产", *portfolios], rows)
+
+
+def _store_prices(tickers, start, end, column):
+    """``(assets, dates, prices)`` of ``tickers`` on their common dates, from the local store."""
+    store = get_market_data_store()
+    series = []
+    for ticker in tickers:
+        result = store.query("prices", ticker, start, end, [column])
+        if result is None:
+            raise ValueError(f"No local prices for {ticker}; use list_market_data, or pass prices inline.")
+        series.append(result)
+    common = functools.reduce(np.intersect1d, [np.asarray(dates) for dates, _ in series])
+    matrix = np.column_stack([
+        np.asarray(values[column])[np.isin(np.asarray(dates), common)] for dates, values in series
+    ])
+    return [normalize_ticker(ticker) for ticker in tickers], common, matrix
+
+
+def _price_inputs(tickers, start, end, prices, column="close"):
+    """``(assets, (periods, assets) returns)`` from the local store or from inline prices."""
+    if prices:
+        assets = list(prices)
+        lengths = {len(series) for series in prices.values()}
+        if len(lengths) != 1:
+            raise ValueError("Inline price series must all have the same length (same dates).")
+        matrix = np.column_stack([np.asarray(series, dtype=np.float64) for series in prices.values()])
+    elif tickers:
+        assets, _, matrix = _store_prices(tickers, start, end, column)
+    else:
+        raise ValueError("Pass tickers from the local market-data store or inline prices.")
+    if len(assets) > PORTFOLIO_CONFIG["max_assets"]:
+        raise ValueError(f"At most {PORTFOLIO_CONFIG['max_assets']} assets per call.")
+    matrix = matrix[~np.isnan(matrix).any(axis=1)]
+    if len(matrix) < 3:
+        raise ValueError("Need at least 3 common price observations for every asset.")
+    return assets, simple_returns(matrix)
+
+
+def _weights_matrix(weights, assets):
+    names = list(weights)
+    matrix = np.array([weights[name] for name in names], dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != len(assets):
+        raise ValueError(f"Every weight vector needs {len(assets)} values, in the order {', '.join(assets)}.")
+    # Accept percentages as well as fractions.
+    totals = matrix.sum(axis=1, keepdims=True)
+    return names, np.where(totals > 1.5, matrix / 100, matrix)
+
+
+def _tool_call(name, compute):
+    """Run ``compute()`` and turn bad input into a message the model can act on."""
+    try:
+        result = compute()
+    except ValueError as e:
+        counter("portfolio_tool_calls_total", "Portfolio analytics tool calls").inc(tool=name, outcome="error")
+        return f"{name} failed: {e}"
+    counter("portfolio_tool_calls_total", "Portfolio analytics tool calls").inc(tool=name, outcome="ok")
+    return result
+
+
+_TICKERS = Annotated[List[str], "Tickers in the local market-data store (see list_market_data)."]
+_PRICES = Annotated[Dict[str, List[float]],
+                    "Asset name -> price series on the same dates, when the data is not in the local store."]
+_START = Annotated[str, "First date, YYYY-MM-DD, for local data; omit for the earliest."]
+_END = Annotated[str, "Last date, YYYY-MM-DD, for local data; omit for the latest."]
+_PERIODS = Annotated[int, "Price observations per year: 252 daily, 52 weekly, 12 monthly."]
+
+
+def _portfolio_metrics(
+    tickers: _TICKERS = None,
+    prices: _PRICES = None,
+    start: _START = None,
+    end: _END = None,
+    weights: Annotated[Dict[str, List[float]],
+                       "Portfolios to evaluate: name -> one weight per asset, in the order of tickers/prices."] = None,
+    periods_per_year: _PERIODS = None,
+    risk_free: Annotated[float, "Annual risk-free rate, e.g. 0.02."] = None,
+):
+    """Annualized return, volatility, Sharpe ratio and max drawdown of assets and of any number of portfolios, plus the correlation matrix."""
+
+    def compute():
+        assets, returns = _price_inputs(tickers, start, end, prices)
+        stats = asset_statistics(returns, periods_per_year, risk_free)
+        rows = [[asset, _percent(stats["annual_return"][i]), _percent(stats["volatility"][i]),
+                 _number(stats["sharpe"][i]), _percent(stats["max_drawdown"][i])] for i, asset in enumerate(assets)]
+        sections = [f"样本期数：{len(returns)}", _markdown(["资产", "年化收益", "年化波动", "夏普比率", "最大回撤"], rows)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Riskless assets have no correlation; they show as "-".
+            correlation = np.atleast_2d(np.corrcoef(returns, rowvar=False))
+        sections.append(_markdown(["相关系数", *assets],
+                                  [[asset, *(_number(value) for value in correlation[i])] for i, asset in enumerate(assets)]))
+        if weights:
+            names, matrix = _weights_matrix(weights, assets)
+            sections.append(allocation_table(
+                assets, names, matrix, statistics=portfolio_statistics(matrix, returns, periods_per_year, risk_free)
+            ))
+        return "\n\n".join(sections)
+
+    return _tool_call("portfolio_metrics", compute)
+
+
+def _optimize_portfolio(
+    tickers: _TICKERS = None,
+    prices: _PRICES = None,
+    start: _START = None,
+    end: _END = None,
+    methods: Annotated[List[str], "Any of equal_weight, min_variance, max_sharpe, risk_parity, mean_variance."] = None,
+    risk_aversions: Annotated[List[float],
+                              "For mean_variance: one portfolio per value, higher is more conservative."] = None,
+    max_weight: Annotated[float, "Cap on each asset's weight in min_variance, max_sharpe and mean_variance, e.g. 0.4."] = None,
+    capital: Annotated[float, "Amount to invest, to show the money per asset."] = None,
+    periods_per_year: _PERIODS = None,
+    risk_free: Annotated[float, "Annual risk-free rate, e.g. 0.02."] = None,
+):
+    """Compute long-only allocations for several methods and risk levels at once and return them as one table with their historical statistics."""
+
+    def compute():
+        assets, returns = _price_inputs(tickers, start, end, prices)
+        stats = asset_statistics(returns, periods_per_year, risk_free)
+        cov = covariance(returns, periods_per_year)
+        cap = max_weight if max_weight is None or max_weight <= 1 else max_weight / 100
+        names, rows = [], []
+        for method in methods or PORTFOLIO_CONFIG["default_methods"]:
+            if method == "equal_weight":
+                names.append(METHOD_LABELS[method])
+                rows.append(np.full(len(assets), 1.0 / len(assets)))
+            elif method == "min_variance":
+                names.append(METHOD_LABELS[method])
+                rows.append(mean_variance_weights(stats["mean"], cov, [np.inf], cap)[0])
+            elif method == "max_sharpe":
+                names.append(METHOD_LABELS[method])
+                rows.append(max_sharpe_weights(stats["mean"], cov, risk_free, cap))
+            elif method == "risk_parity":
+                riskless = [asset for asset, value in zip(assets, stats["volatility"]) if not value > _MIN_VOLATILITY]
+                if riskless:
+                    raise ValueError(
+                        f"risk_parity needs every asset to carry risk, but {', '.join(riskless)} has zero volatility "
+                        "(cash-like). Run risk_parity without these assets and set their weight separately."
+                    )
+                names.append(METHOD_LABELS[method])
+                rows.append(risk_parity_weights(cov)[0])
+            elif method == "mean_variance":
+                aversions = risk_aversions or PORTFOLIO_CONFIG["risk_aversions"]
+                names.extend(f"均值方差 λ={value:g}" for value in aversions)
+                rows.extend(mean_variance_weights(stats["mean"], cov, aversions, cap))
+            else:
+                raise ValueError(f"Unknown method {method!r}; use {', '.join(METHODS)}.")
+        matrix = np.vstack(rows)
+        return allocation_table(assets, names, matrix, capital,
+                                portfolio_statistics(matrix, returns, periods_per_year, risk_free))
+
+    return _tool_call("optimize_portfolio", compute)
+
+
+def _render_allocation_table(
+    allocations: Annotated[Dict[str, Dict[str, float]],
+                           "Portfolio name -> {asset: weight}; weights as fractions or percentages."],
+    capital: Annotated[float, "Amount to invest, to show the money per asset."] = None,
+):
+    """Render one or more asset allocations as a Markdown table (weights, totals and optional amounts)."""
+
+    def compute():
+        if not allocations:
+            raise ValueError("No allocations given.")
+        assets = list(dict.fromkeys(asset for allocation in allocations.values() for asset in allocation))
+        weights = {name: [allocation.get(asset, 0.0) for asset in assets] for name, allocation in allocations.items()}
+        names, matrix = _weights_matrix(weights, assets)
+        return allocation_table(assets, names, matrix, capital)
+
+    return _tool_call("render_allocation_table", compute)
+
+
+portfolio_metrics = StructuredTool.from_function(func=_portfolio_metrics, name="portfolio_metrics")
+
+optimize_portfolio = StructuredTool.from_function(func=_optimize_portfolio, name="optimize_portfolio")
+
+render_allocation_table = StructuredTool.from_function(func=_render_allocation_table, name="render_allocation_table")
+
+portfolio_tools = [
+    portfolio_metrics,
+    optimize_portfolio,
+    render_allocation_table,
+]
+
+
+def get_portfolio_tools():
+    """Get the portfolio analytics tools."""
+    return portfolio_tools
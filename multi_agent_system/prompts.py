@@ -0,0 +1,95 @@
+"""
+Prompt assembly shared by every agent.
+
+Provider-side prefix caching (DashScope context cache, OpenAI prompt caching)
+only reuses the longest byte-identical prefix of a request, so every LLM call
+lays its prompt out in the same three segments:
+
+1. ``instructions``: the agent's static prompt from ``config.py``. It holds
+   no user, thread or turn specific text and is therefore the same bytes for
+   every call of that agent.
+2. ``context``: ``loaded_memory``, the rolling history summary and similar
+   per-user data, in a fixed order under fixed headers, right after the
+   instructions.
+3. ``history``: the conversation messages. Within a turn they only grow, so
+   consecutive calls share everything up to the newest message.
+
+Instructions and context form the SystemMessage; the history follows it.
+Estimated tokens per segment are recorded in ``prompt_segment_tokens``, and a
+change of an agent's instructions between calls (which invalidates the cached
+prefix) in ``prompt_prefix_changes_total``. The share of prompt tokens the
+provider actually served from its cache is recorded by instrumentation.py in
+``llm_prefix_cache_hit_ratio``.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+
+from langchain_core.messages import SystemMessage
+
+from .metrics import counter, histogram
+from .utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MEMORY_HEADER = "用户画像："
+
+# Between the instructions and the context; part of the cached prefix.
+CONTEXT_SEPARATOR = "\n\n---\n"
+
+_PLACEHOLDER = re.compile(r"\{[A-Za-z_]+\}")
+
+_prefixes = {}  # agent -> digest of its last instructions
+_prefixes_lock = threading.Lock()
+
+
+def render_context(sections):
+    """Render ``[(header, text), ...]`` in the given order, skipping empty sections."""
+    return "\n\n".join(f"{header}\n{str(text).strip()}" for header, text in sections if text and str(text).strip())
+
+
+def _check_prefix(agent, instructions):
+    """Count changes of ``agent``'s instructions and warn once about unfilled placeholders."""
+    digest = hashlib.sha1(instructions.encode("utf-8")).digest()
+    with _prefixes_lock:
+        previous = _prefixes.get(agent)
+        _prefixes[agent] = digest
+    if previous == digest:
+        return
+    if previous is not None:
+        counter("prompt_prefix_changes_total", "Calls whose static instructions differ from the previous call").inc(
+            agent=agent
+        )
+    placeholder = _PLACEHOLDER.search(instructions)
+    if placeholder:
+        logger.warning("Instructions of %s contain the unfilled placeholder %s", agent, placeholder.group())
+
+
+def _record(agent, instructions, context, messages):
+    segments = histogram("prompt_segment_tokens", "Estimated prompt tokens per agent and segment")
+    segments.observe(estimate_tokens(instructions), agent=agent, segment="instructions")
+    segments.observe(estimate_tokens(context), agent=agent, segment="context")
+    segments.observe(sum(estimate_tokens(msg.content) for msg in messages), agent=agent, segment="history")
+
+
+def build_prompt(agent, instructions, context=(), messages=()):
+    """
+    Assemble the messages of one LLM call as instructions, context, history.
+
+    Args:
+        agent (str): Name the segment metrics are labelled with.
+        instructions (str): Static prompt; never formatted with per-call values.
+        context (list): ``(header, text)`` sections in their fixed order; empty ones are skipped.
+        messages (list): Conversation messages following the SystemMessage.
+
+    Returns:
+        list: The SystemMessage (instructions, then context) followed by ``messages``.
+    """
+    messages = list(messages)
+    rendered = render_context(context)
+    _check_prefix(agent, instructions)
+    _record(agent, instructions, rendered, messages)
+    system = f"{instructions}{CONTEXT_SEPARATOR}{rendered}" if rendered else instructions
+    return [SystemMessage(system)] + messages
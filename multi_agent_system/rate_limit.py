@@ -0,0 +1,280 @@
+"""
+Process-wide rate limiting and retries for upstream services.
+
+Each upstream (``llm:<model>``, ``tavily_search``, ``tavily_extract``) gets one
+``UpstreamLimiter`` shared by every agent, tool and background worker:
+
+- a token bucket that caps the request rate at the provider quota;
+- an adaptive concurrency limit (AIMD): it grows slowly while calls succeed and
+  is cut back when the provider throttles, so bursts queue here instead of
+  turning into a wave of 429s.
+
+Failed calls that are worth retrying (throttling, 5xx, timeouts, connection
+errors) are retried with full-jitter exponential backoff, honouring
+``Retry-After``. Every retry also draws on a per-request budget
+(``retry_budget()``), so one user turn cannot retry without bound while the
+upstream is down. Time spent waiting for the limiter is recorded as
+``upstream_queue_wait_seconds``.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+import httpx
+
+from .config import RATE_LIMIT_CONFIG
+from .instrumentation import record_queue_wait
+from .metrics import counter, gauge, histogram
+
+OK = "ok"
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+
+# How often a caller waiting on the concurrency limit looks again.
+_POLL_SECONDS = 0.01
+
+_TRANSIENT_ERROR_NAMES = {"TimeoutError", "ConnectionError", "ReadTimeout", "ConnectTimeout", "Timeout"}
+
+
+class UpstreamLimiter:
+    """
+    Token bucket plus adaptive concurrency limit for one upstream.
+
+    Args:
+        name (str): Upstream name, used as the metric label.
+        rate (float): Sustained requests per second; None for no rate limit.
+        burst (int): Bucket size, i.e. requests allowed back to back.
+        max_concurrency (int): Upper bound of the adaptive limit.
+        min_concurrency (int): Lower bound of the adaptive limit.
+    """
+
+    def __init__(self, name, rate=None, burst=1, max_concurrency=16, min_concurrency=1):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        """Take a slot and a token; return 0.0 on success or the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.in_flight >= int(self.limit):
+                return _POLL_SECONDS
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+            self.in_flight += 1
+            return 0.0
+
+    def _record_wait(self, waited):
+        histogram("upstream_queue_wait_seconds", "Time calls waited for the upstream rate limiter").observe(
+            waited, upstream=self.name
+        )
+        record_queue_wait(self.name, waited)
+
+    def acquire(self):
+        """Block until the call may start."""
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                break
+            time.sleep(min(wait, 1.0))
+        self._record_wait(time.monotonic() - started)
+
+    async def aacquire(self):
+        """Async variant of ``acquire``; never blocks the event loop."""
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+        self._record_wait(time.monotonic() - started)
+
+    def release(self, outcome=OK, retry_after=None):
+        """Return the slot and adapt the concurrency limit to ``outcome``."""
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == THROTTLED:
+                self.limit = max(self.min_concurrency, self.limit * 0.5)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            elif outcome == OK:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            limit = self.limit
+        gauge("upstream_concurrency_limit", "Adaptive concurrency limit per upstream").set(limit, upstream=self.name)
+        if outcome == THROTTLED:
+            counter("upstream_throttled_total", "Calls rejected by the provider as rate limited").inc(upstream=self.name)
+
+
+class RetryBudget:
+    """Retries left for one request (e.g. one user turn), shared by all of its upstream calls."""
+
+    def __init__(self, retries):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_budget = contextvars.ContextVar("retry_budget", default=None)
+
+
+@contextlib.contextmanager
+def retry_budget(retries=None):
+    """
+    Scope a per-request retry budget over the calls made inside the block.
+
+    LangGraph copies the context into nodes and tools, so setting it around a
+    graph run covers every LLM and search call of that run. Without a scope,
+    only the per-call ``max_attempts`` applies.
+    """
+    token = _budget.set(RetryBudget(RATE_LIMIT_CONFIG["request_retry_budget"] if retries is None else retries))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def _settings_for(name):
+    upstreams = RATE_LIMIT_CONFIG["upstreams"]
+    return upstreams.get(name) or upstreams.get(name.split(":", 1)[0]) or upstreams["default"]
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """Return the shared limiter for upstream ``name`` (e.g. ``llm:qwen-plus-latest``)."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = _limiters[name] = UpstreamLimiter(name, **_settings_for(name))
+    return limiter
+
+
+def reset_limiters():
+    """Forget every limiter, e.g. after changing ``RATE_LIMIT_CONFIG``."""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def _retry_after_header(headers):
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except ValueError:
+        return None
+
+
+def classify_status(status_code, headers=None):
+    """Map an HTTP status to ``(outcome, retry_after seconds)``."""
+    if status_code == 429:
+        return THROTTLED, _retry_after_header(headers)
+    if status_code >= 500:
+        return TRANSIENT, _retry_after_header(headers)
+    return OK, None
+
+
+def classify_error(exc):
+    """
+    Map an exception to ``(outcome, retry_after)``; outcome is None if retrying is pointless.
+
+    Recognizes HTTP errors carrying a response, Tavily's ``UsageLimitExceededError``
+    and timeout/connection errors from httpx, requests and Tavily.
+    """
+    response = getattr(exc, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if isinstance(status_code, int):
+        outcome, retry_after = classify_status(status_code, getattr(response, "headers", None))
+        return (outcome if outcome != OK else None), retry_after
+    if type(exc).__name__ == "UsageLimitExceededError":
+        return THROTTLED, getattr(exc, "retry_after_seconds", None)
+    if isinstance(exc, httpx.TransportError) or type(exc).__name__ in _TRANSIENT_ERROR_NAMES:
+        return TRANSIENT, None
+    return None, None
+
+
+def retry_delay(name, attempt, outcome, retry_after=None):
+    """
+    Seconds to wait before retry number ``attempt + 1``, or None to give up.
+
+    Gives up for non-retryable outcomes, after ``max_attempts`` or when the
+    request's retry budget is spent. Uses full jitter so that callers
+    throttled together do not retry together.
+    """
+    if outcome not in (THROTTLED, TRANSIENT) or attempt + 1 >= RATE_LIMIT_CONFIG["max_attempts"]:
+        return None
+    budget = _budget.get()
+    if budget is not None and not budget.take():
+        counter("upstream_retry_budget_exhausted_total", "Retries refused by the per-request budget").inc(upstream=name)
+        return None
+    counter("upstream_retries_total", "Retried upstream calls").inc(upstream=name, outcome=outcome)
+    delay = random.uniform(0, min(RATE_LIMIT_CONFIG["max_delay"], RATE_LIMIT_CONFIG["base_delay"] * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def call(name, fn, *args, **kwargs):
+    """Call ``fn`` under the limiter for ``name``, retrying retryable failures."""
+    limiter = get_limiter(name)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            outcome, retry_after = classify_error(e)
+            limiter.release(outcome or TRANSIENT, retry_after)
+            delay = retry_delay(name, attempt, outcome, retry_after)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        limiter.release(OK)
+        return result
+
+
+async def acall(name, fn, *args, **kwargs):
+    """Async variant of ``call`` for a coroutine function ``fn``."""
+    limiter = get_limiter(name)
+    attempt = 0
+    while True:
+        await limiter.aacquire()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            outcome, retry_after = classify_error(e)
+            limiter.release(outcome or TRANSIENT, retry_after)
+            delay = retry_delay(name, attempt, outcome, retry_after)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        limiter.release(OK)
+        return result
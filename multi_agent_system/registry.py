@@ -0,0 +1,80 @@
+"""
+Compile-once registry for the supervisor and sub-agent graphs.
+
+Building a graph means creating LLM clients, binding tools and compiling the
+LangGraph workflow. None of that depends on the user turn, so the registry
+builds each graph once per process and hands out the same compiled object to
+every caller. Compiled graphs are immutable and safe to invoke concurrently;
+per-thread state lives in the checkpointer of the top-level graph.
+"""
+
+import threading
+
+from .searcher_agent import create_searcher_agent
+from .summary_agent import create_summary_agent
+from .coder_agent import create_coder_agent
+
+# Name -> builder. Sub-agents are compiled in embedded mode so they inherit the
+# checkpointer of the graph they run in instead of keeping private state.
+_BUILDERS = {
+    "searcher_subagent": lambda: create_searcher_agent(embedded=True),
+    "summary_subagent": lambda: create_summary_agent(embedded=True),
+    "coder_subagent": lambda: create_coder_agent(embedded=True),
+    "supervisor": lambda: _build_supervisor(),
+}
+
+_graphs = {}
+_lock = threading.RLock()
+
+
+def _build_supervisor():
+    from .supervisor import build_supervisor
+
+    return build_supervisor(
+        searcher_agent=get_graph("searcher_subagent"),
+        summary_agent=get_graph("summary_subagent"),
+        embedded=True,
+    )
+
+
+def get_graph(name):
+    """
+    Return the compiled graph registered under ``name``, building it on first use.
+
+    Args:
+        name (str): One of the registered graph names, e.g. "supervisor".
+
+    Returns:
+        langgraph.graph: The shared compiled graph.
+    """
+    graph = _graphs.get(name)
+    if graph is not None:
+        return graph
+
+    if name not in _BUILDERS:
+        raise KeyError(f"Unknown graph: {name}")
+
+    with _lock:
+        # Another thread may have finished the build while we waited.
+        graph = _graphs.get(name)
+        if graph is None:
+            graph = _BUILDERS[name]()
+            _graphs[name] = graph
+    return graph
+
+
+def get_supervisor():
+    """Return the shared compiled supervisor graph."""
+    return get_graph("supervisor")
+
+
+def warm_up(names=("searcher_subagent", "summary_subagent", "supervisor")):
+    """Build the given graphs eagerly, typically once at process start."""
+    for name in names:
+        get_graph(name)
+
+
+def reset():
+    """Drop every cached graph so the next lookup rebuilds it (e.g. after a config change)."""
+    with _lock:
+        _graphs.clear()
@@ -0,0 +1,332 @@
+"""
+Pool of warm, sandboxed worker processes for ``python_repl_tool``.
+
+The tool used to ``exec`` code in one module-global ``PythonREPL`` inside the
+serving process: a runaway snippet blocked the worker, every conversation
+shared the same globals and heavy libraries were imported on first use.
+
+``ReplPool`` keeps a few worker processes that import the common data
+libraries once at startup. Each conversation gets its own namespace, pinned to
+one worker so variables survive between tool calls. Every execution has a
+wall-clock limit (the worker is killed and replaced when it is exceeded), each
+worker has an address-space limit, workers are recycled after a number of runs
+and a semaphore caps how many snippets run at once.
+
+This isolates conversations from each other and from the server; it is not a
+security boundary against hostile code.
+"""
+
+import builtins
+import contextlib
+import importlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .config import REPL_POOL_CONFIG
+from .metrics import counter, histogram
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a new worker may take to import ``warm_imports``.
+_START_TIMEOUT = 60.0
+
+
+def _worker_main(conn, warm_imports, memory_limit_bytes, max_sessions):
+    """Worker process: import the libraries once, then run snippets until told to stop."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    for name in warm_imports:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    if memory_limit_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    conn.send(("ready", os.getpid()))
+
+    namespaces = OrderedDict()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        session_id, code, max_output = message
+        namespace = namespaces.get(session_id)
+        evicted = []
+        if namespace is None:
+            namespace = namespaces[session_id] = {"__name__": "__main__", "__builtins__": builtins}
+            while len(namespaces) > max_sessions:
+                evicted.append(namespaces.popitem(last=False)[0])
+        namespaces.move_to_end(session_id)
+
+        output = io.StringIO()
+        ok = True
+        fatal = False
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                exec(code, namespace)
+        except MemoryError:
+            ok = False
+            fatal = True
+            output.write(f"MemoryError: the snippet exceeded the {memory_limit_bytes // (1024 * 1024)} MB memory limit")
+        except BaseException as e:
+            ok = False
+            output.write(repr(e))
+        # Evicted sessions are reported so the pool can unpin them and warn them.
+        conn.send((ok, output.getvalue()[:max_output], fatal, evicted))
+        if fatal:
+            # Whatever was half-allocated stays around; let the pool start afresh.
+            break
+
+
+def _context(warm_imports):
+    """Fork-server workers start fast and preload the libraries once; fall back to spawn."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # Only takes effect before the fork server starts, i.e. for the first pool.
+        ctx.set_forkserver_preload([__name__] + list(warm_imports))
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    """One worker process plus the bookkeeping the pool needs about it."""
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.process = None
+        self.conn = None
+        self.runs = 0
+        self.ready = False
+
+    def start(self):
+        """Launch the process without waiting for its imports (see ``wait_ready``)."""
+        parent_conn, child_conn = self.pool.ctx.Pipe()
+        self.process = self.pool.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, list(self.pool.warm_imports), self.pool.memory_limit_bytes, self.pool.max_sessions),
+            name=f"repl-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.runs = 0
+        self.ready = False
+
+    def wait_ready(self):
+        if self.ready:
+            return
+        if not self.conn.poll(_START_TIMEOUT):
+            raise RuntimeError(f"REPL worker {self.index} did not start within {_START_TIMEOUT:.0f} s")
+        self.conn.recv()
+        self.ready = True
+
+    def stop(self, kill=False):
+        if self.process is None:
+            return
+        if not kill:
+            with contextlib.suppress(OSError):
+                self.conn.send(None)
+            self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=2)
+        self.conn.close()
+        self.process = None
+
+
+class ReplPool:
+    """
+    Warm worker processes running Python snippets in per-session namespaces.
+
+    Args:
+        workers (int): Number of worker processes.
+        max_concurrency (int): Snippets executed at once across the pool.
+        timeout (float): Wall-clock seconds per execution.
+        memory_limit_mb (int): Address-space limit per worker; None disables it.
+        max_runs_per_worker (int): Executions before a worker is replaced.
+        max_sessions_per_worker (int): Namespaces kept per worker (LRU).
+        queue_timeout (float): Seconds to wait for a free worker.
+        max_output_chars (int): Longest output returned.
+        warm_imports (list): Modules imported when a worker starts.
+    """
+
+    def __init__(self, workers=2, max_concurrency=None, timeout=30.0, memory_limit_mb=1024,
+                 max_runs_per_worker=100, max_sessions_per_worker=64, queue_timeout=30.0,
+                 max_output_chars=20000, warm_imports=()):
+        self.timeout = timeout
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.max_runs = max_runs_per_worker
+        self.max_sessions = max_sessions_per_worker
+        self.queue_timeout = queue_timeout
+        self.max_output_chars = max_output_chars
+        self.warm_imports = tuple(warm_imports)
+        self.ctx = _context(self.warm_imports)
+        self._slots = threading.BoundedSemaphore(max_concurrency or workers)
+        self._lock = threading.Lock()
+        self._affinity = {}  # session id -> worker
+        # Sessions whose namespace was lost (worker restart or eviction), oldest
+        # first; capped so one-shot sessions that never return do not pile up.
+        self._reset_sessions = OrderedDict()
+        self._max_reset_sessions = self.max_sessions * max(1, workers) * 4
+        self._workers = [_Worker(self, index) for index in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def warm_up(self):
+        """Block until every worker has finished its imports."""
+        for worker in self._workers:
+            with worker.lock:
+                worker.wait_ready()
+
+    def _pick(self, session_id):
+        """The session's worker, or the least loaded one (idle first) for a new session."""
+        with self._lock:
+            worker = self._affinity.get(session_id)
+            if worker is None:
+                worker = min(self._workers, key=lambda w: (w.lock.locked(), len(w.sessions)))
+                self._affinity[session_id] = worker
+                worker.sessions.add(session_id)
+            return worker
+
+    def _mark_reset(self, worker, session_ids):
+        """Unpin sessions whose namespace on ``worker`` is gone and flag them for the restart note (holds ``_lock``)."""
+        for session_id in session_ids:
+            worker.sessions.discard(session_id)
+            if self._affinity.get(session_id) is worker:
+                del self._affinity[session_id]
+            self._reset_sessions[session_id] = None
+            self._reset_sessions.move_to_end(session_id)
+        while len(self._reset_sessions) > self._max_reset_sessions:
+            self._reset_sessions.popitem(last=False)
+
+    def _replace(self, worker, reason, kill=False):
+        """Restart a worker; sessions pinned to it lose their variables."""
+        with self._lock:
+            self._mark_reset(worker, list(worker.sessions))
+        worker.stop(kill=kill)
+        worker.start()
+        counter("repl_worker_restarts_total", "REPL worker processes replaced").inc(reason=reason)
+
+    def execute(self, session_id, code, timeout=None):
+        """
+        Run ``code`` in the namespace of ``session_id``.
+
+        Returns:
+            tuple: ``(ok, output)`` where output is stdout/stderr plus the
+            error, if any.
+        """
+        timeout = timeout or self.timeout
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            counter("repl_rejected_total", "Snippets rejected because every worker was busy").inc()
+            return False, "All Python workers are busy; try again shortly."
+        try:
+            worker = self._pick(session_id)
+            if not worker.lock.acquire(timeout=self.queue_timeout):
+                counter("repl_rejected_total", "Snippets rejected because every worker was busy").inc()
+                return False, "The Python worker for this conversation is busy; try again shortly."
+            try:
+                histogram("repl_queue_wait_seconds", "Time snippets waited for a worker").observe(
+                    time.perf_counter() - queued
+                )
+                return self._run(worker, session_id, code, timeout)
+            finally:
+                worker.lock.release()
+        finally:
+            self._slots.release()
+
+    def _run(self, worker, session_id, code, timeout):
+        with self._lock:
+            note = "Note: this conversation's Python session was reset, variables from earlier runs are gone.\n" \
+                if session_id in self._reset_sessions else ""
+            self._reset_sessions.pop(session_id, None)
+            # The session may have been re-pinned by a restart while it waited.
+            self._affinity[session_id] = worker
+            worker.sessions.add(session_id)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            worker.wait_ready()
+            worker.conn.send((session_id, code, self.max_output_chars))
+            if not worker.conn.poll(timeout):
+                outcome = "timeout"
+                self._replace(worker, "timeout", kill=True)
+                return False, note + f"Execution timed out after {timeout:.0f} s; the worker was restarted."
+            ok, output, fatal, evicted = worker.conn.recv()
+            if evicted:
+                with self._lock:
+                    self._mark_reset(worker, evicted)
+            if not ok:
+                outcome = "error"
+        except (EOFError, OSError, RuntimeError) as e:
+            outcome = "crash"
+            logger.warning("REPL worker %d failed: %r", worker.index, e)
+            self._replace(worker, "crash", kill=True)
+            return False, note + "The Python worker crashed (possibly out of memory) and was restarted."
+        finally:
+            histogram("repl_execution_seconds", "Wall time of python_repl_tool executions").observe(
+                time.perf_counter() - started, outcome=outcome
+            )
+
+        worker.runs += 1
+        if fatal:
+            # The worker exits after a MemoryError.
+            self._replace(worker, "memory", kill=True)
+        elif worker.runs >= self.max_runs:
+            self._replace(worker, "recycle")
+        return ok, note + output
+
+    def close(self):
+        """Stop every worker."""
+        for worker in self._workers:
+            with worker.lock:
+                worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_repl_pool():
+    """Return the process-wide pool built from ``REPL_POOL_CONFIG``; workers start on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ReplPool(
+                    workers=REPL_POOL_CONFIG["workers"],
+                    max_concurrency=REPL_POOL_CONFIG["max_concurrency"],
+                    timeout=REPL_POOL_CONFIG["timeout_seconds"],
+                    memory_limit_mb=REPL_POOL_CONFIG["memory_limit_mb"],
+                    max_runs_per_worker=REPL_POOL_CONFIG["max_runs_per_worker"],
+                    max_sessions_per_worker=REPL_POOL_CONFIG["max_sessions_per_worker"],
+                    queue_timeout=REPL_POOL_CONFIG["queue_timeout_seconds"],
+                    max_output_chars=REPL_POOL_CONFIG["max_output_chars"],
+                    warm_imports=REPL_POOL_CONFIG["warm_imports"],
+                )
+    return _pool
+
+
+def close_repl_pool():
+    """Stop the process-wide pool; the next ``get_repl_pool`` starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
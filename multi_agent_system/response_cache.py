@@ -0,0 +1,153 @@
+"""
+Exact-match cache for LLM responses.
+
+Many users ask near-identical questions, and for those the supervisor and
+summary prompts are identical apart from the loaded profile. ``ResponseCache``
+plugs into LangChain's ``cache=`` hook of a chat model: the key combines the
+model settings (model name, sampling parameters and bound tool schemas, all
+part of LangChain's ``llm_string``) with the prompt messages, normalized so
+that per-run ids and whitespace do not defeat matching.
+
+Storage reuses the two-tier ``SearchCache`` (in-process LRU plus SQLite) with
+one TTL per agent. Cached answers carry ``response_metadata["cache_hit"] = True``.
+The cache is opt-in: see ``RESPONSE_CACHE_CONFIG``.
+"""
+
+import hashlib
+import json
+import threading
+import unicodedata
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration
+
+from .config import RESPONSE_CACHE_CONFIG, load_env
+from .search_cache import SearchCache
+
+# Keys that differ on every run without changing what the model sees.
+_VOLATILE_KEYS = {"id", "tool_call_id"}
+# Bookkeeping on earlier answers (token usage, finish reason, cache_hit) that
+# is never sent to the model.
+_UNSENT_KEYS = {"response_metadata", "usage_metadata"}
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {
+            key: _normalize(item) for key, item in value.items()
+            if key not in _UNSENT_KEYS and not (key in _VOLATILE_KEYS and isinstance(item, str))
+        }
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFKC", value).split())
+    return value
+
+
+def cache_key(prompt, llm_string):
+    """
+    Hash a serialized prompt and model description into a cache key.
+
+    ``prompt`` is the JSON LangChain produces for the message list. Message and
+    tool-call ids and response metadata are dropped (the class paths under
+    ``"id"`` are lists and are kept) and text is NFKC- and whitespace-normalized.
+    """
+    try:
+        normalized = json.dumps(_normalize(json.loads(prompt)), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        normalized = _normalize(prompt)
+    model = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()[:16]
+    return f"{model}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+
+def _cacheable(generation):
+    message = getattr(generation, "message", None)
+    return message is not None and bool(message.content or getattr(message, "tool_calls", None))
+
+
+class ResponseCache(BaseCache):
+    """
+    LangChain cache for one agent's chat model.
+
+    Args:
+        agent (str): Agent name; selects the TTL and labels the metrics.
+        store (SearchCache): Shared storage, see ``get_response_store``.
+    """
+
+    def __init__(self, agent, store):
+        self.agent = agent
+        self._store = store
+
+    def lookup(self, prompt, llm_string):
+        value = self._store.get(self.agent, cache_key(prompt, llm_string))
+        if value is None:
+            return None
+        generations = []
+        for entry in value:
+            message = messages_from_dict([entry["message"]])[0]
+            # A fresh id per hit; reusing the stored one would make add_messages
+            # overwrite the earlier answer in threads that get the same hit twice.
+            message.id = None
+            message.response_metadata = {**message.response_metadata, "cache_hit": True}
+            generations.append(ChatGeneration(message=message, generation_info=entry.get("generation_info")))
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        # Empty answers are usually failures worth retrying, not worth replaying.
+        if not return_val or not all(_cacheable(generation) for generation in return_val):
+            return
+        value = [
+            {
+                "message": messages_to_dict([generation.message])[0],
+                "generation_info": generation.generation_info,
+            }
+            for generation in return_val
+        ]
+        self._store.set(self.agent, cache_key(prompt, llm_string), value)
+
+    def clear(self, **kwargs):
+        """Remove every cached response (for all agents sharing the store)."""
+        self._store.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_response_store():
+    """Return the process-wide response storage built from ``RESPONSE_CACHE_CONFIG``."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SearchCache(
+                    path=RESPONSE_CACHE_CONFIG["path"],
+                    memory_entries=RESPONSE_CACHE_CONFIG["memory_entries"],
+                    max_disk_bytes=RESPONSE_CACHE_CONFIG["max_disk_mb"] * 1024 * 1024,
+                    ttl_seconds=RESPONSE_CACHE_CONFIG["ttl_seconds"],
+                    default_ttl_seconds=RESPONSE_CACHE_CONFIG["default_ttl_seconds"],
+                    name="response_cache",
+                )
+    return _store
+
+
+_caches = {}
+
+
+def response_cache_for(agent):
+    """
+    Return the ``cache=`` argument for ``agent``'s chat model.
+
+    None (no caching) unless ``RESPONSE_CACHE_CONFIG`` enables the cache both
+    globally and for this agent. Agents share storage but not TTLs.
+    """
+    load_env()
+    if not RESPONSE_CACHE_CONFIG["enabled"] or not RESPONSE_CACHE_CONFIG["agents"].get(agent, False):
+        return None
+    cache = _caches.get(agent)
+    if cache is None:
+        store = get_response_store()
+        with _store_lock:
+            cache = _caches.setdefault(agent, ResponseCache(agent, store))
+    return cache
@@ -0,0 +1,183 @@
+"""
+Deterministic fast-path routing for the supervisor.
+
+Most turns follow the same plan, research with ``searcher_subagent`` then
+advise with ``summary_subagent``, yet with LLM supervision every handoff costs
+a full supervisor round trip over the whole history. ``ROUTER_CONFIG`` selects
+how ``build_supervisor`` routes:
+
+- ``"llm"``: the supervisor LLM decides every step (the original behaviour).
+- ``"rules"``: the question is matched against ordered rules up front; a
+  recognised question runs its plan of sub-agents in sequence without any
+  supervisor LLM call, anything else falls back to LLM supervision.
+- ``"shadow"``: the LLM still decides, and the rule decision is logged next
+  to the handoffs the LLM actually made, so rule accuracy can be measured
+  before switching to ``"rules"``.
+
+Decisions are logged as JSON on the ``multi_agent_system.router`` logger and
+counted in ``router_decisions_total``.
+"""
+
+import json
+import logging
+import re
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from .config import ROUTER_CONFIG
+from .history import split_turns
+from .metrics import counter
+from .state import State
+from .utils import dual_node
+
+logger = logging.getLogger(__name__)
+
+LLM_ROUTE = "llm_supervisor"
+
+_HANDOFF_PREFIX = "transfer_to_"
+
+_compiled = None
+_compiled_lock = threading.Lock()
+
+
+def _rules():
+    """``(llm patterns, [(name, plan, requires_research, patterns), ...])`` compiled from ``ROUTER_CONFIG``."""
+    global _compiled
+    if _compiled is None:
+        with _compiled_lock:
+            if _compiled is None:
+                _compiled = (
+                    [re.compile(pattern, re.IGNORECASE) for pattern in ROUTER_CONFIG["llm_patterns"]],
+                    [
+                        (rule["name"], tuple(rule["plan"]), rule.get("requires_research", False),
+                         [re.compile(pattern, re.IGNORECASE) for pattern in rule["patterns"]])
+                        for rule in ROUTER_CONFIG["rules"]
+                    ],
+                )
+    return _compiled
+
+
+def classify(question, has_research=False):
+    """
+    Decide the plan for ``question``.
+
+    Args:
+        question (str): The user's message for this turn.
+        has_research (bool): Whether earlier turns already produced searcher results.
+
+    Returns:
+        tuple: ``(rule name, plan)``; ``plan`` is a tuple of sub-agent names,
+        or None when the turn should be left to the supervisor LLM.
+    """
+    question = question.strip()
+    if not question:
+        return "empty", None
+    if len(question) > ROUTER_CONFIG["max_question_chars"]:
+        return "too_long", None
+    llm_patterns, rules = _rules()
+    if any(pattern.search(question) for pattern in llm_patterns):
+        return "needs_llm", None
+    for name, plan, requires_research, patterns in rules:
+        if requires_research and not has_research:
+            continue
+        if any(pattern.search(question) for pattern in patterns):
+            return name, plan
+    return "unmatched", None
+
+
+def _turn(state):
+    """``(question, has_research, messages of this turn)`` for the current turn."""
+    turns = split_turns(state.get("messages", []))
+    if not turns or not isinstance(turns[-1][0], HumanMessage):
+        return "", False, []
+    has_research = bool(state.get("history_summary")) or any(
+        getattr(msg, "name", None) == "searcher_subagent" for turn in turns[:-1] for msg in turn
+    )
+    return str(turns[-1][0].content), has_research, turns[-1]
+
+
+def _log(config, **fields):
+    if not ROUTER_CONFIG["log_decisions"] or not logger.isEnabledFor(logging.INFO):
+        return
+    record = {"thread_id": (config or {}).get("configurable", {}).get("thread_id"), **fields}
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def route(state: State, config: RunnableConfig):
+    """Entry edge in ``"rules"`` mode: the first sub-agent of the plan, or the LLM supervisor."""
+    question, has_research, _ = _turn(state)
+    rule, plan = classify(question, has_research)
+    counter("router_decisions_total", "Supervisor routing decisions").inc(
+        rule=rule, route="llm" if plan is None else "fast"
+    )
+    _log(config, mode="rules", rule=rule, plan=list(plan) if plan else None, question=question[:200])
+    return LLM_ROUTE if plan is None else plan[0]
+
+
+def next_step(agent_name):
+    """Edge after ``agent_name`` in ``"rules"`` mode: the next sub-agent of the plan, or "end"."""
+
+    def after(state: State):
+        # Same question and earlier turns as at the start of the turn, hence the same plan.
+        question, has_research, _ = _turn(state)
+        _, plan = classify(question, has_research)
+        if not plan or agent_name not in plan or plan.index(agent_name) == len(plan) - 1:
+            return "end"
+        return plan[plan.index(agent_name) + 1]
+
+    after.__name__ = f"after_{agent_name}"
+    return after
+
+
+def llm_plan(messages):
+    """Sub-agents the supervisor LLM handed off to, in order."""
+    return [
+        call["name"][len(_HANDOFF_PREFIX):]
+        for msg in messages if isinstance(msg, AIMessage)
+        for call in msg.tool_calls if call["name"].startswith(_HANDOFF_PREFIX)
+    ]
+
+
+def audit_route(state: State, config: RunnableConfig):
+    """
+    Exit node in ``"shadow"`` mode: log the rule decision against what the LLM did.
+
+    Agreement is only defined for turns the rules planned; a fallback to the
+    LLM is logged with ``agree`` null and counted as ``agree="n/a"``, so rule
+    accuracy is the agree="true" share of ``route="fast"`` decisions.
+    """
+    question, has_research, turn = _turn(state)
+    rule, plan = classify(question, has_research)
+    actual = llm_plan(turn)
+    agree = None if plan is None else list(plan) == actual
+    counter("router_shadow_decisions_total", "Rule decisions compared with LLM supervision").inc(
+        rule=rule, route="llm" if plan is None else "fast", agree="n/a" if agree is None else str(agree).lower()
+    )
+    _log(config, mode="shadow", rule=rule, plan=list(plan) if plan else None, llm_plan=actual, agree=agree,
+         question=question[:200])
+    return {}
+
+
+def agent_node(agent):
+    """
+    Run a compiled sub-agent as a fast-path step.
+
+    Like LangGraph supervisor's ``last_message`` output mode, only the
+    agent's final message is added to the thread, tagged with the agent name.
+    """
+
+    def _last(output):
+        message = output["messages"][-1]
+        if isinstance(message, AIMessage) and not message.name:
+            message = message.model_copy(update={"name": agent.name})
+        return {"messages": [message]}
+
+    def run(state, config):
+        return _last(agent.invoke(state, config))
+
+    async def arun(state, config):
+        return _last(await agent.ainvoke(state, config))
+
+    return dual_node(run, arun, name=agent.name)
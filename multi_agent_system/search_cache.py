@@ -0,0 +1,230 @@
+"""
+Two-tier cache for Tavily search and page-extraction responses.
+
+Lookups go to an in-process LRU first and then to an on-disk SQLite tier that
+survives restarts and is shared by every worker on the host. Entries expire
+after a per-tool TTL; the disk tier is trimmed to a size budget by evicting the
+least recently used rows.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .config import SEARCH_CACHE_CONFIG, load_env
+from .instrumentation import record_cache_lookup
+from .metrics import counter
+
+
+def normalize_query(query):
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize("NFKC", str(query)).lower()
+    return " ".join(text.split())
+
+
+def normalize_url(url):
+    """Normalize a URL: lowercase scheme/host, drop fragments and tracking params, sort the query."""
+    parts = urlsplit(str(url).strip())
+    params = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_")
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(params)), ""))
+
+
+class SearchCache:
+    """
+    In-process LRU backed by an optional SQLite tier.
+
+    Args:
+        path (str): SQLite file for the disk tier; falsy disables it.
+        memory_entries (int): Capacity of the in-process LRU.
+        max_disk_bytes (int): Size budget of the disk tier.
+        ttl_seconds (dict): Per-tool time-to-live in seconds.
+        default_ttl_seconds (float): TTL for tools missing from ``ttl_seconds``.
+        name (str): Table name of the disk tier and prefix of the lookup metric,
+            so other caches can reuse this class (see response_cache.py).
+    """
+
+    def __init__(self, path=None, memory_entries=512, max_disk_bytes=256 * 1024 * 1024,
+                 ttl_seconds=None, default_ttl_seconds=3600, name="search_cache"):
+        self.name = name
+        self._memory = OrderedDict()  # (tool, key) -> (expires_at, value)
+        self._memory_entries = memory_entries
+        self._max_disk_bytes = max_disk_bytes
+        self._ttl_seconds = dict(ttl_seconds or {})
+        self._default_ttl = default_ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                " tool TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (tool, key))"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_accessed ON {name} (accessed_at)")
+
+    def ttl_for(self, tool):
+        return self._ttl_seconds.get(tool, self._default_ttl)
+
+    def get(self, tool, key):
+        """Return the cached value for ``(tool, key)`` or None on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((tool, key))
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end((tool, key))
+                    self._count("memory_hits", tool)
+                    return entry[1]
+                del self._memory[(tool, key)]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.name} WHERE tool = ? AND key = ?", (tool, key)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._conn.execute(
+                        f"UPDATE {self.name} SET accessed_at = ? WHERE tool = ? AND key = ?", (now, tool, key)
+                    )
+                    value = json.loads(row[0])
+                    self._remember(tool, key, row[1], value)
+                    self._count("disk_hits", tool)
+                    return value
+
+            self._count("misses", tool)
+            return None
+
+    def contains(self, tool, key):
+        """Whether an unexpired value is stored for ``(tool, key)``; not counted as a lookup."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((tool, key))
+            if entry is not None and entry[0] > now:
+                return True
+            if self._conn is None:
+                return False
+            return self._conn.execute(
+                f"SELECT 1 FROM {self.name} WHERE tool = ? AND key = ? AND expires_at > ?", (tool, key, now)
+            ).fetchone() is not None
+
+    def set(self, tool, key, value):
+        """Store a JSON-serializable ``value`` for ``(tool, key)`` with the tool's TTL."""
+        now = time.time()
+        expires_at = now + self.ttl_for(tool)
+        with self._lock:
+            self._remember(tool, key, expires_at, value)
+            self._stats["writes"] += 1
+            if self._conn is not None:
+                payload = json.dumps(value, ensure_ascii=False)
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (tool, key, value, size, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (tool, key, payload, len(payload.encode("utf-8")), expires_at, now),
+                )
+                # Expiry and size checks scan the table, so amortize them over writes.
+                if self._stats["writes"] % 64 == 1:
+                    self._evict_disk(now)
+
+    def _remember(self, tool, key, expires_at, value):
+        self._memory[(tool, key)] = (expires_at, value)
+        self._memory.move_to_end((tool, key))
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        """Drop expired rows, then least recently used rows until under the size budget."""
+        self._conn.execute(f"DELETE FROM {self.name} WHERE expires_at <= ?", (now,))
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.name}").fetchone()[0]
+        if total <= self._max_disk_bytes:
+            return
+        rows = self._conn.execute(f"SELECT tool, key, size FROM {self.name} ORDER BY accessed_at").fetchall()
+        for tool, key, size in rows:
+            if total <= self._max_disk_bytes:
+                break
+            self._conn.execute(f"DELETE FROM {self.name} WHERE tool = ? AND key = ?", (tool, key))
+            total -= size
+            self._stats["evictions"] += 1
+
+    def _count(self, outcome, tool):
+        self._stats[outcome] += 1
+        counter(f"{self.name}_lookups_total", "Cache lookups by outcome").inc(tool=tool, outcome=outcome)
+        record_cache_lookup(self.name, outcome != "misses")
+
+    def stats(self):
+        """Return hit/miss/write/eviction counters and the hit ratio."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.name}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Return the process-wide search cache built from ``SEARCH_CACHE_CONFIG``."""
+    global _cache
+    if _cache is None:
+        load_env()
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache(
+                    path=SEARCH_CACHE_CONFIG["path"],
+                    memory_entries=SEARCH_CACHE_CONFIG["memory_entries"],
+                    max_disk_bytes=SEARCH_CACHE_CONFIG["max_disk_mb"] * 1024 * 1024,
+                    ttl_seconds=SEARCH_CACHE_CONFIG["ttl_seconds"],
+                    default_ttl_seconds=SEARCH_CACHE_CONFIG["default_ttl_seconds"],
+                )
+    return _cache
+
+
+def set_search_cache(cache):
+    """Replace the process-wide cache (e.g. with an in-memory one in tests)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cache_enabled(config=None):
+    """
+    Whether tool calls should use the cache.
+
+    Disabled globally by ``SEARCH_CACHE_CONFIG["enabled"]`` or per request by
+    ``config["configurable"]["search_cache_bypass"] = True``.
+    """
+    if not SEARCH_CACHE_CONFIG["enabled"]:
+        return False
+    configurable = (config or {}).get("configurable", {}) if isinstance(config, dict) else {}
+    return not configurable.get("search_cache_bypass", False)
@@ -0,0 +1,288 @@
+"""
+Result shaping for search tools.
+
+Raw Tavily responses (and whole extracted pages) are far larger than what the
+searcher needs, and whatever a tool returns is re-sent with every later LLM
+call of the thread. This module turns a response into a compact, ranked digest
+that fits a token budget and keeps the source URLs for citation. The full
+payload is stored out-of-band under a reference id that the
+``get_full_search_result`` tool can page through on demand.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+
+from .config import SEARCH_RESULT_CONFIG
+from .metrics import counter, histogram
+from .search_cache import cache_enabled, get_search_cache
+from .utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_TOOL = "search_payload"
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_CJK_RE = re.compile(r"[一-鿿]+")
+_SENTENCE_RE = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s+|\n+")
+
+
+def tokenize_terms(text):
+    """Split text into lowercase word terms plus CJK character bigrams for matching."""
+    text = str(text or "").lower()
+    terms = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def split_chunks(text, max_tokens):
+    """Split text at sentence boundaries into chunks of at most ``max_tokens`` (approx.)."""
+    chunks = []
+    current = ""
+    # Running estimate of ``current``, so long pages are not re-counted per sentence.
+    current_tokens = 0
+    for sentence in _SENTENCE_RE.split(str(text or "")):
+        sentence = sentence.strip() if sentence else ""
+        if not sentence:
+            continue
+        sentence_tokens = estimate_tokens(sentence)
+        if current and current_tokens + sentence_tokens > max_tokens:
+            chunks.append(current)
+            current = ""
+            current_tokens = 0
+        current = f"{current} {sentence}" if current else sentence
+        current_tokens += sentence_tokens
+        # A single oversized sentence is cut hard.
+        while current_tokens > max_tokens:
+            cut = max(1, len(current) * max_tokens // current_tokens)
+            chunks.append(current[:cut])
+            current = current[cut:]
+            current_tokens = estimate_tokens(current)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def rank_chunks(query, chunks):
+    """
+    Score chunks against ``query`` with a BM25-style term weighting.
+
+    Returns:
+        list: One score per chunk, in input order (all zeros without a query).
+    """
+    query_terms = set(tokenize_terms(query))
+    if not query_terms or not chunks:
+        return [0.0] * len(chunks)
+    chunk_terms = [tokenize_terms(chunk) for chunk in chunks]
+    avg_len = sum(len(terms) for terms in chunk_terms) / len(chunk_terms) or 1.0
+    doc_freq = {term: sum(1 for terms in chunk_terms if term in terms) for term in query_terms}
+    scores = []
+    for terms in chunk_terms:
+        score = 0.0
+        length_norm = 0.25 + 0.75 * len(terms) / avg_len
+        for term in query_terms:
+            tf = terms.count(term)
+            if tf:
+                idf = math.log(1 + (len(chunks) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * 2.2 / (tf + 1.2 * length_norm)
+        scores.append(score)
+    return scores
+
+
+def store_payload(tool, key, payload, config=None):
+    """
+    Keep the full payload out-of-band and return its reference id.
+
+    Nothing is stored, and None is returned, when the search cache is disabled
+    or bypassed for the request. A payload already stored under the ref (e.g.
+    for a cache hit) is not written again.
+    """
+    if not cache_enabled(config):
+        return None
+    ref = "r_" + hashlib.sha1(f"{tool}:{key}".encode("utf-8")).hexdigest()[:12]
+    cache = get_search_cache()
+    if not cache.contains(PAYLOAD_TOOL, ref):
+        cache.set(PAYLOAD_TOOL, ref, payload)
+    return ref
+
+
+def load_payload(ref):
+    """Return the full payload stored under ``ref`` or None if it expired."""
+    return get_search_cache().get(PAYLOAD_TOOL, ref)
+
+
+# Tokens kept free for the header line of a shaped result.
+_HEADER_TOKENS = 40
+
+
+def _select(candidates, sources, budget_tokens):
+    """
+    Greedily keep the best-scoring candidates that fit the budget.
+
+    Each candidate is ``(score, order, source_index, text)``. The first snippet
+    of a source also pays for its title/URL line. The result is in document
+    order so snippets of one source stay together.
+    """
+    chosen = []
+    cited = set()
+    used = _HEADER_TOKENS
+    for candidate in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        source_index = candidate[2]
+        cost = estimate_tokens(candidate[3]) + 2
+        if source_index not in cited:
+            cost += estimate_tokens(" ".join(sources[source_index])) + 4
+        if used + cost > budget_tokens:
+            continue
+        chosen.append(candidate)
+        cited.add(source_index)
+        used += cost
+    return sorted(chosen, key=lambda c: c[1])
+
+
+def _header(title, ref, counts):
+    """Header line of a shaped result; the ref is only offered when the payload was stored."""
+    if ref is None:
+        return f"{title} ({counts})"
+    return f"{title} (ref={ref}; {counts}; full payload: get_full_search_result)"
+
+
+def _report(tool, raw_text, shaped_text):
+    """Record and log the prompt size reduction of one tool call."""
+    raw_tokens = estimate_tokens(raw_text)
+    shaped_tokens = estimate_tokens(shaped_text)
+    histogram("search_result_raw_tokens", "Estimated tokens of raw tool payloads").observe(raw_tokens, tool=tool)
+    histogram("search_result_shaped_tokens", "Estimated tokens returned to the LLM").observe(shaped_tokens, tool=tool)
+    counter("search_result_tokens_saved_total", "Estimated prompt tokens removed by result shaping").inc(
+        max(0, raw_tokens - shaped_tokens), tool=tool
+    )
+    logger.info("%s: shaped %d -> %d tokens", tool, raw_tokens, shaped_tokens)
+    return {"raw_tokens": raw_tokens, "shaped_tokens": shaped_tokens}
+
+
+def _render(header, sources, chosen):
+    """Render chosen snippets grouped under their source title and URL."""
+    lines = [header]
+    last_source = None
+    for _, _, source_index, text in chosen:
+        if source_index != last_source:
+            title, url = sources[source_index]
+            lines.append(f"[{source_index + 1}] {title} ({url})")
+            last_source = source_index
+        lines.append(f"    {text}")
+    return "\n".join(lines)
+
+
+def _shape_results(tool, results, query, budget_tokens, ref, raw_text):
+    """Shared implementation for search-style result lists."""
+    max_tokens = SEARCH_RESULT_CONFIG["snippet_max_tokens"]
+    sources = []
+    candidates = []
+    for index, result in enumerate(results):
+        sources.append((result.get("title") or "", result.get("url") or ""))
+        chunks = split_chunks(result.get("content") or "", max_tokens)
+        # Rank against the query the result was retrieved for, if known.
+        scores = rank_chunks(result.get("query") or query, chunks)
+        for position, (chunk, score) in enumerate(zip(chunks, scores)):
+            # Earlier results and earlier chunks break ties, following Tavily's ranking.
+            prior = (result.get("score") or 0.0) + 1.0 / (index + 1) + 0.5 / (position + 1)
+            candidates.append((score + prior, index * 1000 + position, index, chunk))
+
+    chosen = _select(candidates, sources, budget_tokens)
+    header = _header(f"Results for \"{query}\"", ref, f"{len(chosen)} of {len(candidates)} snippets")
+    shaped = _render(header, sources, chosen)
+    return shaped, {"ref": ref, **_report(tool, raw_text, shaped)}
+
+
+def shape_search_response(response, query, key, budget_tokens=None, config=None):
+    """
+    Compact a Tavily ``search`` response for the LLM.
+
+    Args:
+        response (dict): Raw Tavily response.
+        query (str): The query the snippets are ranked against.
+        key (str): Cache key of the response, used to derive the payload ref.
+        budget_tokens (int): Token budget; defaults to the configured one.
+        config (dict): Tool call config; the full payload is only stored when
+            the search cache is enabled for it.
+
+    Returns:
+        tuple: (shaped text, artifact dict with ref and token counts).
+    """
+    budget_tokens = budget_tokens or SEARCH_RESULT_CONFIG["search_budget_tokens"]
+    raw_text = str(response)
+    ref = store_payload("tavily_search", key, response, config)
+    return _shape_results("tavily_search", response.get("results", []), query, budget_tokens, ref, raw_text)
+
+
+def shape_page_response(response, key, query=None, budget_tokens=None, config=None):
+    """
+    Compact a Tavily ``extract`` response for the LLM.
+
+    Without a ``query`` the leading part of each page is kept; with one, the
+    passages that match it best.
+    """
+    budget_tokens = budget_tokens or SEARCH_RESULT_CONFIG["page_budget_tokens"]
+    raw_text = str(response)
+    ref = store_payload("tavily_get_page_content", key, response, config)
+    max_tokens = SEARCH_RESULT_CONFIG["snippet_max_tokens"] * 2
+    sources = []
+    candidates = []
+    for index, page in enumerate(response.get("results", [])):
+        url = page.get("url") or ""
+        sources.append((page.get("title") or url, url))
+        chunks = split_chunks(page.get("raw_content") or "", max_tokens)
+        scores = rank_chunks(query, chunks)
+        for position, (chunk, score) in enumerate(zip(chunks, scores)):
+            candidates.append((score + 1.0 / (position + 1), index * 100000 + position, index, chunk))
+
+    chosen = _select(candidates, sources, budget_tokens)
+    failed = [str(item.get("url", item)) if isinstance(item, dict) else str(item)
+              for item in response.get("failed_results", [])]
+    header = _header("Page content", ref, f"{len(chosen)} of {len(candidates)} passages")
+    if failed:
+        header += f"\nFailed: {', '.join(failed)}"
+    shaped = _render(header, sources, chosen)
+    return shaped, {"ref": ref, **_report("tavily_get_page_content", raw_text, shaped)}
+
+
+def shape_batch_response(merged, queries, key, budget_tokens=None, config=None):
+    """Compact a merged ``tavily_batch_search`` result (search results plus pages)."""
+    budget_tokens = budget_tokens or SEARCH_RESULT_CONFIG["batch_budget_tokens"]
+    raw_text = str(merged)
+    ref = store_payload("tavily_batch_search", key, merged, config)
+    # Pages are ranked like long search results against all batch queries.
+    results = list(merged.get("results", [])) + [
+        {"title": page.get("title") or page.get("url"), "url": page.get("url"),
+         "content": page.get("raw_content"), "query": " ".join(queries)}
+        for page in merged.get("pages", [])
+    ]
+    shaped, artifact = _shape_results("tavily_batch_search", results, "; ".join(queries), budget_tokens, ref, raw_text)
+    if merged.get("errors"):
+        shaped += "\nErrors: " + json.dumps(merged["errors"], ensure_ascii=False)[:500]
+    return shaped, artifact
+
+
+def read_payload(ref, offset=0, max_chars=None):
+    """
+    Return a page of the full payload stored under ``ref``.
+
+    Returns:
+        str: The requested slice with a header telling how to continue.
+    """
+    payload = load_payload(ref)
+    if payload is None:
+        return f"No stored result for ref={ref}; it may have expired. Run the search again."
+    text = json.dumps(payload, ensure_ascii=False)
+    max_chars = max_chars or SEARCH_RESULT_CONFIG["full_result_page_chars"]
+    offset = max(0, int(offset or 0))
+    end = min(len(text), offset + max_chars)
+    header = f"ref={ref} chars {offset}-{end} of {len(text)}"
+    if end < len(text):
+        header += f" (continue with offset={end})"
+    return f"{header}\n{text[offset:end]}"
@@ -1,21 +1,28 @@
 """LLM node for reasoning and tool selection."""
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
 
-from .config import LLM_CONFIG, SEARCHER_ASSISTANT_PROMPT_TEMPLATE
+from .config import SEARCHER_ASSISTANT_PROMPT_TEMPLATE
+from .llm_client import get_llm_for
 from .state import State
-from .utils import show_graph
+from .persistence import get_checkpointer, get_store
+from .history import build_agent_messages
+from .utils import show_graph, dual_node
 from .searcher_tool import get_searcher_tools
+from .semantic_cache import semantic_lookup, semantic_remember, is_semantic_hit
 
 
-def create_searcher_agent():
+def create_searcher_agent(embedded=False):
+    """
+    Build and compile the searcher sub-agent graph.
+
+    Args:
+        embedded (bool): Compile without a private checkpointer/store so the
+            graph inherits persistence from the parent graph it runs in.
+    """
     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
+    llm = get_llm_for("searcher")
     
     searcher_tools = get_searcher_tools()
     
@@ -27,17 +34,19 @@ def create_searcher_agent():
     
     def searcher_assistant(state: State, config: RunnableConfig):
         """LLM node for reasoning and tool selection."""
-        memory = "None" 
-        if "loaded_memory" in state: 
-            memory = state["loaded_memory"]
-
-        searcher_assistant_prompt = SEARCHER_ASSISTANT_PROMPT_TEMPLATE
-        
         response = llm_with_searcher_tools.invoke(
-            [SystemMessage(searcher_assistant_prompt)] + state["messages"]
+            build_agent_messages("searcher", SEARCHER_ASSISTANT_PROMPT_TEMPLATE, state)
         )
         
         return {"messages": [response]}
+
+    async def asearcher_assistant(state: State, config: RunnableConfig):
+        """Async twin of ``searcher_assistant`` used by ainvoke/astream."""
+        response = await llm_with_searcher_tools.ainvoke(
+            build_agent_messages("searcher", SEARCHER_ASSISTANT_PROMPT_TEMPLATE, state)
+        )
+
+        return {"messages": [response]}
     
     # Define conditional edge function
     def should_continue(state: State, config: RunnableConfig):
@@ -50,28 +59,47 @@ def create_searcher_agent():
         else:
             return "continue"
     
+    def after_lookup(state: State, config: RunnableConfig):
+        """Skip the search when a paraphrase of the question was answered recently."""
+        return "hit" if is_semantic_hit(state) else "search"
+
     # Build the graph
     searcher_workflow = StateGraph(State)
     
     # Add nodes
-    searcher_workflow.add_node("searcher_assistant", searcher_assistant)
+    # Paraphrased questions reuse recent research (see semantic_cache.py)
+    searcher_workflow.add_node("semantic_lookup", semantic_lookup)
+    searcher_workflow.add_node("searcher_assistant", dual_node(searcher_assistant, asearcher_assistant))
     searcher_workflow.add_node("searcher_tool_node", searcher_tool_node)
+    searcher_workflow.add_node("semantic_remember", semantic_remember)
     
     # Add edges
-    searcher_workflow.add_edge(START, "searcher_assistant")
+    searcher_workflow.add_edge(START, "semantic_lookup")
+    searcher_workflow.add_conditional_edges(
+        "semantic_lookup",
+        after_lookup,
+        {
+            "hit": END,
+            "search": "searcher_assistant",
+        },
+    )
     searcher_workflow.add_conditional_edges(
         "searcher_assistant",
         should_continue,
         {
             "continue": "searcher_tool_node",
-            "end": END,
+            "end": "semantic_remember",
         },
     )
     searcher_workflow.add_edge("searcher_tool_node", "searcher_assistant")
+    searcher_workflow.add_edge("semantic_remember", END)
     
-    # Initialize memory components
-    checkpointer = MemorySaver()
-    in_memory_store = InMemoryStore()
+    if embedded:
+        return searcher_workflow.compile(name="searcher_subagent")
+
+    # Standalone use shares the process-wide checkpointer and store (see persistence.py)
+    checkpointer = get_checkpointer()
+    in_memory_store = get_store()
     
     # Compile the graph
     searcher_subagent = searcher_workflow.compile(
@@ -1,41 +1,349 @@
 """Search tools for web search and information retrieval."""
-from typing import Annotated
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List
 
-from langchain_core.tools import tool
-from tavily import TavilyClient
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 
-# Initialize Tavily client for web search
-tavily_client = TavilyClient(api_key="")
+from .config import SEARCH_BATCH_CONFIG, load_env
+from .local_corpus import content_hash, index_pages, search_local_corpus
+from .market_data import get_market_data_tools
+from .rate_limit import acall, call
+from .search_cache import cache_enabled, get_search_cache, normalize_query, normalize_url
+from .search_results import read_payload, shape_batch_response, shape_page_response, shape_search_response
 
+# Tavily clients for web search (sync for invoke, async for ainvoke), built on first use
+tavily_client = None
+async_tavily_client = None
+_clients_lock = threading.Lock()
 
-@tool
-def tavily_search(
+
+def _sync_client():
+    global tavily_client
+    if tavily_client is None:
+        with _clients_lock:
+            if tavily_client is None:
+                from tavily import TavilyClient
+
+                load_env()
+                tavily_client = TavilyClient(api_key="")
+    return tavily_client
+
+
+def _async_client():
+    global async_tavily_client
+    if async_tavily_client is None:
+        with _clients_lock:
+            if async_tavily_client is None:
+                from tavily import AsyncTavilyClient
+
+                load_env()
+                async_tavily_client = AsyncTavilyClient(api_key="")
+    return async_tavily_client
+
+
+def set_tavily_client(client, async_client=None):
+    """
+    Swap the Tavily clients used by the tools, e.g. for a local fake in tests.
+
+    Args:
+        client: Object with ``search(query=..., **kwargs)`` and ``extract(urls=...)``.
+        async_client: Async counterpart; defaults to leaving the async client unchanged.
+    """
+    global tavily_client, async_tavily_client
+    tavily_client = client
+    if async_client is not None:
+        async_tavily_client = async_client
+
+
+# Upstream calls go through the shared rate limiter and retry policy.
+def _search(query):
+    return call("tavily_search", _sync_client().search, query=query, max_results=5)
+
+
+async def _asearch(query):
+    return await acall("tavily_search", _async_client().search, query=query, max_results=5)
+
+
+# Pages fresh from the network go into the local corpus; search-cache hits are
+# not re-indexed, so a document's fetch time stays the time it was downloaded.
+def _extract(url):
+    response = call("tavily_extract", _sync_client().extract, urls=url)
+    index_pages(response.get("results"))
+    return response
+
+
+async def _aextract(url):
+    response = await acall("tavily_extract", _async_client().extract, urls=url)
+    await asyncio.to_thread(index_pages, response.get("results"))
+    return response
+
+
+def _cacheable(result):
+    """Only complete responses are cached; an empty or partly failed one may be a transient error."""
+    return isinstance(result, dict) and bool(result.get("results")) and not result.get("failed_results")
+
+
+def _cached(tool_name, key, config, fetch, *args):
+    """Return the cached response for ``key`` or call ``fetch(*args)`` and cache it."""
+    if not cache_enabled(config):
+        return fetch(*args)
+    cache = get_search_cache()
+    result = cache.get(tool_name, key)
+    if result is None:
+        result = fetch(*args)
+        if _cacheable(result):
+            cache.set(tool_name, key, result)
+    return result
+
+
+async def _acached(tool_name, key, config, fetch, *args):
+    """Async variant of ``_cached``; the SQLite tier is read and written off the event loop."""
+    if not cache_enabled(config):
+        return await fetch(*args)
+    cache = get_search_cache()
+    result = await asyncio.to_thread(cache.get, tool_name, key)
+    if result is None:
+        result = await fetch(*args)
+        if _cacheable(result):
+            await asyncio.to_thread(cache.set, tool_name, key, result)
+    return result
+
+
+# The tools below return ``(content, artifact)``: the content is the compact,
+# ranked digest the LLM sees; the artifact (payload ref and token counts) stays
+# on the ToolMessage for tracing and is never sent to the model.
+
+def _tavily_search(
     query: Annotated[str, "The search query to execute."],
-) -> str:
+    config: RunnableConfig,
+):
+    """Search the web for information using Tavily search engine."""
+    key = normalize_query(query)
+    try:
+        result = _cached("tavily_search", key, config, _search, query)
+    except Exception as e:
+        return f"Search failed: {str(e)}", None
+    return shape_search_response(result, query, key, config=config)
+
+
+async def _atavily_search(
+    query: Annotated[str, "The search query to execute."],
+    config: RunnableConfig,
+):
     """Search the web for information using Tavily search engine."""
+    key = normalize_query(query)
     try:
-        result = tavily_client.search(query=query, max_results=5)
-        return str(result)
+        result = await _acached("tavily_search", key, config, _asearch, query)
     except Exception as e:
-        return f"Search failed: {str(e)}"
-    
+        return f"Search failed: {str(e)}", None
+    return await asyncio.to_thread(shape_search_response, result, query, key, config=config)
+
 
-@tool
-def tavily_get_page_content(
+def _tavily_get_page_content(
     url: Annotated[str, "The URL of the web page to retrieve content from."],
-) -> str:
+    config: RunnableConfig,
+    query: Annotated[str, "Optional: what you are looking for on the page, to select the relevant passages."] = None,
+):
+    """Retrieve the content of a web page using Tavily."""
+    key = normalize_url(url)
+    try:
+        content = _cached("tavily_get_page_content", key, config, _extract, url)
+    except Exception as e:
+        return f"Failed to retrieve page content: {str(e)}", None
+    return shape_page_response(content, key, query=query, config=config)
+
+
+async def _atavily_get_page_content(
+    url: Annotated[str, "The URL of the web page to retrieve content from."],
+    config: RunnableConfig,
+    query: Annotated[str, "Optional: what you are looking for on the page, to select the relevant passages."] = None,
+):
     """Retrieve the content of a web page using Tavily."""
+    key = normalize_url(url)
     try:
-        content = tavily_client.extract(url=url)
-        return content
+        content = await _acached("tavily_get_page_content", key, config, _aextract, url)
     except Exception as e:
-        return f"Failed to retrieve page content: {str(e)}" 
+        return f"Failed to retrieve page content: {str(e)}", None
+    return await asyncio.to_thread(shape_page_response, content, key, query=query, config=config)
+
+
+def _get_full_search_result(
+    ref: Annotated[str, "The ref id printed in the header of a search or page result."],
+    offset: Annotated[int, "Character offset to continue reading from."] = 0,
+) -> str:
+    """Fetch the full, unabridged payload behind a shaped search result, page by page."""
+    return read_payload(ref, offset)
+
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def _get_batch_executor():
+    """Shared, bounded worker pool for batched sync searches."""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=SEARCH_BATCH_CONFIG["max_workers"], thread_name_prefix="tavily-batch"
+                )
+    return _batch_executor
+
+
+def _merge_batch(queries, search_responses, urls, extract_responses):
+    """
+    Combine batched responses, de-duplicating by URL and by content hash.
+
+    Each response is either the raw Tavily dict or the exception raised for it.
+    """
+    seen_urls = set()
+    seen_hashes = set()
+    merged = {"results": [], "pages": [], "errors": []}
+
+    def is_new(url, content):
+        url_key = normalize_url(url) if url else None
+        content_key = content_hash(content) if content else None
+        if (url_key and url_key in seen_urls) or (content_key and content_key in seen_hashes):
+            return False
+        seen_urls.add(url_key)
+        seen_hashes.add(content_key)
+        return True
+
+    for query, response in zip(queries, search_responses):
+        if isinstance(response, Exception):
+            merged["errors"].append({"query": query, "error": str(response)})
+            continue
+        for result in response.get("results", []):
+            if is_new(result.get("url"), result.get("content")):
+                merged["results"].append({**result, "query": query})
+
+    for url, response in zip(urls, extract_responses):
+        if isinstance(response, Exception):
+            merged["errors"].append({"url": url, "error": str(response)})
+            continue
+        for page in response.get("results", []):
+            if is_new(page.get("url"), page.get("raw_content")):
+                merged["pages"].append(page)
+        for failed in response.get("failed_results", []):
+            merged["errors"].append(failed)
+
+    return merged
+
+
+def _batch_key(queries, urls):
+    return "|".join(sorted(normalize_query(q) for q in queries) + sorted(normalize_url(u) for u in urls))
+
+
+def _batch_items(queries, urls):
+    """De-duplicate the requested items and cap them at ``max_items``."""
+    queries = list({normalize_query(q): q for q in reversed(queries or []) if str(q).strip()}.values())[::-1]
+    urls = list({normalize_url(u): u for u in reversed(urls or []) if str(u).strip()}.values())[::-1]
+    limit = SEARCH_BATCH_CONFIG["max_items"]
+    queries = queries[:limit]
+    urls = urls[:max(0, limit - len(queries))]
+    return queries, urls
+
+
+def _capture(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+def _tavily_batch_search(
+    queries: Annotated[List[str], "All search queries needed to answer the request."],
+    config: RunnableConfig,
+    urls: Annotated[List[str], "Web page URLs whose full content should be retrieved."] = None,
+):
+    """Run several web searches and page retrievals concurrently in one step; results are de-duplicated."""
+    queries, urls = _batch_items(queries, urls)
+    executor = _get_batch_executor()
+    # Each worker runs in a copy of the caller's context so the request's
+    # retry budget applies to the batched calls as well.
+    search_futures = [
+        executor.submit(contextvars.copy_context().run, _capture,
+                        _cached, "tavily_search", normalize_query(q), config, _search, q)
+        for q in queries
+    ]
+    extract_futures = [
+        executor.submit(contextvars.copy_context().run, _capture,
+                        _cached, "tavily_get_page_content", normalize_url(u), config, _extract, u)
+        for u in urls
+    ]
+    merged = _merge_batch(
+        queries, [f.result() for f in search_futures],
+        urls, [f.result() for f in extract_futures],
+    )
+    return shape_batch_response(merged, queries, _batch_key(queries, urls), config=config)
+
+
+async def _atavily_batch_search(
+    queries: Annotated[List[str], "All search queries needed to answer the request."],
+    config: RunnableConfig,
+    urls: Annotated[List[str], "Web page URLs whose full content should be retrieved."] = None,
+):
+    """Run several web searches and page retrievals concurrently in one step; results are de-duplicated."""
+    queries, urls = _batch_items(queries, urls)
+    semaphore = asyncio.Semaphore(SEARCH_BATCH_CONFIG["max_workers"])
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    responses = await asyncio.gather(
+        *[bounded(_acached("tavily_search", normalize_query(q), config, _asearch, q)) for q in queries],
+        *[bounded(_acached("tavily_get_page_content", normalize_url(u), config, _aextract, u)) for u in urls],
+        return_exceptions=True,
+    )
+    merged = _merge_batch(queries, responses[:len(queries)], urls, responses[len(queries):])
+    # Shaping ranks every snippet and stores the payload in SQLite, so it runs off the loop.
+    return await asyncio.to_thread(shape_batch_response, merged, queries, _batch_key(queries, urls), config=config)
+
+
+# Each tool carries a sync and an async implementation so ToolNode can serve
+# both graph.invoke and graph.ainvoke without blocking the event loop.
+tavily_search = StructuredTool.from_function(
+    func=_tavily_search,
+    coroutine=_atavily_search,
+    name="tavily_search",
+    response_format="content_and_artifact",
+)
+
+tavily_get_page_content = StructuredTool.from_function(
+    func=_tavily_get_page_content,
+    coroutine=_atavily_get_page_content,
+    name="tavily_get_page_content",
+    response_format="content_and_artifact",
+)
+
+get_full_search_result = StructuredTool.from_function(
+    func=_get_full_search_result,
+    name="get_full_search_result",
+)
+
+
+tavily_batch_search = StructuredTool.from_function(
+    func=_tavily_batch_search,
+    coroutine=_atavily_batch_search,
+    name="tavily_batch_search",
+    response_format="content_and_artifact",
+)
 
 
 # Aggregate all searcher-related tools into a list
 searcher_tools = [
+    search_local_corpus,
+    tavily_batch_search,
     tavily_search,
-    tavily_get_page_content
+    tavily_get_page_content,
+    get_full_search_result,
+    *get_market_data_tools(),
 ]
 
 
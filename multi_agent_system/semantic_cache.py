@@ -0,0 +1,274 @@
+"""
+Semantic cache of searcher results for paraphrased questions.
+
+Many advisory questions are rewordings of each other ("30岁中等风险投资者有哪些
+选择" / "30岁的中等风险投资者有什么选择？"). Questions are embedded locally with
+character n-gram hashing vectors (no model download, no network) and kept in
+an in-process nearest-neighbour index. When a new question is close enough to
+a recent one, the searcher sub-agent answers with the earlier research instead
+of calling the LLM and Tavily again.
+
+The index is partitioned by the risk profile derived from ``loaded_memory``,
+so a conservative and an aggressive investor never share results. Questions
+that mention different numbers (ages, amounts, years) never match. Hit rate
+and the searcher time saved are reported via ``stats()`` and the metrics
+registry.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage
+
+from .config import SEMANTIC_CACHE_CONFIG, load_env
+from .history import split_turns
+from .instrumentation import record_cache_lookup
+from .metrics import counter, histogram
+
+# Keywords mapped to risk partitions, checked in order (the first match wins).
+_RISK_KEYWORDS = (
+    ("conservative", ("低风险", "保守", "稳健", "low risk", "low-risk", "conservative")),
+    ("aggressive", ("高风险", "激进", "进取", "high risk", "high-risk", "aggressive")),
+    ("moderate", ("中等风险", "中风险", "平衡", "moderate", "balanced", "medium risk")),
+)
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+# Misses waiting for their searcher result, so the time a hit saves can be measured.
+_MAX_PENDING = 1024
+
+
+def risk_profile(loaded_memory):
+    """Map the formatted user profile to a risk partition ("unknown" without a match)."""
+    text = unicodedata.normalize("NFKC", str(loaded_memory or "")).lower()
+    for profile, keywords in _RISK_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return profile
+    return "unknown"
+
+
+def normalize_question(text):
+    """NFKC, lowercase and collapse punctuation/whitespace so formatting does not matter."""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+class _Partition:
+    """Vectors and payloads of one risk profile, in insertion order."""
+
+    def __init__(self):
+        self.entries = []  # (created_at, question, numbers, answer, cost_seconds)
+        self.vectors = []
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            import scipy.sparse as sp
+
+            self._matrix = sp.vstack(self.vectors).tocsr()
+        return self._matrix
+
+    def add(self, entry, vector, max_entries):
+        self.entries.append(entry)
+        self.vectors.append(vector)
+        if len(self.entries) > max_entries:
+            del self.entries[:-max_entries]
+            del self.vectors[:-max_entries]
+        self._matrix = None
+
+    def expire(self, cutoff):
+        keep = next((i for i, entry in enumerate(self.entries) if entry[0] >= cutoff), len(self.entries))
+        if keep:
+            del self.entries[:keep]
+            del self.vectors[:keep]
+            self._matrix = None
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache from questions to searcher answers.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl_seconds (float): Age after which an answer is no longer reused.
+        max_entries (int): Entries kept per risk partition; the oldest go first.
+        ngram_range (tuple): Character n-gram range of the embedding.
+        n_features (int): Dimension of the hashing vectors.
+    """
+
+    def __init__(self, threshold=0.85, ttl_seconds=1800, max_entries=2000, ngram_range=(1, 3), n_features=2 ** 18):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # scikit-learn is imported only when the cache is actually used.
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self._vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=tuple(ngram_range), n_features=n_features,
+            alternate_sign=False, norm="l2",
+        )
+        self._partitions = {}
+        self._pending = OrderedDict()  # (thread_id, question) -> miss time
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "latency_saved_seconds": 0.0}
+
+    def embed(self, question):
+        return self._vectorizer.transform([normalize_question(question)])
+
+    def lookup(self, question, profile, thread_id=None):
+        """
+        Return ``(answer, similarity)`` for the closest fresh entry above the threshold, or None.
+
+        A miss starts the clock for ``remember`` when ``thread_id`` is given.
+        """
+        vector = self.embed(question)
+        numbers = sorted(_NUMBER.findall(question))
+        now = time.time()
+        best = None
+        with self._lock:
+            partition = self._partitions.get(profile)
+            if partition is not None:
+                partition.expire(now - self.ttl_seconds)
+            if partition is not None and partition.entries:
+                similarities = np.asarray((partition.matrix() @ vector.T).todense()).ravel()
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    if partition.entries[index][2] == numbers:
+                        best = (partition.entries[index], float(similarities[index]))
+                        break
+            if best is None:
+                self._stats["misses"] += 1
+                if thread_id is not None:
+                    self._pending[(thread_id, question)] = time.perf_counter()
+                    while len(self._pending) > _MAX_PENDING:
+                        self._pending.popitem(last=False)
+            else:
+                self._stats["hits"] += 1
+                self._stats["latency_saved_seconds"] += best[0][4]
+        counter("semantic_cache_lookups_total", "Semantic cache lookups by outcome").inc(
+            outcome="miss" if best is None else "hit", profile=profile
+        )
+        record_cache_lookup("semantic_cache", best is not None)
+        if best is None:
+            return None
+        entry, similarity = best
+        histogram("semantic_cache_similarity", "Similarity of semantic cache hits").observe(similarity)
+        counter("semantic_cache_latency_saved_seconds_total", "Searcher time avoided by semantic cache hits").inc(
+            entry[4]
+        )
+        return entry[3], similarity
+
+    def remember(self, question, profile, answer, thread_id=None, cost_seconds=None):
+        """
+        Index ``answer`` under ``question``.
+
+        ``cost_seconds`` defaults to the time since the miss recorded by
+        ``lookup`` for the same thread and question.
+        """
+        vector = self.embed(question)
+        with self._lock:
+            started = self._pending.pop((thread_id, question), None)
+            if cost_seconds is None:
+                cost_seconds = time.perf_counter() - started if started is not None else 0.0
+            entry = (time.time(), question, sorted(_NUMBER.findall(question)), answer, cost_seconds)
+            self._partitions.setdefault(profile, _Partition()).add(entry, vector, self.max_entries)
+            self._stats["writes"] += 1
+
+    def stats(self):
+        """Return hits, misses, writes, hit ratio, entries and the searcher time saved."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = {profile: len(partition.entries) for profile, partition in self._partitions.items()}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._pending.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """Return the process-wide semantic cache built from ``SEMANTIC_CACHE_CONFIG``."""
+    global _cache
+    if _cache is None:
+        load_env()
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    threshold=SEMANTIC_CACHE_CONFIG["similarity_threshold"],
+                    ttl_seconds=SEMANTIC_CACHE_CONFIG["ttl_seconds"],
+                    max_entries=SEMANTIC_CACHE_CONFIG["max_entries_per_profile"],
+                    ngram_range=SEMANTIC_CACHE_CONFIG["ngram_range"],
+                    n_features=SEMANTIC_CACHE_CONFIG["n_features"],
+                )
+    return _cache
+
+
+def _question(state):
+    """The current turn's question if it is eligible for the cache, else None."""
+    messages = state.get("messages", [])
+    turns = split_turns(messages)
+    if not turns or not isinstance(turns[-1][0], HumanMessage):
+        return None
+    if SEMANTIC_CACHE_CONFIG["first_turn_only"] and (len(turns) > 1 or state.get("history_summary")):
+        return None
+    # Only the first search of a turn; a second one means the supervisor wants more.
+    if any(getattr(msg, "name", None) == "searcher_subagent" for msg in turns[-1][1:]):
+        return None
+    question = str(turns[-1][0].content).strip()
+    return question or None
+
+
+def _thread_id(config):
+    return str((config or {}).get("configurable", {}).get("thread_id"))
+
+
+def semantic_lookup(state, config):
+    """Searcher entry node: answer from the cache on a hit, otherwise do nothing."""
+    if not SEMANTIC_CACHE_CONFIG["enabled"]:
+        return {}
+    question = _question(state)
+    if question is None:
+        return {}
+    hit = get_semantic_cache().lookup(question, risk_profile(state.get("loaded_memory")), _thread_id(config))
+    if hit is None:
+        return {}
+    answer, similarity = hit
+    return {"messages": [AIMessage(
+        content=answer,
+        response_metadata={"semantic_cache_hit": True, "similarity": round(similarity, 4)},
+    )]}
+
+
+def is_semantic_hit(state):
+    """Whether ``semantic_lookup`` just answered the turn."""
+    messages = state.get("messages", [])
+    return bool(messages) and bool(getattr(messages[-1], "response_metadata", {}).get("semantic_cache_hit"))
+
+
+def semantic_remember(state, config):
+    """Searcher exit node: index the final searcher answer of an eligible question."""
+    if not SEMANTIC_CACHE_CONFIG["enabled"]:
+        return {}
+    question = _question(state)
+    messages = state.get("messages", [])
+    if question is None or not messages:
+        return {}
+    answer = messages[-1]
+    if not isinstance(answer, AIMessage) or answer.tool_calls or not str(answer.content).strip():
+        return {}
+    get_semantic_cache().remember(
+        question, risk_profile(state.get("loaded_memory")), str(answer.content), _thread_id(config)
+    )
+    return {}
@@ -22,6 +22,10 @@ class State(TypedDict):
     # typically user preferences or historical context.
     loaded_memory: str
     
+    # history_summary: Rolling summary of the turns that were compressed out of
+    # `messages` by the history policy (see history.py).
+    history_summary: str
+    
     # remaining_steps: Used by LangGraph to track the number of allowed steps 
     # to prevent infinite loops in cyclic graphs.
     remaining_steps: RemainingSteps
@@ -1,46 +1,58 @@
 """LLM node for reasoning and tool selection."""
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
 
-from .config import LLM_CONFIG, SUMMARY_ASSISTANT_PROMPT_TEMPLATE
+from .config import SUMMARY_ASSISTANT_PROMPT_TEMPLATE
+from .llm_client import get_llm_for
 from .state import State
-from .utils import show_graph
+from .persistence import get_checkpointer, get_store
+from .history import build_agent_messages
+from .response_cache import response_cache_for
+from .utils import show_graph, dual_node
 
 
-def create_summary_agent():
+def create_summary_agent(embedded=False):
+    """
+    Build and compile the summary sub-agent graph.
+
+    Args:
+        embedded (bool): Compile without a private checkpointer/store so the
+            graph inherits persistence from the parent graph it runs in.
+    """
     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
+    llm = get_llm_for("summary", cache=response_cache_for("summary"))
     
     def summary_assistant(state: State, config: RunnableConfig):
         """LLM node for reasoning and tool selection."""
-        memory = "None" 
-        if "loaded_memory" in state: 
-            memory = state["loaded_memory"]
-
-        summary_assistant_prompt = SUMMARY_ASSISTANT_PROMPT_TEMPLATE
-        
         response = llm.invoke(
-            [SystemMessage(summary_assistant_prompt)] + state["messages"]
+            build_agent_messages("summary", SUMMARY_ASSISTANT_PROMPT_TEMPLATE, state)
         )
         
         return {"messages": [response]}
+
+    async def asummary_assistant(state: State, config: RunnableConfig):
+        """Async twin of ``summary_assistant`` used by ainvoke/astream."""
+        response = await llm.ainvoke(
+            build_agent_messages("summary", SUMMARY_ASSISTANT_PROMPT_TEMPLATE, state)
+        )
+
+        return {"messages": [response]}
     
     # Build the graph
     summary_workflow = StateGraph(State)
     
     # Add nodes
-    summary_workflow.add_node("summary_assistant", summary_assistant)    
+    summary_workflow.add_node("summary_assistant", dual_node(summary_assistant, asummary_assistant))    
     # Add edges
     summary_workflow.add_edge(START, "summary_assistant")
     summary_workflow.add_edge("summary_assistant", END)    
-    # Initialize memory components
-    checkpointer = MemorySaver()
-    in_memory_store = InMemoryStore()
+    if embedded:
+        return summary_workflow.compile(name="summary_subagent")
+
+    # Standalone use shares the process-wide checkpointer and store (see persistence.py)
+    checkpointer = get_checkpointer()
+    in_memory_store = get_store()
     
     # Compile the graph
     summary_subagent = summary_workflow.compile(
@@ -4,36 +4,84 @@ Coordinates the multi-agent system and handles customer queries.
 Can be run independently.
 """
 
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
+from langgraph.graph import StateGraph, START, END
 from langgraph.store.base import BaseStore
 from langchain_core.runnables import RunnableConfig
 
-from .config import LLM_CONFIG, SUPERVISOR_PROMPT
+from .config import ROUTER_CONFIG, SUPERVISOR_PROMPT
+from .llm_client import get_llm_for
 from .state import State
+from .persistence import get_checkpointer, get_store
+from .history import build_agent_messages
+from .response_cache import response_cache_for
+from .router import LLM_ROUTE, agent_node, audit_route, next_step, route
 from .searcher_agent import create_searcher_agent
 from .summary_agent import create_summary_agent
 
-def create_supervisor(state: State, config: RunnableConfig, store: BaseStore):
+
+def supervisor_prompt(state: State):
+    """Supervisor prompt under the shared history policy (see history.py)."""
+    return build_agent_messages("supervisor", SUPERVISOR_PROMPT, state)
+
+
+def _routed_workflow(llm_supervisor, agents, mode):
     """
-    Create and compile the supervisor agent.
-    
+    Wrap the LLM supervisor with the fast-path router (see router.py).
+
+    ``"rules"``: recognised questions run their plan of sub-agents directly,
+    the rest go to ``llm_supervisor``. ``"shadow"``: every turn goes to
+    ``llm_supervisor`` and ``audit_route`` logs what the rules would have done.
+    """
+    workflow = StateGraph(State)
+    workflow.add_node(LLM_ROUTE, llm_supervisor)
+    if mode == "shadow":
+        workflow.add_node("audit_route", audit_route)
+        workflow.add_edge(START, LLM_ROUTE)
+        workflow.add_edge(LLM_ROUTE, "audit_route")
+        workflow.add_edge("audit_route", END)
+        return workflow
+
+    for agent in agents:
+        workflow.add_node(agent.name, agent_node(agent))
+    names = [agent.name for agent in agents]
+    workflow.add_conditional_edges(START, route, {name: name for name in names + [LLM_ROUTE]})
+    for name in names:
+        workflow.add_conditional_edges(name, next_step(name), {**{other: other for other in names}, "end": END})
+    workflow.add_edge(LLM_ROUTE, END)
+    return workflow
+
+
+def build_supervisor(searcher_agent=None, summary_agent=None, embedded=False, routing=None):
+    """
+    Build and compile the supervisor agent graph.
+
+    This is the expensive part (LLM client, sub-agent graphs, workflow compile)
+    and should run once per process; see ``registry.get_supervisor``.
+
+    Args:
+        searcher_agent: Compiled searcher sub-agent. Built when omitted.
+        summary_agent: Compiled summary sub-agent. Built when omitted.
+        embedded (bool): Compile without a private checkpointer/store so the
+            graph inherits persistence from the parent graph it runs in.
+        routing (str): "llm", "rules" or "shadow" (see router.py); defaults to
+            ``ROUTER_CONFIG["mode"]``.
+
     Returns:
         langgraph.graph: Compiled supervisor agent graph.
     """
+    routing = routing or ROUTER_CONFIG["mode"]
+    if routing not in ("llm", "rules", "shadow"):
+        raise ValueError(f"Unknown routing mode: {routing}")
+
     # Initialize the LLM
-    llm = ChatOpenAI(**LLM_CONFIG)
-    
-    # Initialize memory components
-    checkpointer = MemorySaver()
-    
-    in_memory_store = InMemoryStore()
+    llm = get_llm_for("supervisor", cache=response_cache_for("supervisor"))
 
     # Create sub-agents
-    searcher_agent = create_searcher_agent()
-    summary_agent = create_summary_agent()
-    
+    if searcher_agent is None:
+        searcher_agent = create_searcher_agent(embedded=embedded)
+    if summary_agent is None:
+        summary_agent = create_summary_agent(embedded=embedded)
+
     # Import the supervisor creator to avoid name collision
     from langgraph_supervisor import create_supervisor as create_supervisor_workflow
 
@@ -41,26 +89,54 @@ def create_supervisor(state: State, config: RunnableConfig, store: BaseStore):
             agents=[searcher_agent, summary_agent],
             output_mode="last_message",
             model=llm,
-            prompt=SUPERVISOR_PROMPT,
+            prompt=supervisor_prompt,
             state_schema=State
         )
-        
+
+    if routing != "llm":
+        # The LLM supervisor becomes one node of the routed graph.
+        llm_supervisor = supervisor_prebuilt_workflow.compile(name=LLM_ROUTE)
+        supervisor_prebuilt_workflow = _routed_workflow(llm_supervisor, [searcher_agent, summary_agent], routing)
+
+    if embedded:
+        return supervisor_prebuilt_workflow.compile(name="supervisor")
+
+    # Standalone use shares the process-wide checkpointer and store (see persistence.py)
+    checkpointer = get_checkpointer()
+    in_memory_store = get_store()
+
     supervisor_prebuilt = supervisor_prebuilt_workflow.compile(
             name="supervisor",
             checkpointer=checkpointer,
             store=in_memory_store
         )
-    
+
     return supervisor_prebuilt
 
 
+def create_supervisor(state: State = None, config: RunnableConfig = None, store: BaseStore = None):
+    """
+    Return the shared, compiled supervisor agent.
+
+    Kept node-compatible for graphs that register ``create_supervisor`` as a
+    node: LangGraph invokes the returned graph with the node input. The graph
+    itself is compiled once per process by the registry.
+
+    Returns:
+        langgraph.graph: Compiled supervisor agent graph.
+    """
+    from .registry import get_supervisor
+
+    return get_supervisor()
+
+
 if __name__ == "__main__":
     """Test the supervisor independently."""
     import uuid
     from langchain_core.messages import HumanMessage
     
     # Create the supervisor
-    supervisor = create_supervisor()
+    supervisor = build_supervisor()
     
     thread_id = uuid.uuid4()
     question = "请帮我分析一下当前的股票市场行情，并给出投资建议。"
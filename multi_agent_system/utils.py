@@ -1,10 +1,62 @@
 from pydantic import BaseModel, Field
 from typing import List, Annotated
 from typing_extensions import TypedDict
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.store.base import BaseStore
+from langgraph.utils.runnable import RunnableCallable
 from .state import State
 import os
 
 
+def estimate_tokens(text):
+    """
+    Cheap, offline token estimate for budgeting and metrics.
+
+    CJK characters count as roughly one token each and other text as roughly
+    four characters per token, which is close enough for Qwen-style tokenizers.
+    """
+    if not text:
+        return 0
+    text = str(text)
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff" or "\u3000" <= ch <= "\u303f" or "\uff00" <= ch <= "\uffef")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def dual_node(func, afunc, name=None):
+    """
+    Combine a sync node function and its async twin into a single graph node.
+
+    LangGraph runs ``func`` under ``invoke``/``stream`` and ``afunc`` under
+    ``ainvoke``/``astream``, so the async path never blocks the event loop.
+
+    Args:
+        func: Sync node ``(state, config) -> update``.
+        afunc: Async node with the same signature.
+        name (str): Optional run name, defaults to ``func.__name__``.
+
+    Returns:
+        RunnableLambda: A runnable usable with ``StateGraph.add_node``.
+    """
+    return RunnableLambda(func, afunc=afunc, name=name or func.__name__)
+
+
+def store_node(func, afunc, name=None):
+    """
+    Like ``dual_node`` for nodes that take ``(state, config, store)``.
+
+    LangGraph injects the graph's store through the ``store`` parameter, as it
+    does for plain function nodes. ``get_store()`` is not used: it relies on
+    context propagation into async nodes, which Python < 3.11 lacks.
+    """
+    def run(state, config: RunnableConfig, store: BaseStore):
+        return func(state, config, store)
+
+    async def arun(state, config: RunnableConfig, store: BaseStore):
+        return await afunc(state, config, store)
+
+    return RunnableCallable(run, arun, name=name or func.__name__)
+
+
 def show_graph(graph, xray=False):
     """
     Display a LangGraph mermaid diagram with fallback rendering.